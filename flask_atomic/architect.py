@@ -1,3 +1,4 @@
+import copy
 import secrets
 
 from collections.abc import Iterable
@@ -5,8 +6,10 @@ from collections.abc import Iterable
 from flask import Flask
 from flask import Blueprint
 from flask import request
+from flask import send_file
 
 from sqlalchemy_blender import QueryBuffer
+from sqlalchemy_blender.query.processor import QueryStringProcessor
 from sqlalchemy_blender.helpers import related
 from sqlalchemy_blender.helpers import serialize
 from sqlalchemy_blender.helpers import iserialize
@@ -25,16 +28,91 @@ from handyhttp.exceptions import HTTPException
 
 from flask_atomic.builder.cache import link
 from flask_atomic.builder import cache
+from flask_atomic.builder.dao import getsession
+from flask_atomic.httputils.responses import JsonAcceptedResponse
+from flask_atomic.builder.exports import DONE
+from flask_atomic.builder.exports import ExportManager
+from flask_atomic.builder.exports import FORMAT_ARGUMENT
+from flask_atomic.builder.flight import SCOPE_HEADERS
+from flask_atomic.builder.flight import SingleFlight
+from flask_atomic.builder.flight import coalesced
+from flask_atomic.builder.flight import uncached
+from flask_atomic.builder.limits import LoadShedder
+from flask_atomic.builder.limits import RateLimiter
+from flask_atomic.builder.limits import guarded
+from flask_atomic.builder.limits import overloaded
+from flask_atomic.builder.revalidate import ResponseCache
+from flask_atomic.builder.revalidate import cached
+from flask_atomic.builder.sharding import fan_out
+from flask_atomic.builder.sharding import merge
+from flask_atomic.builder.sharding import partition
+from flask_atomic.builder.sharding import shard_for
+from flask_atomic.builder.sharding import sharded
+from flask_atomic.builder.writebehind import WriteBehind
+from flask_atomic.metrics import measured
+from flask_atomic.metrics import serializing
+from flask_atomic.builder.writebehind import validate
+from flask_atomic.builder.tenancy import tenanted
+from flask_atomic.builder.tenancy import url_prefix
+from flask_atomic.builder.timeouts import DEADLINE_HEADER
+from flask_atomic.builder.timeouts import timed
+from flask_atomic.builder.timeouts import timed_out
+from flask_atomic.orm.aggregate import AGGREGATE_ARGUMENTS
+from flask_atomic.orm.aggregate import aggregate
+from flask_atomic.orm.aggregate import parse
+from flask_atomic.orm.bulk import BULK_ACTIONS
+from flask_atomic.orm.bulk import bulk_flag
+from flask_atomic.orm.bulk import criteria
+from flask_atomic.orm.guardrails import CURSOR_ARGUMENT
+from flask_atomic.orm.guardrails import budget_for
+from flask_atomic.orm.guardrails import decode_cursor
+from flask_atomic.orm.guardrails import encode_cursor
+from flask_atomic.orm.guardrails import truncate
+from flask_atomic.orm.jsonsql import ORM_RENDER
+from flask_atomic.orm.jsonsql import hidden
+from flask_atomic.orm.jsonsql import RENDER_ARGUMENT
+from flask_atomic.orm.jsonsql import SQL_RENDER
+from flask_atomic.orm.jsonsql import passthrough
+from flask_atomic.orm.jsonsql import render
+from flask_atomic.orm.lookup import identity_lookup
+from flask_atomic.orm.lookup import lookup_many
+from flask_atomic.orm.sharding import ShardMap
+from flask_atomic.orm.sharding import shard_context
+from flask_atomic.orm.slowlog import explained
+from flask_atomic.orm.tenancy import current_tenant
+from flask_atomic.orm.timeouts import is_timeout
 
 
 DEFAULT_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'HEAD']
 
 
+def querystring(*reserved):
+    """
+    Query string arguments prefixed with an underscore are reserved for the
+    library itself (e.g. `_explain`) and must not reach the filter processing.
+    Endpoints with their own control arguments pass those in `reserved`.
+    """
+
+    return QueryStringProcessor({
+        key: value for key, value in request.args.items() if not key.startswith('_') and key not in reserved
+    })
+
+
 def bind(blueprint, routes, methods, prefix=None):
     for key in cache.ROUTE_TABLE.keys():
         endpoint = getattr(routes, key, None)
         if not endpoint:
             continue
+        endpoint = explained(endpoint, routes.model)
+        endpoint = sharded(endpoint, routes.shards, routes.model, routes.key)
+        endpoint = timed(endpoint, routes.model, routes.timeouts, routes.deadline_header)
+        # Auth decorators, custom scopes and tenants vary responses by caller
+        private = bool(blueprint.decorators) or routes.scope is not None or routes.tenant is not None
+        endpoint = coalesced(endpoint, routes.flight, routes.scope, routes.model, routes.scope_headers)
+        endpoint = cached(endpoint, routes.responses, routes.scope, routes.model, routes.scope_headers, private)
+        endpoint = guarded(endpoint, routes.model, routes.limiter, routes.shedder)
+        endpoint = tenanted(endpoint, routes.tenant)
+        endpoint = measured(endpoint, routes.model)
         view_function = endpoint
         for idx, dec in enumerate(blueprint.decorators or []):
             if idx == 0:
@@ -53,6 +131,10 @@ def bind(blueprint, routes, methods, prefix=None):
                     new_rule = f'{prefix}{new_rule}'
                     new_rule_with_slash = f'{prefix}{new_rule_with_slash}'
 
+                if url_prefix(routes.tenant):
+                    new_rule = f'{url_prefix(routes.tenant)}{new_rule}'
+                    new_rule_with_slash = f'{url_prefix(routes.tenant)}{new_rule_with_slash}'
+
                 allowed_methods = item[1]
                 name = f'{prefix}-{idx}-{endpoint.__name__}'
                 blueprint.add_url_rule(new_rule, name, view_function, methods=allowed_methods)
@@ -80,6 +162,23 @@ class Architect(Blueprint):
         self.throw = True
         self.binds = []
         self.methods = ['GET', 'POST', 'PUT', 'DELETE']
+        self.advisor = None
+        self.render = ORM_RENDER
+        self.limits = None
+        self.client = None
+        self.shedding = None
+        self.coalesce = False
+        self.scope = None
+        self.scope_headers = SCOPE_HEADERS
+        self.caching = None
+        self.shards = None
+        self.write_behind = None
+        self.timeouts = None
+        self.budget = None
+        self.deadline_header = DEADLINE_HEADER
+        self.exports = None
+        self.responses = dict()
+        self.writers = dict()
 
         if kwargs.get('prefix', None):
             self.url_prefix = kwargs.get('prefix', None)
@@ -94,13 +193,24 @@ class Architect(Blueprint):
 
     def link(self, app: Flask):
         self.prepare()
+        self.check_indexes(app)
         @self.errorhandler(Exception)
         def catch_error(exception):
             if isinstance(exception, HTTPException):
                 return exception.pack()
+            if is_timeout(exception):
+                return timed_out(exception)
             raise exception
         app.register_blueprint(self)
 
+    def check_indexes(self, app: Flask):
+        if not self.advisor:
+            return
+        if not self.advisor.logger:
+            self.advisor.logger = app.logger
+        for item in self.models:
+            self.advisor.check(item, [self.key or item.__mapper__.primary_key[0].name])
+
     def extract_config_override(self, config):
         new_config = [config, self.dao, self.key]
         for idx, item in enumerate(['model', 'key', 'dao']):
@@ -108,7 +218,77 @@ class Architect(Blueprint):
                 new_config[idx] = config.get(item)
         return new_config
 
+    def guards(self):
+        limiter, shedder, flight = None, self.shedding, self.coalesce
+        if self.limits:
+            limiter = RateLimiter(self.limits, client=self.client)
+        if shedder is not None and not isinstance(shedder, LoadShedder):
+            shedder = LoadShedder(threshold=shedder)
+        if flight and not isinstance(flight, SingleFlight):
+            flight = SingleFlight()
+        return limiter, shedder, flight or None
+
+    def cache_policy(self, model):
+        """
+        Response cache for one model. `caching` is either one CachePolicy for
+        every model, or a dict keyed by model or table name.
+        """
+
+        policy = self.caching
+        if isinstance(policy, dict):
+            policy = policy.get(model, policy.get(model.__tablename__, None))
+        if policy is None:
+            return None
+        self.responses[model.__tablename__] = ResponseCache(policy)
+        return self.responses[model.__tablename__]
+
+    def export_manager(self):
+        """
+        Export jobs are opt-in: `exports` is an ExportManager, or True for one
+        with the default settings.
+        """
+
+        if self.exports is True:
+            self.exports = ExportManager()
+        return self.exports or None
+
+    def writer(self, model):
+        """
+        Write-behind queue of one model. `write_behind` is either one
+        BatchPolicy for every model, or a dict keyed by model or table name.
+        """
+
+        policy = self.write_behind
+        if isinstance(policy, dict):
+            policy = policy.get(model, policy.get(model.__tablename__, None))
+        if policy is None:
+            return None
+        self.writers[model.__tablename__] = WriteBehind(model, policy)
+        return self.writers[model.__tablename__]
+
+    def close(self):
+        """
+        Flush every write-behind queue, for application shutdown hooks.
+        """
+
+        for writer in self.writers.values():
+            writer.close()
+
+    def shard_map(self, model):
+        """
+        Shard map of one model. `shards` is either one ShardMap for every
+        model, or a dict keyed by model or table name.
+        """
+
+        shards = self.shards
+        if isinstance(shards, dict):
+            shards = shards.get(model, shards.get(model.__tablename__, None))
+        if shards is not None and not isinstance(shards, ShardMap):
+            shards = ShardMap(shards)
+        return shards
+
     def prepare(self):
+        limiter, shedder, flight = self.guards()
         # first cycle through each of the assigned models
         for item in self.models:
             routes: Routes
@@ -119,7 +299,14 @@ class Architect(Blueprint):
                 config = self.extract_config_override(item)
                 routes = Routes(*config)
             else:
-                routes = Routes(item, self.dao, self.key or primary, response=self.response)
+                routes = Routes(
+                    item, self.dao, self.key or primary, response=self.response, advisor=self.advisor,
+                    render=self.render, limiter=limiter, shedder=shedder, flight=flight, scope=self.scope,
+                    responses=self.cache_policy(item), tenant=self.tenant, shards=self.shard_map(item),
+                    writer=self.writer(item), exports=self.export_manager(), timeouts=self.timeouts,
+                    deadline_header=self.deadline_header, budget=budget_for(self.budget, item),
+                    scope_headers=self.scope_headers
+                )
             prefix = f'{item.__tablename__}'
             if len(self.models) == 1:
                 prefix = ''
@@ -140,8 +327,24 @@ class Architect(Blueprint):
 
 
 class Routes:
-
-    def __init__(self, model, dao, key, throw=True, response=None, exception=None):
+    advisor = None
+    limiter = None
+    shedder = None
+    flight = None
+    scope = None
+    scope_headers = SCOPE_HEADERS
+    responses = None
+    tenant = None
+    shards = None
+    writer = None
+    exports = None
+    timeouts = None
+    deadline_header = DEADLINE_HEADER
+    budget = None
+    batch_limit = 1000
+    render = ORM_RENDER
+
+    def __init__(self, model, dao, key, throw=True, response=None, exception=None, **kwargs):
         self.model = model
         self.dao = dao
         self.key = key
@@ -149,8 +352,21 @@ class Routes:
         self.response = response
         self.exception = exception
 
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def observe(self, queryargs=None, key=None):
+        if not self.advisor:
+            return
+        filters, sort = [], None
+        if queryargs:
+            filters = list(queryargs.filters) + [item[0] for item in list(queryargs.min) + list(queryargs.max)]
+            sort = queryargs.sortkey
+        self.advisor.record(self.model, filters=filters, sort=sort, key=key)
+
     def json(self, data, *args, **kwargs):
-        return iserialize(data, **kwargs)
+        with serializing():
+            return iserialize(data, **kwargs)
 
     @link(url='', methods=['GET'])
     def get(self, *args, **kwargs):
@@ -169,13 +385,159 @@ class Routes:
         :rtype: HTTPSuccess
         """
 
-        query = QueryBuffer(self.model).all()
-        return self.response(HTTPSuccess(self.json(query.data, **query.queryargs.__dict__)))
+        queryargs = querystring()
+        start = self.constrain(queryargs)
+
+        if self.shards is not None:
+            self.observe(queryargs)
+            return self.response(self.page(self.gather(queryargs, start), queryargs, start))
+
+        query = QueryBuffer(self.model, queryargs=queryargs)
+        self.observe(query.queryargs)
+        if not query.paginated:
+            self.estimate(query, start)
+            blob = self.rendered(query) if self.render_mode() == SQL_RENDER else None
+            if blob is not None:
+                return self.response(passthrough(blob))
+
+        query.all()
+        options = query.queryargs.__dict__
+        if self.budget is None or not self.budget.bytes:
+            return self.response(HTTPSuccess(self.json(query.data, **options)))
+
+        def encode(item):
+            return self.json([item], **options)[0]
+        return self.response(self.page(query.data, query.queryargs, start, encode))
+
+    def estimate(self, query, start=0):
+        """
+        Offset an unpaginated list query to the start of its cursor and check
+        its estimated cost against the row budget.
+        """
+
+        if start:
+            query.basequery = query.basequery.offset(start)
+        if self.budget is None:
+            return
+        try:
+            self.budget.check_rows(getsession(), query.query, self.model, query.queryargs)
+        except ValueError as error:
+            raise HTTPBadRequest(msg=str(error))
+
+    def rendered(self, query):
+        """
+        Render a list query to its JSON document in the database.
+
+        :return: the document, or None when the query needs the ORM path
+        """
+
+        queryargs = query.queryargs
+        try:
+            blob = render(
+                getsession(), query.query, self.model, queryargs.include, queryargs.rels, queryargs.exclusions
+            )
+        except NotImplementedError:
+            return None
+        # An oversized page goes through the ORM path, which can cut it
+        if self.budget is not None and self.budget.bytes and len(blob) > self.budget.bytes:
+            return None
+        return blob
+
+    def constrain(self, queryargs):
+        """
+        Apply the cost budget of the model and any continuation cursor to the
+        arguments of a list request, before anything is queried.
+
+        :return: offset the requested rows start at
+        :rtype: int
+        """
+
+        start = 0
+        token = request.args.get(CURSOR_ARGUMENT, None)
+        try:
+            if token:
+                start, queryargs.limit = decode_cursor(token)
+                queryargs.page = None
+            if self.budget is not None:
+                self.budget.check(self.model, queryargs)
+        except ValueError as error:
+            raise HTTPBadRequest(msg=str(error))
+        return start
+
+    def page(self, rows, queryargs, start=0, encode=None):
+        """
+        Build the response of a list request. Under a byte budget the rows are
+        serialised with `encode` until the budget is spent, and a cursor to the
+        remaining rows of the page is returned with them.
+        """
+
+        budget = self.budget.bytes if self.budget is not None else None
+        if not budget:
+            return HTTPSuccess([encode(row) for row in rows] if encode else rows)
+
+        kept, cut = truncate(rows, budget, encode)
+        if not cut:
+            return HTTPSuccess(kept)
+        window = queryargs.limit
+        if queryargs.page:
+            start, window = (queryargs.page - 1) * queryargs.pagesize, queryargs.pagesize
+        return HTTPSuccess(kept, cursor=encode_cursor(start + len(kept), window - len(kept)))
+
+    def gather(self, queryargs, start=0):
+        """
+        List query over a sharded model. Every shard runs the same query
+        concurrently, for as many rows as the requested page needs, and the
+        serialised rows are merged back in sort order.
+        """
+
+        window, offset = start + queryargs.limit, start
+        if queryargs.page:
+            offset = (queryargs.page - 1) * queryargs.pagesize
+            window = offset + queryargs.pagesize
+
+        def work():
+            args = copy.deepcopy(queryargs)
+            args.page, args.limit = None, window
+            query = QueryBuffer(self.model, queryargs=args).all()
+            return self.json(query.data, **query.queryargs.__dict__), query.queryargs.sortkey
+
+        results = fan_out(self.shards, work)
+        rows = merge([data for data, _ in results], results[0][1], queryargs.descending)
+        return rows[offset:window]
+
+    def lookup_many(self, keys):
+        if self.shards is None:
+            return lookup_many(self.model, self.key, keys, scoped=True)
+
+        found = dict()
+        for shard, values in partition(self.shards, self.model, self.key, keys).items():
+            with shard_context(shard):
+                found.update(zip(values, lookup_many(self.model, self.key, values, scoped=True)))
+        return [found[key] for key in keys]
+
+    def render_mode(self):
+        return request.args.get(RENDER_ARGUMENT, None) or self.render
+
+    def fetch(self, resource, queryargs):
+        """
+        Single row lookup by key. Plain lookups go through the request scoped
+        identity cache and the baked query path, so a row is loaded at most once
+        per request. Field projections (`?only=`) still need the full
+        QueryBuffer treatment.
+        """
+
+        if queryargs is not None and queryargs.include:
+            return QueryBuffer(self.model, queryargs=queryargs).one(self.key, resource).data
+
+        instance = identity_lookup(self.model, self.key, resource, scoped=True)
+        if instance is None:
+            raise HTTPNotFound(f'{str(self.model.__tablename__).capitalize()} not found!')
+        return instance
 
     @link(url='/<resource>', methods=['HEAD'])
     def head(self, resource):
-        query = QueryBuffer(self.model)
-        resp = query.one(self.key, resource)
+        self.observe(key=self.key)
+        resp = self.fetch(resource, querystring())
 
         if not resp:
             return self.exception(HTTPNotFound())
@@ -203,18 +565,214 @@ class Routes:
         if isinstance(resource, str) and resource.endswith('/'):
             resource = resource.split('/').pop(0)
 
-        query = QueryBuffer(self.model)
-        resp = query.one(self.key, resource)
+        queryargs = querystring()
+        self.observe(key=self.key)
+        resp = self.fetch(resource, queryargs)
 
         if not resp:
             return self.exception(HTTPNotFound())
 
-        return self.response(HTTPSuccess(self.json(query.data, **query.queryargs.__dict__)))
+        return self.response(HTTPSuccess(self.json(resp, **queryargs.__dict__)))
+
+    def batch_keys(self):
+        if request.method == 'POST':
+            keys = (request.json or {}).get('ids', None)
+            if not isinstance(keys, list):
+                raise HTTPBadRequest(msg='Batch requests require an ids list')
+            return keys
+        keys = request.args.get('ids', '')
+        return [key for key in keys.split(',') if key != '']
+
+    @link(url='/_batch', methods=['GET', 'POST'])
+    def batch(self, *args, **kwargs):
+        """
+        Batch GET by key handler. Fetches many resources in one round trip,
+        structured like so:
+
+        `HTTP GET http://localhost:5000/<prefix>/<route-model>/_batch?ids=1,2,3`
+
+        Or, for key lists too long for a URL:
+
+        `HTTP POST http://localhost:5000/<prefix>/<route-model>/_batch`
+        with the body `{"ids": [1, 2, 3]}`
+
+        Rows are loaded with chunked WHERE key IN (...) statements. The data list
+        keeps the requested order, with null for every key that does not exist.
+        Those keys are also listed under `missing`.
+
+        :return: response object with application/json content-type preset.
+        :rtype: HTTPSuccess
+        """
+
+        keys = self.batch_keys()
+        if not keys:
+            raise HTTPBadRequest(msg='Batch requests require at least one id')
+        if len(keys) > self.batch_limit:
+            raise HTTPBadRequest(msg=f'Batch requests are limited to {self.batch_limit} ids')
+
+        queryargs = querystring('ids')
+        instances = self.lookup_many(keys)
+        data = [self.json(item, **queryargs.__dict__) if item is not None else None for item in instances]
+        missing = [key for key, item in zip(keys, instances) if item is None]
+        return self.response(HTTPSuccess(data, missing=missing))
+
+    @link(url='/_bulk/<string:action>', methods=['POST'])
+    def bulk(self, action, *args, **kwargs):
+        """
+        Bulk soft delete, deactivate or restore handler, structured like so:
+
+        `HTTP POST http://localhost:5000/<prefix>/<route-model>/_bulk/<delete|deactivate|restore>`
+        with the body `{"ids": [1, 2, 3]}`, or `{"filters": {"field": "value"}}`
+        optionally with `min` and `max` bounds of the same shape. Given both,
+        only the listed rows matching the filters change.
+
+        The active flag is set with chunked UPDATE statements, no row is loaded
+        into the session. The number of rows changed comes back as `count`.
+
+        :return: response object with application/json content-type preset.
+        :rtype: HTTPSuccess
+        """
+
+        if action not in BULK_ACTIONS:
+            raise HTTPBadRequest(msg=f'Bulk action must be one of {", ".join(BULK_ACTIONS)}')
+
+        payload = request.json or {}
+        keys = payload.get('ids', None)
+        if keys is not None and not isinstance(keys, list):
+            raise HTTPBadRequest(msg='Bulk requests require an ids list')
+
+        bounds = [payload.get(name, None) or {} for name in ('filters', 'min', 'max')]
+        if not all(isinstance(item, dict) for item in bounds):
+            raise HTTPBadRequest(msg='Bulk filters, min and max must be objects')
+
+        try:
+            filters, minimum, maximum = bounds
+            where = criteria(self.model, filters, minimum.items(), maximum.items())
+            if self.shards is None:
+                groups = {None: keys}
+            elif keys is None:
+                groups = {shard: None for shard in self.shards.binds}
+            else:
+                groups = partition(self.shards, self.model, self.key, keys)
+
+            count = 0
+            for shard, values in groups.items():
+                with shard_context(shard):
+                    count += bulk_flag(
+                        self.model, BULK_ACTIONS[action], keys=values, where=where, key=self.key, session=getsession()
+                    )
+        except ValueError as error:
+            raise HTTPBadRequest(msg=str(error))
+        return self.response(HTTPSuccess(dict(count=count)))
+
+    @link(url='/_aggregate', methods=['GET'])
+    def aggregate(self, *args, **kwargs):
+        """
+        Aggregation handler, computed in the database with a single GROUP BY
+        query, structured like so:
+
+        `HTTP GET http://localhost:5000/<prefix>/<route-model>/_aggregate?group_by=a,b&sum=x&avg=y&count=*`
+
+        Every other argument filters the rows exactly as it would for the list
+        handler. Each group comes back as one row holding the group columns and
+        the aggregates, labelled `<function>_<field>` (or `count` for count=*).
+
+        :return: response object with application/json content-type preset.
+        :rtype: HTTPSuccess
+        """
+
+        if self.shards is not None:
+            raise HTTPBadRequest(msg='Aggregates are not supported on sharded resources')
+
+        try:
+            allowed = set(columns(self.model, strformat=True)).difference(hidden(self.model))
+            groups, aggregates = parse(request.args, allowed)
+        except ValueError as error:
+            raise HTTPBadRequest(msg=str(error))
+
+        queryargs = querystring(*AGGREGATE_ARGUMENTS)
+        query = QueryBuffer(self.model, queryargs=queryargs)
+        self.observe(queryargs)
+        data = aggregate(getsession(), query.query, groups, aggregates)
+        return self.response(HTTPSuccess(data))
+
+    @uncached
+    @link(url='/_exports', methods=['POST'])
+    def export(self, *args, **kwargs):
+        """
+        Export job handler, for result sets too large to serve within one
+        request, structured like so:
+
+        `HTTP POST http://localhost:5000/<prefix>/<route-model>/_exports?_format=csv&field=value`
+
+        The usual query string filters, ordering and projections apply, the
+        format is one of json, ndjson or csv. The rows are read from one
+        consistent snapshot and written to a file by a background worker.
+        Progress is reported at `GET .../_exports/<id>` and the finished file
+        is served from `GET .../_exports/<id>/download`, with Range support.
+
+        Exports are only served when the Architect was given `exports`, and
+        the request is checked against the cost budget like a list request.
+
+        :return: 202 with the job description and its Location
+        """
+
+        if self.exports is None:
+            raise HTTPNotFound()
+
+        fmt = request.args.get(FORMAT_ARGUMENT, None) or (request.get_json(silent=True) or {}).get('format', 'json')
+        queryargs = querystring()
+        self.observe(queryargs)
+
+        def source():
+            args = copy.deepcopy(queryargs)
+            args.page, args.limit = None, None
+            return QueryBuffer(self.model, queryargs=args).query
+
+        if self.budget is not None:
+            try:
+                self.budget.check(self.model, queryargs)
+                self.budget.check_rows(getsession(), source(), self.model, queryargs)
+            except ValueError as error:
+                raise HTTPBadRequest(msg=str(error))
+
+        def encode(item):
+            return self.json(item, **queryargs.__dict__)
+
+        shards = self.shards.binds if self.shards is not None else None
+        try:
+            job = self.exports.submit(self.model, fmt, source, encode, shards=shards)
+        except ValueError as error:
+            raise HTTPBadRequest(msg=str(error))
+
+        location = f'{request.base_url.rstrip("/")}/{job.id}'
+        return JsonAcceptedResponse(dict(data=job.describe()), message='Export started', headers={'Location': location})
+
+    def export_job(self, job):
+        found = self.exports.get(job) if self.exports is not None else None
+        if found is None or found.model != self.model.__tablename__ or found.tenant != current_tenant():
+            raise HTTPNotFound(msg='Export not found')
+        return found
+
+    @uncached
+    @link(url='/_exports/<string:job>', methods=['GET'])
+    def export_status(self, job, *args, **kwargs):
+        return self.response(HTTPSuccess(self.export_job(job).describe()))
+
+    @uncached
+    @link(url='/_exports/<string:job>/download', methods=['GET'])
+    def export_download(self, job, *args, **kwargs):
+        found = self.export_job(job)
+        if found.status != DONE:
+            raise HTTPConflict(msg=f'Export is {found.status}')
+        return send_file(
+            found.path, mimetype=found.mimetype, as_attachment=True, attachment_filename=found.filename,
+            conditional=True
+        )
 
     @link(url='/<resource>/<string:field>', methods=['GET'])
     def one_child_resource(self, resource, field, *args, **kwargs):
-        query = QueryBuffer(self.model, auto=False).one(self.key, resource)
-        instance = query.one(self.key, resource).data
+        instance = self.fetch(resource, None)
         path = field.split('/')
         prop = None
 
@@ -223,7 +781,7 @@ class Routes:
 
         if len(path) > 1:
             child = None
-            data = query.data
+            data = instance
             endpoint = path.pop()
             for idx, item in enumerate(path):
                 if isinstance(data, int) or isinstance(data, str):
@@ -243,12 +801,46 @@ class Routes:
     @link(url='/', methods=['POST'])
     def post(self, *args, **kwargs):
         payload = request.json
-        instance = self.dao.create(payload, **kwargs)
-        return HTTPCreated(self.json(instance))
+        if self.writer is not None:
+            return self.enqueue(payload)
+        if self.shards is None:
+            instance = self.dao.create(payload, **kwargs)
+            return HTTPCreated(self.json(instance))
+
+        value = (payload or {}).get(self.key, None)
+        if value is None:
+            raise HTTPBadRequest(msg=f'Sharded resources need {self.key} in the payload')
+        with shard_context(shard_for(self.shards, self.model, self.key, value)):
+            instance = self.dao.create(payload, **kwargs)
+            return HTTPCreated(self.json(instance))
+
+    def enqueue(self, payload):
+        """
+        Write-behind POST: the row is validated and queued, then acknowledged
+        with 202 before it is written. A full queue pushes back with 429.
+        """
+
+        try:
+            row = validate(self.model, payload)
+        except ValueError as error:
+            raise HTTPBadRequest(msg=str(error))
+
+        if self.shards is not None:
+            value = row.get(self.key, None)
+            if value is None:
+                raise HTTPBadRequest(msg=f'Sharded resources need {self.key} in the payload')
+            with shard_context(shard_for(self.shards, self.model, self.key, value)):
+                queued = self.writer.put(row)
+        else:
+            queued = self.writer.put(row)
+
+        if not queued:
+            return overloaded('Write queue is full, please retry later', self.writer.retry_after())
+        return JsonAcceptedResponse(message='Resource accepted for writing')
 
     @link(url='/<int:modelid>/<resource>/', methods=['POST'])
     def post_child_resource(self, modelid, resource, *args, **kwargs):
-        instance = QueryBuffer(self.model).one(self.key, modelid).data
+        instance = self.fetch(modelid, None)
         child = getattr(self.model.__mapper__.relationships, resource).entity.entity(**self._payload())
         getattr(instance, resource).append(child)
         dao = self.dao.save(instance)
@@ -268,7 +860,6 @@ class Routes:
 
     @link(url='/<int:modelid>', methods=['PUT'])
     def put(self, modelid, *args, **kwargs):
-        query = QueryBuffer(self.model).one(self.key, modelid)
-        instance = query.data
+        instance = self.fetch(modelid, None)
         self.dao.update(instance, self._payload())
         return HTTPUpdated(iserialize(instance))
@@ -0,0 +1,237 @@
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash
+from werkzeug.security import generate_password_hash
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+try:
+    import bcrypt
+except ImportError:
+    bcrypt = None
+
+EXTENSION_KEY = 'atomic_hasher'
+ARGON2 = 'argon2'
+BCRYPT = 'bcrypt'
+PBKDF2 = 'pbkdf2'
+THREAD_POOL = 'thread'
+PROCESS_POOL = 'process'
+
+DEFAULT_COST = {
+    ARGON2: dict(time_cost=3, memory_cost=65536, parallelism=4),
+    BCRYPT: dict(rounds=12),
+    PBKDF2: dict(iterations=150000, digest='sha256'),
+}
+DEFAULT_WORKERS = 4
+# Hashes queued or running per worker before new ones are refused
+DEFAULT_BACKLOG = 8
+RETRY_AFTER = 1
+
+BCRYPT_ROUNDS = re.compile(r'^\$2[aby]?\$(\d+)\$')
+
+
+class HasherSaturated(ServiceUnavailable):
+    """
+    Raised instead of queueing a hash once the pool backlog is full. Flask
+    answers it with a 503 and a Retry-After header.
+    """
+
+    description = 'Too many password checks in progress, please retry later'
+
+    def __init__(self, retry_after=RETRY_AFTER):
+        super().__init__()
+        self.retry_after = retry_after
+
+    def get_headers(self, environ=None):
+        return super().get_headers(environ) + [('Retry-After', str(self.retry_after))]
+
+
+def identify(hashed):
+    """
+    Work out which scheme produced a stored hash from its prefix.
+
+    :param hashed: stored password hash
+    :return: scheme name or None when unrecognised
+    :rtype: str
+    """
+
+    hashed = hashed or ''
+    if hashed.startswith('$argon2'):
+        return ARGON2
+    if BCRYPT_ROUNDS.match(hashed):
+        return BCRYPT
+    if hashed.startswith('pbkdf2:'):
+        return PBKDF2
+    return None
+
+
+def require(scheme):
+    if scheme == ARGON2 and argon2 is None:
+        raise RuntimeError('argon2 hashing requires the argon2-cffi package')
+    if scheme == BCRYPT and bcrypt is None:
+        raise RuntimeError('bcrypt hashing requires the bcrypt package')
+    if scheme not in DEFAULT_COST:
+        raise ValueError(f'Unknown password scheme {scheme}')
+
+
+def generate(scheme, cost, password):
+    # Module level so it can be shipped to a process pool
+    if scheme == ARGON2:
+        return argon2.PasswordHasher(**cost).hash(password)
+    if scheme == BCRYPT:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(cost['rounds'])).decode('utf-8')
+    return generate_password_hash(password, method=f"pbkdf2:{cost['digest']}:{cost['iterations']}")
+
+
+def verify(hashed, password):
+    scheme = identify(hashed)
+    if scheme == ARGON2:
+        require(ARGON2)
+        try:
+            return argon2.PasswordHasher().verify(hashed, password)
+        except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHash):
+            return False
+    if scheme == BCRYPT:
+        require(BCRYPT)
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+        except ValueError:
+            return False
+    return check_password_hash(hashed, password)
+
+
+class PasswordHasher:
+    """
+    Password hashing backend with a pluggable scheme (argon2, bcrypt or
+    pbkdf2) and tunable cost. Hashing and verification run on a bounded pool,
+    so a burst of logins occupies at most `workers` cores and cannot starve
+    the request threads serving other endpoints.
+
+    The calling thread still waits for its own hash, the API stays
+    synchronous. What bounds that wait is the backlog: at most `backlog`
+    hashes may be queued or running, past that `hash` and `verify` raise
+    HasherSaturated (a 503 with Retry-After) straight away instead of parking
+    one more request thread behind the pool.
+
+    Stored hashes are verified with whichever scheme produced them. When the
+    scheme or cost has changed since, `verify_and_update` returns a fresh hash
+    so the caller can store it on a successful login.
+
+    Configuration::
+
+        ATOMIC_PASSWORD_SCHEME   argon2, bcrypt or pbkdf2 (pbkdf2)
+        ATOMIC_PASSWORD_COST     dict of scheme parameters, e.g. {'rounds': 13}
+        ATOMIC_PASSWORD_WORKERS  size of the hashing pool (4)
+        ATOMIC_PASSWORD_POOL     thread or process (thread)
+        ATOMIC_PASSWORD_BACKLOG  hashes queued or running before shedding
+                                 (8 per worker)
+
+    """
+
+    def __init__(self, scheme=PBKDF2, cost=None, workers=DEFAULT_WORKERS, pool=THREAD_POOL, backlog=None):
+        require(scheme)
+        self.scheme = scheme
+        self.cost = dict(DEFAULT_COST[scheme], **(cost or {}))
+        self.workers = workers
+        self.pool = pool
+        self.backlog = backlog or workers * DEFAULT_BACKLOG
+        self.slots = threading.BoundedSemaphore(self.backlog)
+        self.executor = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            scheme=config.get('ATOMIC_PASSWORD_SCHEME', PBKDF2),
+            cost=config.get('ATOMIC_PASSWORD_COST', None),
+            workers=config.get('ATOMIC_PASSWORD_WORKERS', DEFAULT_WORKERS),
+            pool=config.get('ATOMIC_PASSWORD_POOL', THREAD_POOL),
+            backlog=config.get('ATOMIC_PASSWORD_BACKLOG', None),
+        )
+
+    def submit(self, func, *args):
+        """
+        :raises HasherSaturated: when the backlog is full
+        """
+
+        if not self.slots.acquire(blocking=False):
+            raise HasherSaturated()
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    executor = ProcessPoolExecutor if self.pool == PROCESS_POOL else ThreadPoolExecutor
+                    self.executor = executor(max_workers=self.workers)
+        try:
+            future = self.executor.submit(func, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda done: self.slots.release())
+        return future
+
+    def hash(self, password):
+        return self.submit(generate, self.scheme, self.cost, password).result()
+
+    def verify(self, hashed, password):
+        if not hashed or password is None:
+            return False
+        return self.submit(verify, hashed, password).result()
+
+    def needs_rehash(self, hashed):
+        """
+        Check whether a stored hash was produced with another scheme or cost
+        than the one currently configured.
+        """
+
+        scheme = identify(hashed)
+        if scheme != self.scheme:
+            return True
+        if scheme == ARGON2:
+            return argon2.PasswordHasher(**self.cost).check_needs_rehash(hashed)
+        if scheme == BCRYPT:
+            return int(BCRYPT_ROUNDS.match(hashed).group(1)) != self.cost['rounds']
+        method = hashed.split('$', 1)[0].split(':')
+        return method[1:] != [self.cost['digest'], str(self.cost['iterations'])]
+
+    def verify_and_update(self, hashed, password):
+        """
+        Verify a password and produce a replacement hash when the stored one
+        is out of date.
+
+        :param hashed: stored password hash
+        :param password: plain text password
+        :return: whether the password matched, and the new hash or None
+        :rtype: tuple
+        """
+
+        if not self.verify(hashed, password):
+            return False, None
+        if self.needs_rehash(hashed):
+            return True, self.hash(password)
+        return True, None
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+def get_hasher(app=None):
+    """
+    Fetch the application password hasher, creating it from the app config on
+    first use.
+    """
+
+    app = app or current_app
+    hasher = app.extensions.get(EXTENSION_KEY, None)
+    if hasher is None:
+        hasher = app.extensions.setdefault(EXTENSION_KEY, PasswordHasher.from_config(app.config))
+    return hasher
@@ -1,4 +1,10 @@
 import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from datetime import timedelta
 
@@ -7,6 +13,142 @@ import jwt
 from flask import current_app
 from flask import request
 
+HMAC_ALGORITHMS = ['HS256', 'HS384', 'HS512']
+JWKS_ALGORITHMS = ['RS256', 'RS384', 'RS512', 'ES256', 'ES384', 'ES512']
+DEFAULT_TOKEN_CACHE_SIZE = 1024
+DEFAULT_TOKEN_CACHE_TTL = 300
+
+
+class TokenCache:
+    """
+    Bounded LRU of tokens that already passed verification. Entries are keyed
+    by a digest of the token and the verifying key identity, and are held
+    until the earlier of the `exp` claim and `ttl` seconds. A hit skips the JWT parse
+    and the signature check entirely. Failed verifications are never cached.
+    """
+
+    def __init__(self, maxsize=DEFAULT_TOKEN_CACHE_SIZE, ttl=DEFAULT_TOKEN_CACHE_TTL, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def digest(token, key):
+        if isinstance(token, str):
+            token = token.encode('utf-8')
+        return hashlib.sha256(token + b'.' + fingerprint(key)).digest()
+
+    def get(self, token, key):
+        digest = self.digest(token, key)
+        with self.lock:
+            entry = self.entries.get(digest, None)
+            if entry is None:
+                return None
+            if entry[1] <= self.clock():
+                del self.entries[digest]
+                return None
+            self.entries.move_to_end(digest)
+            return dict(entry[0])
+
+    def put(self, token, key, result, exp=None):
+        if self.maxsize <= 0:
+            return
+        expires = self.clock() + self.ttl
+        if exp is not None:
+            expires = min(expires, exp)
+        digest = self.digest(token, key)
+        with self.lock:
+            self.entries[digest] = (dict(result), expires)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+_tokens = TokenCache()
+_jwks = dict()
+_jwks_lock = threading.Lock()
+
+
+def fingerprint(key):
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    return hashlib.sha256(key or b'').digest()
+
+
+def load_jwks(path):
+    """
+    Load the public keys of a local JWKS file, keyed by `kid`. The parsed keys
+    are cached until the file modification time changes.
+
+    :param path: path to a JSON Web Key Set file
+    :return: dict of kid to (algorithm, public key, key identity)
+    :rtype: dict
+    """
+
+    mtime = os.stat(path).st_mtime
+    cached = _jwks.get(path, None)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    from jwt.algorithms import ECAlgorithm
+    from jwt.algorithms import RSAAlgorithm
+
+    with open(path) as fh:
+        document = json.load(fh)
+
+    keys = dict()
+    for jwk in document.get('keys', []):
+        serialised = json.dumps(jwk, sort_keys=True)
+        if jwk.get('kty') == 'RSA':
+            keys[jwk.get('kid')] = (jwk.get('alg', 'RS256'), RSAAlgorithm.from_jwk(serialised), serialised)
+        elif jwk.get('kty') == 'EC':
+            keys[jwk.get('kid')] = (jwk.get('alg', 'ES256'), ECAlgorithm.from_jwk(serialised), serialised)
+
+    with _jwks_lock:
+        _jwks[path] = (mtime, keys)
+    return keys
+
+
+def verification_key(auth_token, secret_key=None):
+    """
+    Pick the key and allowed algorithms for a token. Asymmetric tokens are
+    verified against the JWKS file in `JWT_JWKS_FILE` by their `kid`, every
+    other token against the HMAC secret. The algorithm list is pinned to the
+    key type so a token can never select HMAC with a public key.
+
+    :return: key, allowed algorithms and the key identity used by the cache
+    :rtype: tuple
+    """
+
+    header = jwt.get_unverified_header(auth_token)
+    path = current_app.config.get('JWT_JWKS_FILE', None)
+    if path and header.get('alg') in JWKS_ALGORITHMS:
+        keys = load_jwks(path)
+        if header.get('kid') not in keys:
+            raise jwt.InvalidTokenError('Unknown signing key')
+        algorithm, key, identity = keys[header.get('kid')]
+        return key, [algorithm], identity
+    secret_key = secret_key or current_app.config.get('SECRET_KEY')
+    return secret_key, HMAC_ALGORITHMS, secret_key
+
+
+def token_cache():
+    config = current_app.config
+    if 'ATOMIC_TOKEN_CACHE_SIZE' in config:
+        _tokens.maxsize = config['ATOMIC_TOKEN_CACHE_SIZE']
+    if 'ATOMIC_TOKEN_CACHE_TTL' in config:
+        _tokens.ttl = config['ATOMIC_TOKEN_CACHE_TTL']
+    return _tokens
+
 
 def encode_auth_token(user_id, secret_key, expiry=12, algorithm='HS256'):
     try:
@@ -28,12 +170,20 @@ def decode_auth_token(auth_token, secret_key=None):
     if not secret_key and not current_app.config.get('SECRET_KEY', None):
         raise AttributeError('Decoding requires an application SECRET_KEY')
 
+    cache = token_cache()
     try:
-        payload = jwt.decode(auth_token, secret_key)
-        return {
+        key, algorithms, identity = verification_key(auth_token, secret_key)
+        decoded = cache.get(auth_token, identity)
+        if decoded is not None:
+            return decoded
+
+        payload = jwt.decode(auth_token, key, algorithms=algorithms)
+        decoded = {
             'user': payload.get('sub', None),
             'access': True
         }
+        cache.put(auth_token, identity, decoded, payload.get('exp', None))
+        return decoded
     except jwt.ExpiredSignatureError:
         return 'Auth token expired. Please log in again'
     except jwt.InvalidTokenError:
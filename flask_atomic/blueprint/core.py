@@ -6,12 +6,19 @@ from flask import Blueprint
 from flask import jsonify
 from flask import request
 
+from flask_atomic.builder.flight import SingleFlight
+from flask_atomic.builder.flight import coalesced
 from flask_atomic.dao.base import BaseDAO
 from flask_atomic.http.exceptions import HTTPBadRequest
 from flask_atomic.http.exceptions import HTTPNotFound
 from flask_atomic.http.exceptions import HTTPConflict
 from flask_atomic.http.responses import HTTPSuccess
 from flask_atomic.orm.base import DeclarativeBase
+from flask_atomic.orm.jsonsql import ORM_RENDER
+from flask_atomic.orm.jsonsql import RENDER_ARGUMENT
+from flask_atomic.orm.jsonsql import SQL_RENDER
+from flask_atomic.orm.jsonsql import passthrough
+from flask_atomic.orm.jsonsql import render
 
 from sqlalchemy_blender.helpers import columns
 
@@ -28,7 +35,8 @@ class CoreBlueprint(Blueprint):
     are taken away from the base Flask Blueprint.
     """
 
-    def __init__(self, name, module, model, dao=None, decorator=None, methods=None, url_prefix=None, lookupkey=None):
+    def __init__(self, name, module, model, dao=None, decorator=None, methods=None, url_prefix=None, lookupkey=None,
+                 advisor=None, render=None, coalesce=False):
         # Make sure super call stays on top. Otherwise Blueprint functions are inaccessible
         super().__init__(name, module)
 
@@ -46,6 +54,11 @@ class CoreBlueprint(Blueprint):
             lookupkey = getattr(model, 'identify_primary_key', None)
 
         self.lookupkey = lookupkey
+        self.advisor = advisor
+        self.render = render or ORM_RENDER
+        self.flight = None
+        if coalesce:
+            self.flight = coalesce if isinstance(coalesce, SingleFlight) else SingleFlight()
 
         self.methods = methods
         if methods is None:
@@ -56,6 +69,9 @@ class CoreBlueprint(Blueprint):
         self.dao = self.__set_dao(dao, model)
         self.__register_principal_endpoints()
 
+        if self.advisor:
+            self.record_once(self.__check_indexes)
+
     def allhttp(self):
         self.methods = ACCEPTED_METHODS
 
@@ -82,6 +98,20 @@ class CoreBlueprint(Blueprint):
         dao.model = model
         return dao
 
+    def __check_indexes(self, state) -> None:
+        if not self.advisor.logger:
+            self.advisor.logger = state.app.logger
+        self.advisor.check(self.model, [self.lookupkey])
+
+    def __observe(self, queryargs=None, key=None) -> None:
+        if not self.advisor:
+            return
+        filters, sort = [], None
+        if queryargs:
+            filters = list(queryargs.filters) + list(queryargs.min[::2]) + list(queryargs.max[::2])
+            sort = queryargs.sortkey
+        self.advisor.record(self.model, filters=filters, sort=sort, key=key)
+
     def default_handler(self, path: str):
         """
         This is the default route handler, if the endpoint regex check fails for
@@ -115,6 +145,19 @@ class CoreBlueprint(Blueprint):
         """
 
         dao = self.dao(self.model, querystring=request.args).autoquery()
+        self.__observe(dao.queryargs)
+        if (request.args.get(RENDER_ARGUMENT) or self.render) == SQL_RENDER:
+            query = dao.query()
+            try:
+                blob = render(
+                    self.model.query.session, query.query, self.model,
+                    dao.queryargs.include, dao.queryargs.rels, dao.queryargs.exclusions
+                )
+                schema = query.schema(self.model.schema(), query.fields)
+                return passthrough(blob, message=HTTPSuccess.message, schema=schema)
+            except NotImplementedError:
+                pass
+
         buffer = self.__dao_query_forwarder(dao.query().all)
         try:
             data = buffer.json(exclude=dao.queryargs.exclusions)
@@ -137,6 +180,7 @@ class CoreBlueprint(Blueprint):
         """
 
         dao = self.dao(self.model, querystring=request.args).autoquery()
+        self.__observe(key=self.lookupkey)
         query = partial(dao.get_one_by, self.lookupkey, uuid)
         buffer = self.__dao_query_forwarder(query)
         buffer.relationships = dao.queryargs.rels
@@ -284,7 +328,7 @@ class CoreBlueprint(Blueprint):
 
         for item in list(filter(lambda r: r.get('method') in self.methods, route_table)):
             method = str(item.get('method'))
-            view_func = self.decorator(item.get('hdl'))
+            view_func = self.decorator(coalesced(item.get('hdl'), self.flight))
             self.add_url_rule(
                 item.get('route'),
                 item.get('hdl').__name__,
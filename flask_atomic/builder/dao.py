@@ -7,6 +7,17 @@ from sqlalchemy_blender.helpers import relationships
 from sqlalchemy_blender.helpers import primarykey
 
 from flask_atomic.database import db
+from flask_atomic.orm.archive import archive
+from flask_atomic.orm.bulk import INACTIVE
+from flask_atomic.orm.bulk import bulk_flag
+from flask_atomic.orm.bulk import criteria
+from flask_atomic.orm.lookup import forget
+from flask_atomic.orm.lookup import identity_lookup
+from flask_atomic.orm.slowlog import tracking
+from flask_atomic.orm.softdelete import DELETED
+from flask_atomic.orm.softdelete import LIVE
+from flask_atomic.orm.softdelete import set_flag
+from flask_atomic.orm.transaction import run_transaction
 
 from handyhttp.exceptions import HTTPConflict
 from handyhttp.exceptions import HTTPBadRequest
@@ -26,11 +37,7 @@ class ModelDAO:
         self.autoupdate = autoupdate
 
     def one(self, value, key=None):
-        if not key:
-            key = self.model.__mapper__.primary_key[0].name
-        filter_expression = {key: value}
-        query = self.model.query.filter_by(**filter_expression)
-        return query.first()
+        return identity_lookup(self.model, key, value, getsession())
 
     def validate_arguments(self, payload):
         valid_fields = dir(self.model)
@@ -50,29 +57,15 @@ class ModelDAO:
     def commit(self, operation, instance):
         session = getsession()
         try:
-            session = current_app.extensions['sqlalchemy'].db.session
-            getattr(session, operation)(instance)
-            session.commit()
+            with tracking(self.model):
+                run_transaction(lambda active: getattr(active, operation)(instance), session)
+            if operation == 'delete':
+                forget(self.model)
             return instance
         except IntegrityError as exc:
-            session.rollback()
             if exc.orig.args[0] == 1452:
                 raise HTTPNotProcessable()
             raise HTTPConflict(str(exc.orig.args[1]))
-        except Exception as exc:
-            session = current_app.extensions['sqlalchemy'].db.session
-            try:
-                local_object = session.merge(session)
-                session.add(local_object)
-                session.commit()
-
-                session = session.object_session()
-                getattr(session, operation)(instance)
-                session.commit()
-            except Exception:
-                session.rollback()
-                session.flush()
-                # session.closed()
 
     def delete(self, instance):
         if not instance:
@@ -157,5 +150,36 @@ class ModelDAO:
         return instance
 
     def softdelete(self, instance, flag):
-        instance.active = flag
+        set_flag(instance, flag)
         self.save(instance)
+        forget(self.model)
+
+    def bulk_flag(self, flag, keys=None, filters=None):
+        """
+        Flag many rows at once, by key or by column filters, without loading
+        any instance.
+
+        :return: number of rows changed
+        :rtype: int
+        """
+
+        try:
+            where = criteria(self.model, filters) if filters else None
+            return bulk_flag(self.model, flag, keys=keys, where=where, session=getsession())
+        except ValueError as error:
+            raise HTTPBadRequest(str(error))
+
+    def archive(self, before=None, **kwargs):
+        try:
+            return archive(self.model, before, session=getsession(), **kwargs)
+        except ValueError as error:
+            raise HTTPBadRequest(str(error))
+
+    def bulk_softdelete(self, keys=None, filters=None):
+        return self.bulk_flag(DELETED, keys, filters)
+
+    def bulk_deactivate(self, keys=None, filters=None):
+        return self.bulk_flag(INACTIVE, keys, filters)
+
+    def bulk_restore(self, keys=None, filters=None):
+        return self.bulk_flag(LIVE, keys, filters)
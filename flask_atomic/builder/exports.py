@@ -0,0 +1,223 @@
+import csv
+import json
+import os
+import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from flask_atomic.builder.dao import getsession
+from flask_atomic.orm.sharding import shard_context
+from flask_atomic.orm.tenancy import current_tenant
+from flask_atomic.orm.tenancy import tenant_context
+
+FORMAT_ARGUMENT = '_format'
+FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Isolation giving one consistent snapshot for a whole read transaction.
+# SQLite reads inside a single transaction already see one snapshot.
+SNAPSHOT_ISOLATION = {
+    'postgresql': 'REPEATABLE READ',
+    'mysql': 'REPEATABLE READ',
+}
+DEFAULT_WORKERS = 2
+DEFAULT_TTL = 3600
+DEFAULT_CHUNK = 1000
+
+
+class ExportJob:
+
+    def __init__(self, model, fmt, tenant=None):
+        self.id = secrets.token_urlsafe(16)
+        self.model = model.__tablename__
+        self.format = fmt
+        self.tenant = tenant
+        self.status = PENDING
+        self.rows = 0
+        self.total = None
+        self.path = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def mimetype(self):
+        return FORMATS[self.format]
+
+    @property
+    def filename(self):
+        return f'{self.model}-{self.id}.{self.format}'
+
+    def describe(self):
+        progress = None
+        if self.status == DONE:
+            progress = 1.0
+        elif self.total:
+            progress = round(min(1.0, self.rows / self.total), 4)
+        return dict(
+            id=self.id, status=self.status, format=self.format, rows=self.rows, total=self.total,
+            progress=progress, error=self.error
+        )
+
+
+def cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return value
+
+
+def write(handle, fmt, rows, progress):
+    """
+    Stream serialised rows into an open file in one of the export formats.
+    """
+
+    if fmt == 'csv':
+        output = None
+        for row in rows:
+            if output is None:
+                output = csv.DictWriter(handle, fieldnames=list(row.keys()), extrasaction='ignore')
+                output.writeheader()
+            output.writerow({key: cell(value) for key, value in row.items()})
+            progress()
+        return
+
+    if fmt == 'json':
+        handle.write('[')
+    for idx, row in enumerate(rows):
+        if fmt == 'json':
+            handle.write(',\n' if idx else '\n')
+            handle.write(json.dumps(row, default=str))
+        else:
+            handle.write(json.dumps(row, default=str) + '\n')
+        progress()
+    if fmt == 'json':
+        handle.write('\n]')
+
+
+def snapshot(session, model):
+    """
+    Open the read transaction of an export, at an isolation level where
+    every statement in it sees the same snapshot.
+    """
+
+    mapper = model.__mapper__
+    level = SNAPSHOT_ISOLATION.get(session.get_bind(mapper=mapper).dialect.name, None)
+    options = {'isolation_level': level} if level else None
+    return session.connection(mapper=mapper, execution_options=options)
+
+
+class ExportManager:
+    """
+    Runs exports of generated resources in a background worker pool. Each job
+    reads its rows in one snapshot transaction (one per shard for sharded
+    models), streams them to a local file and exposes its progress. Finished
+    files are removed `ttl` seconds after completion.
+
+    The directory comes from `ATOMIC_EXPORT_DIR`, or the `directory` given
+    here, or a folder under the system temporary directory.
+    """
+
+    def __init__(self, directory=None, workers=DEFAULT_WORKERS, ttl=DEFAULT_TTL, chunk=DEFAULT_CHUNK):
+        self.directory = directory
+        self.workers = workers
+        self.ttl = ttl
+        self.chunk = chunk
+        self.jobs = dict()
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def folder(self, app):
+        folder = app.config.get('ATOMIC_EXPORT_DIR', None) or self.directory
+        if not folder:
+            folder = os.path.join(tempfile.gettempdir(), 'flask-atomic-exports')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def get(self, jobid):
+        with self.lock:
+            return self.jobs.get(jobid, None)
+
+    def expire(self):
+        now = time.time()
+        with self.lock:
+            expired = [job for job in self.jobs.values() if job.finished and now - job.finished > self.ttl]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            if job.path and os.path.exists(job.path):
+                os.remove(job.path)
+
+    def submit(self, model, fmt, source, serialize, shards=None):
+        """
+        Queue an export.
+
+        :param model: SQLAlchemy model
+        :param fmt: one of FORMATS
+        :param source: callable returning the ORM query to export
+        :param serialize: callable turning one instance into a dict
+        :param shards: binds to read from one after the other, None when not sharded
+        :return: the queued job
+        :rtype: ExportJob
+        """
+
+        if fmt not in FORMATS:
+            raise ValueError(f'Export format must be one of {", ".join(FORMATS)}')
+
+        self.expire()
+        app = current_app._get_current_object()
+        job = ExportJob(model, fmt, current_tenant())
+        job.path = os.path.join(self.folder(app), job.filename)
+        with self.lock:
+            self.jobs[job.id] = job
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.executor.submit(self.run, app, job, model, source, serialize, shards or [None])
+        return job
+
+    def rows(self, job, model, source, serialize, shard):
+        with shard_context(shard):
+            session = getsession()
+            try:
+                snapshot(session, model)
+                query = source()
+                job.total = (job.total or 0) + query.order_by(None).count()
+                for item in query.yield_per(self.chunk):
+                    yield serialize(item)
+            finally:
+                session.rollback()
+
+    def run(self, app, job, model, source, serialize, shards):
+        job.status = RUNNING
+        partial = f'{job.path}.part'
+
+        def progress():
+            job.rows += 1
+
+        try:
+            with app.app_context(), tenant_context(job.tenant):
+                try:
+                    with open(partial, 'w', newline='') as handle:
+                        rows = (row for shard in shards for row in self.rows(job, model, source, serialize, shard))
+                        write(handle, job.format, rows, progress)
+                finally:
+                    getsession().remove()
+            os.replace(partial, job.path)
+            job.status = DONE
+        except Exception as error:
+            app.logger.exception('Export %s of %s failed', job.id, job.model)
+            job.status, job.error = FAILED, str(error)
+            if os.path.exists(partial):
+                os.remove(partial)
+        finally:
+            job.finished = time.time()
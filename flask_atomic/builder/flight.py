@@ -0,0 +1,144 @@
+import hashlib
+import threading
+from functools import wraps
+
+from flask import current_app
+from flask import request
+
+from flask_atomic.metrics import observe_cache
+from flask_atomic.orm.slowlog import explain_requested
+from flask_atomic.orm.tenancy import current_tenant
+
+COALESCED_METHODS = ('GET', 'HEAD')
+# Request headers identifying the caller, override with `scope_headers=` on
+# the Architect when credentials travel in other headers.
+SCOPE_HEADERS = ('Authorization', 'Api-Authorization', 'Cookie')
+UNCACHED = '__uncached__'
+
+
+def uncached(func):
+    """
+    Mark a handler whose responses must never be shared or cached, such as
+    file downloads. Coalescing and the response cache leave it alone.
+    """
+
+    setattr(func, UNCACHED, True)
+    return func
+
+
+class Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution. The first
+    caller runs the work, everyone arriving while it is in flight waits for it
+    and receives the same result (or exception). Nothing is kept once the call
+    completes, this is not a cache.
+    """
+
+    def __init__(self):
+        self.calls = dict()
+        self.lock = threading.Lock()
+
+    def do(self, key, work):
+        """
+        :param key: hashable key identifying identical work
+        :param work: callable producing the result
+        :return: the result, and whether it was shared from another caller
+        :rtype: tuple
+        """
+
+        with self.lock:
+            call = self.calls.get(key, None)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = work()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, False
+
+
+def request_scope(headers=SCOPE_HEADERS):
+    digest = hashlib.sha256()
+    for header in headers:
+        digest.update(request.headers.get(header, '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def request_key(scope=None, headers=SCOPE_HEADERS):
+    """
+    Normalised identity of a read request: the route, the query string with
+    its arguments sorted, the tenant and the auth scope of the caller, given
+    by `scope` or else hashed from the scope `headers`.
+    """
+
+    args = tuple(sorted(request.args.items(multi=True)))
+    caller = scope() if scope is not None else request_scope(headers)
+    return request.method, request.path, args, current_tenant(), caller
+
+
+class Snapshot:
+    """
+    Serialised response shared between coalesced requests. Every caller gets
+    a fresh response object built from the same body bytes, so nothing that
+    later post-processes one response can leak into another.
+    """
+
+    def __init__(self, response):
+        self.body = response.get_data()
+        self.status = response.status_code
+        self.headers = list(response.headers.items())
+
+    def response(self):
+        return current_app.response_class(self.body, status=self.status, headers=self.headers)
+
+
+def coalesced(func, flight=None, scope=None, model=None, headers=SCOPE_HEADERS):
+    """
+    Route decorator sharing one execution of `func` across identical
+    concurrent GET requests. The leader serialises its response once and
+    every waiting request is answered from those bytes.
+
+    :param func: read handler
+    :param flight: SingleFlight instance, the decorator is a no-op when None
+    :param scope: callable returning the auth scope of the current request
+    :param model: model the handler serves, for the hit and miss metrics
+    :param headers: request headers identifying the caller when `scope` is None
+    """
+
+    if flight is None or getattr(func, UNCACHED, False):
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if request.method not in COALESCED_METHODS or explain_requested():
+            return func(*args, **kwargs)
+
+        def work():
+            return Snapshot(current_app.make_response(func(*args, **kwargs)))
+
+        snapshot, shared = flight.do(request_key(scope, headers), work)
+        observe_cache(model, 'flight', shared)
+        return snapshot.response()
+    return wrapper
@@ -0,0 +1,217 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request
+from sqlalchemy.pool import QueuePool
+
+from flask_atomic.httputils.responses import JsonOverloadResponse
+from flask_atomic.metrics import observe_pool_wait
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+ANY_METHOD = '*'
+DEFAULT_BUCKETS = 10000
+
+
+def parse_rate(rate):
+    """
+    Read a rate limit such as `100/minute` or `(100, 60)`.
+
+    :param rate: rate string or (count, seconds) tuple
+    :return: (count, seconds)
+    :rtype: tuple
+    """
+
+    if isinstance(rate, (tuple, list)):
+        return int(rate[0]), float(rate[1])
+    count, _, period = str(rate).partition('/')
+    period = period.strip().lower().rstrip('s') or 'second'
+    if period not in PERIODS:
+        raise ValueError(f'Unknown rate limit period in {rate}')
+    return int(count), float(PERIODS[period])
+
+
+class TokenBucket:
+    """
+    Classic token bucket. Holds up to `capacity` tokens and refills at `rate`
+    tokens per second. Each request takes one token.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def take(self, count=1):
+        """
+        :return: whether the tokens were taken, and the seconds until they would be
+        :rtype: tuple
+        """
+
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= count:
+            self.tokens -= count
+            return True, 0
+        return False, (count - self.tokens) / self.rate
+
+
+def remote_client():
+    return request.remote_addr
+
+
+class RateLimiter:
+    """
+    Token bucket rate limits per client, model and HTTP verb. Limits are given
+    per verb, with `*` covering any verb without its own entry::
+
+        RateLimiter({'GET': '100/second', '*': '10/second'})
+
+    Clients are identified by remote address unless a `client` callable is
+    given, e.g. one returning the authenticated user or API key. The number of
+    buckets is bounded, the least recently used are dropped first.
+    """
+
+    def __init__(self, limits, client=None, clock=time.monotonic, maxsize=DEFAULT_BUCKETS):
+        self.limits = {verb.upper(): parse_rate(rate) for verb, rate in limits.items()}
+        self.client = client or remote_client
+        self.clock = clock
+        self.maxsize = maxsize
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def limit(self, verb):
+        return self.limits.get(verb, self.limits.get(ANY_METHOD, None))
+
+    def check(self, model, verb):
+        """
+        Take a token for the current client.
+
+        :return: whether the request may proceed, and the Retry-After seconds
+        :rtype: tuple
+        """
+
+        limit = self.limit(verb)
+        if limit is None:
+            return True, 0
+
+        key = (self.client(), getattr(model, '__tablename__', model), verb)
+        with self.lock:
+            bucket = self.buckets.get(key, None)
+            if bucket is None:
+                count, seconds = limit
+                bucket = self.buckets[key] = TokenBucket(count / seconds, count, self.clock)
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.maxsize:
+                self.buckets.popitem(last=False)
+            return bucket.take()
+
+
+class PoolWaitMonitor:
+    """
+    Exponentially weighted average of how long checkouts wait on the
+    connection pool. The average decays while no checkouts are observed, so
+    shedding stops on its own once the pool has had time to drain.
+    """
+
+    def __init__(self, alpha=0.2, decay=5.0, clock=time.monotonic):
+        self.alpha = alpha
+        self.decay = decay
+        self.clock = clock
+        self.average = 0.0
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def observe(self, wait):
+        with self.lock:
+            self.average = self.current() * (1 - self.alpha) + wait * self.alpha
+            self.updated = self.clock()
+
+    def current(self):
+        idle = max(0.0, self.clock() - self.updated)
+        return self.average * math.exp(-idle / self.decay)
+
+    def reset(self):
+        with self.lock:
+            self.average = 0.0
+            self.updated = self.clock()
+
+
+pool_monitor = PoolWaitMonitor()
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool reporting checkout waits to the pool monitor. Enable it with::
+
+        SQLALCHEMY_ENGINE_OPTIONS = {'poolclass': TimedQueuePool}
+
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - start
+            pool_monitor.observe(wait)
+            observe_pool_wait(wait)
+
+
+class LoadShedder:
+    """
+    Rejects requests up front while the average pool checkout wait is above
+    `threshold` seconds. Failing fast with a 429 keeps the queue for the pool
+    short, so the requests that are admitted still see normal latency.
+    """
+
+    def __init__(self, threshold=0.1, retry_after=1, monitor=None):
+        self.threshold = threshold
+        self.retry_after = retry_after
+        self.monitor = monitor or pool_monitor
+
+    def check(self):
+        wait = self.monitor.current()
+        if wait <= self.threshold:
+            return True, 0
+        return False, max(self.retry_after, wait)
+
+
+def overloaded(message, retry_after):
+    return JsonOverloadResponse(
+        message=message,
+        headers={'Retry-After': str(max(1, math.ceil(retry_after)))}
+    )
+
+
+def guarded(func, model=None, limiter=None, shedder=None):
+    """
+    Wrap a route handler with load shedding and rate limiting. Either may be
+    None, in which case the handler is returned unchanged.
+    """
+
+    if limiter is None and shedder is None:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if shedder is not None:
+            allowed, retry_after = shedder.check()
+            if not allowed:
+                return overloaded('Service is overloaded, please retry later', retry_after)
+        if limiter is not None:
+            allowed, retry_after = limiter.check(model, request.method)
+            if not allowed:
+                return overloaded('Rate limit exceeded', retry_after)
+        return func(*args, **kwargs)
+    return wrapper
@@ -1,7 +1,10 @@
 import secrets
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import Blueprint
+from flask import current_app
 from flask import request
+from werkzeug.exceptions import HTTPException as WerkzeugHTTPException
 
 
 from handyhttp import HTTPSuccess
@@ -56,6 +59,18 @@ def bind(blueprint, instance, methods, tenant=None):
     return blueprint
 
 
+def wellformed(item):
+    # A sub-request is an object naming its model, and optionally its verb,
+    # key, query string and body
+    if not isinstance(item, dict) or not isinstance(item.get('model', None), str):
+        return False
+    if not isinstance(item.get('verb', 'GET'), str):
+        return False
+    if not isinstance(item.get('key', None), (str, int, type(None))) or isinstance(item.get('key', None), bool):
+        return False
+    return isinstance(item.get('query', None), (str, dict, type(None)))
+
+
 class MultiModelBuilder(Blueprint):
 
     def __init__(self, models, prefix=None, decorators=None, dao=None, **kwargs):
@@ -70,6 +85,10 @@ class MultiModelBuilder(Blueprint):
         self.dao = dao
         self.binds = []
         self.methods = ['GET', 'POST', 'PUT', 'DELETE']
+        self.routes = dict()
+        self.multi_limit = 50
+        self.multi_workers = 4
+        self.executor = None
 
         if prefix:
             self.url_prefix = prefix
@@ -109,10 +128,132 @@ class MultiModelBuilder(Blueprint):
                 routes = Routes(*config)
             else:
                 routes = Routes(item, self.dao, self.key)
+            self.routes[routes.model.__tablename__] = routes
             bind(self, routes, self.methods)
 
+        view_function = self.multi
+        for decorator in reversed(self.decorators or []):
+            view_function = decorator(view_function)
+        self.add_url_rule('/_multi', 'multi', view_function, methods=['POST'])
         # self.set_local_error_handler()
 
+    def respond(self, app):
+        # Flask's own dispatch, minus the request_started and finished signals
+        try:
+            rv = app.preprocess_request()
+            if rv is None:
+                rv = app.dispatch_request()
+        except Exception as error:
+            try:
+                rv = app.handle_user_exception(error)
+            except HTTPException as exception:
+                rv = exception.pack()
+        if isinstance(rv, WerkzeugHTTPException):
+            rv = dict(error=rv.description), rv.code
+        return app.finalize_request(rv)
+
+    def dispatch(self, base, item, headers):
+        """
+        Run one sub-request through the regular URL map and view functions, so
+        it gets the same converters, decorators and Routes handler as a direct
+        HTTP call would. The sub-request runs in its own request context, with
+        the before_request and after_request hooks and the error handlers of
+        the app. An unexpected error fails that item alone with a 500, it is
+        logged and the other items still run.
+        """
+
+        app = current_app._get_current_object()
+        model = item.get('model', None)
+        if model not in self.routes:
+            return dict(status=404, body=dict(error=f'Unknown model {model}'))
+
+        verb = str(item.get('verb', 'GET')).upper()
+        path = f'{base}/{model}'
+        if item.get('key', None) is not None:
+            path = f'{path}/{item.get("key")}'
+
+        context = app.test_request_context(
+            path, method=verb, query_string=item.get('query', None), json=item.get('body', None), headers=headers
+        )
+        with context:
+            try:
+                response = self.respond(app)
+            except Exception:
+                app.logger.exception('Composite sub-request %s %s failed', verb, path)
+                return dict(status=500, body=dict(error='Internal server error'))
+            return dict(status=response.status_code, body=response.get_json(silent=True))
+
+    def multi(self):
+        """
+        Composite request handler. Runs a list of sub-requests against the
+        models registered on this builder and returns one combined response,
+        structured like so:
+
+        `HTTP POST http://localhost:5000/<prefix>/_multi`
+
+        {
+            "concurrent": true,
+            "requests": [
+                {"model": "<tablename>", "verb": "GET", "key": 1, "query": "only=label"},
+                ...
+            ]
+        }
+
+        Every item is answered with its own status and body, in request order.
+        The whole request is refused with 400 when any item is malformed.
+        With `concurrent`, consecutive GETs run in parallel on the builder's
+        worker pool. Writes always run alone and in order.
+
+        :return: response object with application/json content-type preset.
+        :rtype: HTTPSuccess
+        """
+
+        payload = request.json
+        items = payload
+        concurrent = False
+        if isinstance(payload, dict):
+            items = payload.get('requests', None)
+            concurrent = bool(payload.get('concurrent', False))
+
+        if not isinstance(items, list) or not items:
+            return HTTPBadRequest(msg='Composite requests require a list of sub-requests').pack()
+        if len(items) > self.multi_limit:
+            return HTTPBadRequest(msg=f'Composite requests are limited to {self.multi_limit} sub-requests').pack()
+
+        malformed = [str(idx) for idx, item in enumerate(items) if not wellformed(item)]
+        if malformed:
+            return HTTPBadRequest(msg=f'Malformed sub-requests: {", ".join(malformed)}').pack()
+
+        base = request.path.rstrip('/').rsplit('/_multi', 1)[0]
+        headers = [
+            (key, value) for key, value in request.headers.items() if key.lower() not in ['content-length', 'content-type']
+        ]
+
+        results = []
+        reads = []
+        for item in items + [None]:
+            if item is not None and concurrent and str(item.get('verb', 'GET')).upper() == 'GET':
+                reads.append(item)
+                continue
+            results.extend(self.dispatch_reads(base, reads, headers))
+            reads = []
+            if item is not None:
+                results.append(self.dispatch(base, item, headers))
+        return HTTPSuccess(results)
+
+    def dispatch_reads(self, base, items, headers):
+        if len(items) < 2:
+            return [self.dispatch(base, item, headers) for item in items]
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.multi_workers)
+
+        app = current_app._get_current_object()
+
+        def run(item):
+            with app.app_context():
+                return self.dispatch(base, item, headers)
+        return list(self.executor.map(run, items))
+
 
 class Routes:
 
@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from flask import current_app
+from flask import request
+
+from flask_atomic.builder.flight import SCOPE_HEADERS
+from flask_atomic.builder.flight import UNCACHED
+from flask_atomic.builder.flight import Snapshot
+from flask_atomic.builder.flight import request_key
+from flask_atomic.metrics import observe_cache
+from flask_atomic.orm.slowlog import explain_requested
+from flask_atomic.orm.tenancy import current_tenant
+from flask_atomic.orm.tenancy import tenant_context
+
+CACHED_METHODS = ('GET', 'HEAD')
+DEFAULT_ENTRIES = 256
+DEFAULT_REFRESH_WORKERS = 2
+
+
+class CachePolicy:
+    """
+    Freshness policy of a cached endpoint. A response is served from the
+    cache for `max_age` seconds. For a further `stale_while_revalidate`
+    seconds the stale response is still served straight away while one
+    background refresh runs.
+    """
+
+    def __init__(self, max_age, stale_while_revalidate=0, maxsize=DEFAULT_ENTRIES):
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.maxsize = maxsize
+
+    def header(self, private=False):
+        directives = ['private' if private else 'public', f'max-age={int(self.max_age)}']
+        if self.stale_while_revalidate:
+            directives.append(f'stale-while-revalidate={int(self.stale_while_revalidate)}')
+        return ', '.join(directives)
+
+
+class Entry:
+
+    def __init__(self, snapshot, stored):
+        self.snapshot = snapshot
+        self.stored = stored
+        self.refreshing = False
+        # Compressed bodies, filled in by the compression layer on first use
+        self.variants = dict()
+
+
+class ResponseCache:
+    """
+    Stale-while-revalidate cache of serialised GET responses for one model.
+    Only 200 responses are stored. Any successful write through the same
+    endpoints clears the cache, so clients see their own changes. Clearing
+    also bumps the generation, and a response computed before the clear is
+    never stored after it.
+    """
+
+    def __init__(self, policy, clock=time.monotonic, workers=DEFAULT_REFRESH_WORKERS):
+        self.policy = policy
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.workers = workers
+        self.executor = None
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, response, generation=None):
+        entry = Entry(Snapshot(response), self.clock())
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.policy.maxsize:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+    def age(self, entry):
+        return self.clock() - entry.stored
+
+    def fresh(self, entry):
+        return self.age(entry) < self.policy.max_age
+
+    def servable(self, entry):
+        return self.age(entry) < self.policy.max_age + self.policy.stale_while_revalidate
+
+    def claim(self, entry):
+        # Only one refresh per entry, whoever flips the flag schedules it
+        with self.lock:
+            if entry.refreshing:
+                return False
+            entry.refreshing = True
+            return True
+
+    def refresh(self, key, entry, func, args, kwargs):
+        """
+        Re-run the handler in the background inside a copy of the current
+        request, then swap the new response in.
+        """
+
+        app = current_app._get_current_object()
+        path = request.full_path
+        method = request.method
+        headers = list(request.headers.items())
+        tenant = current_tenant()
+        generation = self.generation
+
+        def work():
+            try:
+                with app.test_request_context(path, method=method, headers=headers), tenant_context(tenant):
+                    response = app.make_response(func(*args, **kwargs))
+                    if response.status_code == 200:
+                        self.put(key, response, generation)
+            except Exception:
+                app.logger.exception('Background refresh of %s failed', path)
+            finally:
+                entry.refreshing = False
+
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self.executor.submit(work)
+
+
+def serve(cache, entry, private):
+    response = entry.snapshot.response()
+    response.variants = entry.variants
+    response.headers['Age'] = str(int(cache.age(entry)))
+    response.headers['Cache-Control'] = cache.policy.header(private)
+    return response
+
+
+def cached(func, cache=None, scope=None, model=None, headers=SCOPE_HEADERS, private=False):
+    """
+    Route decorator applying a ResponseCache to a handler. Reads are served
+    fresh or stale-while-revalidate from the cache. Successful writes clear it.
+
+    Responses are marked `private` for shared caches when the request carries
+    one of the scope `headers`, and always when `private` is set: endpoints
+    behind auth decorators or a custom scope may vary by caller in ways the
+    headers do not show.
+
+    :param func: route handler
+    :param cache: ResponseCache instance, the decorator is a no-op when None
+    :param scope: callable returning the auth scope of the current request
+    :param model: model the handler serves, for the hit and miss metrics
+    :param headers: request headers identifying the caller
+    :param private: never let shared caches store the responses
+    """
+
+    if cache is None or getattr(func, UNCACHED, False):
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if request.method not in CACHED_METHODS:
+            response = current_app.make_response(func(*args, **kwargs))
+            if response.status_code < 400:
+                cache.clear()
+            return response
+
+        if explain_requested():
+            return func(*args, **kwargs)
+
+        personal = private or any(header in request.headers for header in headers)
+        key = request_key(scope, headers)
+        entry = cache.get(key)
+        if entry is not None and cache.servable(entry):
+            observe_cache(model, 'response', True)
+            if not cache.fresh(entry) and cache.claim(entry):
+                cache.refresh(key, entry, func, args, kwargs)
+            return serve(cache, entry, personal)
+
+        observe_cache(model, 'response', False)
+        generation = cache.generation
+        response = current_app.make_response(func(*args, **kwargs))
+        if response.status_code != 200:
+            return response
+        return serve(cache, cache.put(key, response, generation), personal)
+    return wrapper
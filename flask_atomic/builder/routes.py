@@ -18,6 +18,10 @@ from handyhttp.exceptions import HTTPNotFound
 
 from .cache import link
 from . import cache
+from .revalidate import ResponseCache
+from .revalidate import cached
+from .tenancy import tenanted
+from .tenancy import url_prefix
 
 
 DEFAULT_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'HEAD']
@@ -28,6 +32,8 @@ def bind(blueprint, methods, tenant=None):
         endpoint = getattr(blueprint, key, None)
         if not endpoint:
             continue
+        endpoint = cached(endpoint, blueprint.responses)
+        endpoint = tenanted(endpoint, tenant)
         view_function = endpoint
         for idx, dec in enumerate(blueprint.decorators or []):
             if idx == 0:
@@ -42,9 +48,9 @@ def bind(blueprint, methods, tenant=None):
                 new_rule = url.rstrip('/')
                 new_rule_with_slash = '{}/'.format(new_rule)
 
-                if tenant:
-                    new_rule = f'{tenant}/{new_rule}'
-                    new_rule_with_slash = f'{tenant}{new_rule_with_slash}'
+                if url_prefix(tenant):
+                    new_rule = f'{url_prefix(tenant)}{new_rule}'
+                    new_rule_with_slash = f'{url_prefix(tenant)}{new_rule_with_slash}'
 
                 allowed_methods = item[1]
                 blueprint.add_url_rule(new_rule, endpoint.__name__, view_function, methods=allowed_methods)
@@ -60,10 +66,15 @@ class RouteBuilder(Blueprint):
         self.model = model
         self.query = None
         self.tenant = None
+        self.caching = None
 
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+        self.responses = None
+        if self.caching:
+            self.responses = ResponseCache(self.caching)
+
         if not dao:
             self.dao = ModelDAO(model)
         else:
@@ -0,0 +1,94 @@
+from functools import wraps
+
+from flask import current_app
+
+from flask_atomic.builder.dao import getsession
+from flask_atomic.orm.lookup import coerce
+from flask_atomic.orm.lookup import keyname
+from flask_atomic.orm.sharding import shard_context
+from flask_atomic.orm.tenancy import current_tenant
+from flask_atomic.orm.tenancy import tenant_context
+from flask_atomic.orm.timeouts import current_deadline
+from flask_atomic.orm.timeouts import deadline_context
+
+# URL variables carrying the lookup key of keyed routes
+KEY_ARGUMENTS = ('resource', 'modelid')
+
+
+def shard_for(shards, model, key, value):
+    # URL values are strings, range and hash maps must see the typed key
+    if keyname(model, key) == keyname(model):
+        try:
+            value = coerce(model, value)
+        except (TypeError, ValueError):
+            pass
+    return shards.shard(value)
+
+
+def partition(shards, model, key, values):
+    """
+    :return: lookup values grouped by shard, each group keeping the given order
+    :rtype: dict
+    """
+
+    groups = dict()
+    for value in values:
+        groups.setdefault(shard_for(shards, model, key, value), []).append(value)
+    return groups
+
+
+def sharded(func, shards=None, model=None, key=None):
+    """
+    Route decorator sending keyed requests (one, head, put, delete and the
+    child resource routes) to the shard owning their key.
+
+    :param func: route handler
+    :param shards: ShardMap, the decorator is a no-op when None
+    """
+
+    if shards is None:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        names = [name for name in KEY_ARGUMENTS if name in kwargs]
+        if not names:
+            return func(*args, **kwargs)
+        with shard_context(shard_for(shards, model, key, kwargs[names[0]])):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def fan_out(shards, work):
+    """
+    Run `work` once per shard, concurrently. Every call gets its own
+    application context and session, bound to its shard and to the tenant and
+    deadline of the current request.
+
+    :return: results in shard order
+    :rtype: list
+    """
+
+    app = current_app._get_current_object()
+    tenant = current_tenant()
+    deadline = current_deadline()
+
+    def run(bind):
+        with app.app_context(), tenant_context(tenant), shard_context(bind), deadline_context(deadline):
+            try:
+                return work()
+            finally:
+                getsession().remove()
+    return shards.map(run)
+
+
+def merge(results, sortkey, descending=False):
+    """
+    Merge serialised rows from every shard in the order of the list query.
+    Rows without a sort value go last.
+    """
+
+    rows = [row for result in results for row in result]
+    present = [row for row in rows if row.get(sortkey, None) is not None]
+    missing = [row for row in rows if row.get(sortkey, None) is None]
+    return sorted(present, key=lambda row: row[sortkey], reverse=bool(descending)) + missing
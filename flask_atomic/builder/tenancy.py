@@ -0,0 +1,70 @@
+import re
+from functools import wraps
+
+from flask import request
+from handyhttp.exceptions import HTTPBadRequest
+
+from flask_atomic.orm.tenancy import tenant_context
+
+URL_VARIABLE = re.compile(r'/?<(?:\w+:)?(\w+)>/?')
+
+
+def variable(tenant):
+    """
+    Name of the URL variable a `<tenant>` style setting refers to, or None.
+    """
+
+    if not isinstance(tenant, str):
+        return None
+    match = URL_VARIABLE.fullmatch(tenant)
+    return match.group(1) if match else None
+
+
+def url_prefix(tenant):
+    if variable(tenant) is None:
+        return ''
+    return '/' + tenant.strip('/')
+
+
+def resolver(tenant):
+    """
+    Turn the `tenant` setting of a blueprint into a callable returning the
+    tenant of the current request. The setting is either a callable, a URL
+    variable such as `<tenant>` (which then prefixes every route), or the name
+    of a request header.
+    """
+
+    if tenant is None or callable(tenant):
+        return tenant
+
+    name = variable(tenant)
+    if name is not None:
+        return lambda: (request.view_args or {}).get(name, None)
+    return lambda: request.headers.get(tenant, None)
+
+
+def tenanted(func, tenant=None):
+    """
+    Route decorator resolving the tenant of each request before anything else
+    runs, so queries, cache keys and writes all see it. Requests without a
+    tenant are rejected.
+
+    :param func: route handler
+    :param tenant: tenant setting, see `resolver`. The decorator is a no-op when None
+    """
+
+    resolve = resolver(tenant)
+    if resolve is None:
+        return func
+    name = variable(tenant)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        current = resolve()
+        if current in (None, ''):
+            return HTTPBadRequest(msg='A tenant is required for this resource').pack()
+        if name is not None:
+            kwargs.pop(name, None)
+        with tenant_context(current):
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,91 @@
+from functools import wraps
+
+from flask import request
+
+from flask_atomic.httputils.responses import JsonGatewayTimeoutResponse
+from flask_atomic.httputils.responses import JsonUnavailableResponse
+from flask_atomic.orm.timeouts import Deadline
+from flask_atomic.orm.timeouts import DeadlineExceeded
+from flask_atomic.orm.timeouts import deadline_context
+from flask_atomic.orm.timeouts import listen
+
+# Request header a client shortens the timeout with, in seconds or with a
+# `ms` suffix in milliseconds.
+DEADLINE_HEADER = 'X-Request-Timeout'
+
+
+def timeout_for(timeouts, model, method):
+    """
+    Statement timeout in seconds of one model and HTTP verb. `timeouts` is
+    either a number for everything, or a dict keyed by model or table name,
+    by verb, or both, with `*` as the verb fallback::
+
+        timeouts={'GET': 2, 'POST': 5, Report: {'GET': 30}}
+
+    :return: seconds, or None when the route is not bounded
+    """
+
+    if isinstance(timeouts, dict) and (model in timeouts or model.__tablename__ in timeouts):
+        timeouts = timeouts.get(model, timeouts.get(model.__tablename__, None))
+    if isinstance(timeouts, dict):
+        timeouts = timeouts.get(method, timeouts.get('*', None))
+    return timeouts
+
+
+def client_timeout(header):
+    """
+    :return: seconds asked for by the client, or None when the header is
+        missing or unreadable
+    """
+
+    value = request.headers.get(header, None) if header else None
+    if not value:
+        return None
+    value = value.strip().lower()
+    scale = 1
+    if value.endswith('ms'):
+        value, scale = value[:-2], 1000
+    try:
+        return max(0.0, float(value) / scale)
+    except ValueError:
+        return None
+
+
+def timed(func, model=None, timeouts=None, header=DEADLINE_HEADER):
+    """
+    Route decorator putting a deadline on every statement the request runs.
+    The budget is the configured timeout of the model and verb, shortened by
+    the client deadline header when that asks for less.
+
+    :param func: route handler
+    :param timeouts: see `timeout_for`, the decorator is a no-op when None
+    :param header: client deadline header, None to ignore clients
+    """
+
+    if timeouts is None:
+        return func
+    listen()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        budget = timeout_for(timeouts, model, request.method)
+        if budget is None:
+            return func(*args, **kwargs)
+        client = client_timeout(header)
+        if client is not None:
+            budget = min(budget, client)
+        with deadline_context(Deadline(budget)):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def timed_out(error):
+    """
+    Response for a request that ran out of time. A statement cancelled by the
+    database is a 504, a request whose deadline passed before the statement
+    was even sent is a 503.
+    """
+
+    if isinstance(error, DeadlineExceeded):
+        return JsonUnavailableResponse(message='The deadline of this request has passed')
+    return JsonGatewayTimeoutResponse(message='The query ran longer than this request allows')
@@ -0,0 +1,269 @@
+import atexit
+import queue
+import threading
+import time
+from datetime import date
+from datetime import datetime
+from datetime import time as clock
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from flask_atomic.builder.dao import getsession
+from flask_atomic.orm.sharding import current_shard
+from flask_atomic.orm.sharding import shard_context
+from flask_atomic.orm.tenancy import current_tenant
+from flask_atomic.orm.tenancy import tenant_context
+from flask_atomic.orm.tenancy import tenant_field
+from flask_atomic.orm.transaction import is_transient
+from flask_atomic.orm.transaction import run_transaction
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_INTERVAL = 1.0
+DEFAULT_QUEUE_SIZE = 10000
+
+
+class BatchPolicy:
+    """
+    Write-behind settings of a model. Rows are inserted once `batch_size` of
+    them are waiting or `interval` seconds after the first one arrived,
+    whichever comes first. At most `maxsize` rows wait in memory, a POST
+    finding the queue full waits up to `timeout` seconds for room.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, interval=DEFAULT_INTERVAL, maxsize=DEFAULT_QUEUE_SIZE,
+                 timeout=0.05):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.maxsize = maxsize
+        self.timeout = timeout
+
+
+# String parsers of the column types a JSON payload cannot carry natively
+PARSERS = {
+    datetime: datetime.fromisoformat,
+    date: date.fromisoformat,
+    clock: clock.fromisoformat,
+}
+NUMBERS = (int, float, Decimal)
+
+
+def convert(column, value):
+    """
+    Coerce one payload value to the Python type of its column, so a row that
+    validates also binds when the batch is inserted.
+
+    :raises ValueError: when the value cannot be converted
+    """
+
+    try:
+        expected = column.type.python_type
+    except NotImplementedError:
+        return value
+    if value is None or isinstance(value, expected):
+        return value
+
+    try:
+        if expected in PARSERS and isinstance(value, str):
+            return PARSERS[expected](value)
+        if expected in NUMBERS and not isinstance(value, bool):
+            return expected(value)
+        if expected is bool and value in (0, 1):
+            return bool(value)
+        if expected is str and isinstance(value, NUMBERS):
+            return str(value)
+    except (TypeError, ValueError, ArithmeticError):
+        pass
+    raise ValueError(f'<{column.name}> expects a {expected.__name__} value')
+
+
+def required(column):
+    if column.nullable or column.primary_key:
+        return False
+    return column.default is None and column.server_default is None
+
+
+def validate(model, payload):
+    """
+    Check a payload can be inserted as one row of the model table without
+    going through the ORM. Only plain columns are accepted, relationships
+    need the regular write path. Values are coerced to their column types.
+
+    :return: column name to value
+    :rtype: dict
+    :raises ValueError: on anything that is not a single row of known columns
+    """
+
+    if not isinstance(payload, dict):
+        raise ValueError('Write-behind payloads must be a single object')
+
+    table = model.__table__
+    row = {key: value for key, value in payload.items() if not key.startswith('_')}
+    unknown = [key for key in row if key not in table.columns]
+    if unknown:
+        raise ValueError(f'<{", ".join(unknown)}> not accepted as input field(s)')
+
+    missing = [column.name for column in table.columns if column.name not in row and required(column)]
+    if missing:
+        raise ValueError(f'<{missing}> are required')
+    return {key: convert(table.columns[key], value) for key, value in row.items()}
+
+
+class WriteBehind:
+    """
+    In memory write-behind queue of one append heavy model. Requests only
+    validate and enqueue their row. A background thread inserts the rows in
+    batches, one executemany INSERT per batch and transaction, so ingestion
+    is bounded by batch size rather than by commit latency.
+
+    Rows keep the tenant and shard of the request that queued them. Whatever
+    is still queued is flushed when `close` is called or the process exits.
+    """
+
+    def __init__(self, model, policy=None):
+        self.model = model
+        self.policy = policy or BatchPolicy()
+        self.queue = queue.Queue(self.policy.maxsize)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.app = None
+
+    def start(self):
+        # A flusher that died is replaced, queued rows are never stranded
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            if self.thread is None:
+                atexit.register(self.close)
+            self.app = current_app._get_current_object()
+            self.thread = threading.Thread(target=self.run, name=f'write-behind-{self.model.__tablename__}')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def put(self, row):
+        """
+        Queue one validated row.
+
+        :return: False when the queue stayed full for the whole timeout, or
+            the writer is closed
+        :rtype: bool
+        """
+
+        if self.stopped.is_set():
+            return False
+
+        name = tenant_field(self.model)
+        tenant = current_tenant()
+        if name is not None and tenant is not None:
+            row[name] = tenant
+
+        self.start()
+        try:
+            self.queue.put((tenant, current_shard(), row), timeout=self.policy.timeout)
+        except queue.Full:
+            return False
+        return True
+
+    def retry_after(self):
+        return self.policy.interval
+
+    def take(self):
+        """
+        Block for the next batch: up to `batch_size` rows, collected for at
+        most `interval` seconds after the first one.
+        """
+
+        try:
+            batch = [self.queue.get(timeout=self.policy.interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.policy.interval
+        while len(batch) < self.policy.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while not self.stopped.is_set():
+            batch = self.take()
+            if not batch:
+                continue
+            try:
+                self.flush(batch)
+            except Exception:
+                self.app.logger.exception('Write-behind flush of %s failed', self.model.__tablename__)
+
+    def drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def flush(self, batch):
+        """
+        Insert a batch, grouped by tenant, shard and column set so that every
+        group is a single executemany statement.
+        """
+
+        groups = dict()
+        for tenant, shard, row in batch:
+            groups.setdefault((tenant, shard, tuple(sorted(row))), []).append(row)
+
+        with self.app.app_context():
+            try:
+                for (tenant, shard, _), rows in groups.items():
+                    with tenant_context(tenant), shard_context(shard):
+                        self.insert_group(rows)
+            finally:
+                getsession().remove()
+
+    def insert_group(self, rows):
+        # One group failing in an unexpected way must not sink the others
+        try:
+            self.insert(rows)
+        except Exception:
+            self.app.logger.exception(
+                'Write-behind dropped %s rows of %s', len(rows), self.model.__tablename__
+            )
+
+    def insert(self, rows):
+        statement = self.model.__table__.insert()
+        session = getsession()
+        try:
+            run_transaction(lambda active: active.execute(statement, rows), session, repeat=True)
+            return
+        except SQLAlchemyError as error:
+            if is_transient(error) or len(rows) == 1:
+                self.app.logger.exception(
+                    'Write-behind insert of %s rows into %s failed', len(rows), self.model.__tablename__
+                )
+                return
+
+        # One bad row must not sink the whole batch, find it row by row
+        for row in rows:
+            try:
+                run_transaction(lambda active: active.execute(statement, row), session, repeat=True)
+            except SQLAlchemyError:
+                self.app.logger.exception('Write-behind dropped a row of %s: %s', self.model.__tablename__, row)
+
+    def close(self, timeout=None):
+        """
+        Stop the flusher and insert everything still queued.
+        """
+
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout if timeout is not None else self.policy.interval * 2)
+        batch = self.drain()
+        if batch and self.app is not None:
+            self.flush(batch)
@@ -1,17 +1,49 @@
 import copy
 from datetime import datetime
+from functools import partial
 from typing import Optional
 
 import sqlalchemy
 
 from flask import current_app
 from flask import request
+from sqlalchemy.orm import Query
 from sqlalchemy_blender.helpers import columns
 
 from flask_atomic.dao.buffer.data import DataBuffer
+from flask_atomic.dao.buffer.dyna import DYNADataBuffer
 from flask_atomic.dao.buffer.query import QueryBuffer
 from flask_atomic.dao.querystring import QueryStringProcessor
 from flask_atomic.http.exceptions import HTTPConflict
+from flask_atomic.orm.archive import archive
+from flask_atomic.orm.archive import archived
+from flask_atomic.orm.bulk import INACTIVE
+from flask_atomic.orm.bulk import bulk_flag
+from flask_atomic.orm.bulk import criteria
+from flask_atomic.orm.lookup import identity_lookup
+from flask_atomic.orm.softdelete import DELETED
+from flask_atomic.orm.softdelete import LIVE
+from flask_atomic.orm.softdelete import set_flag
+
+
+_marshalling = dict()
+
+
+def marshalling(model):
+    """
+    Column descriptions, fields and field schema of a model, built on first
+    use and shared by every single row lookup over it.
+
+    :return: descriptions, fields and schema
+    :rtype: tuple
+    """
+
+    found = _marshalling.get(model, None)
+    if found is None:
+        fields = model.keys()
+        schema = QueryBuffer.schema(model.schema(), fields)
+        found = _marshalling.setdefault(model, (Query(model).column_descriptions, fields, schema))
+    return found
 
 
 class BaseDAO:
@@ -161,11 +193,20 @@ class BaseDAO:
         return buffer.filter_by(self.filters).first()
 
     def get_one(self, value, flagged=False):
-        self.filters.update({self.model.id: value})
-        query = self.create_query(self.columns(self.queryargs.exclusions))
-        self._schema = query.column_descriptions
-        buffer = QueryBuffer(query, self.model, vflag=flagged, queryargs=self.queryargs)
-        return buffer.filter_by(self.filters).first()
+        self._schema, fields, schema = marshalling(self.model)
+        key = self.model.identify_primary_key()
+        buffer = QueryBuffer(self.create_query(), self.model, vflag=flagged, queryargs=self.queryargs)
+        buffer.spend('check', self.model, self.queryargs)
+        if self.filters:
+            # The baked lookup knows nothing of DAO filters, those rows go through the buffer
+            buffer.filter_by({**self.filters, key: value})
+            instance = buffer.execute(buffer.query.first)
+        else:
+            instance = buffer.execute(partial(identity_lookup, self.model, key, value, scoped=not flagged))
+        if instance is None and flagged and getattr(self.model, '__archive__', False):
+            instance = archived(self.model, value)
+        queryargs = self.queryargs
+        return DYNADataBuffer(instance, schema, set(fields), queryargs.rels, queryargs.exclusions, queryargs)
 
     def get_all_by(self, field, value, flagged=False):
         pkfilter = {field: value}
@@ -233,8 +274,39 @@ class BaseDAO:
         """
 
         instance = self.get_one(instance_id, flagged=True).view()
-        if instance is None or instance.active == 'D':
+        if instance is None or instance.active == DELETED:
             raise ValueError('This entry does not exist or maybe has been marked for deletion.')
-        instance.active = 'D'
+        set_flag(instance, DELETED)
         instance.save()
         return instance
+
+    def bulk_flag(self, flag, keys=None, filters=None):
+        """
+        Flag many rows with chunked UPDATE statements, by primary key or by
+        column filters. No instance is loaded.
+
+        :param flag: new active flag
+        :param keys: list of primary keys
+        :param filters: dict of column name to value
+        :return: number of rows changed
+        """
+
+        where = criteria(self.model, filters) if filters else None
+        return bulk_flag(self.model, flag, keys=keys, where=where, session=self.model.query.session)
+
+    def archive(self, before=None, **kwargs):
+        """
+        Move rows soft deleted before the cutoff into the `<table>_archive`
+        table, see `flask_atomic.orm.archive.archive`.
+        """
+
+        return archive(self.model, before, session=self.model.query.session, **kwargs)
+
+    def bulk_sdelete(self, keys=None, filters=None):
+        return self.bulk_flag(DELETED, keys, filters)
+
+    def bulk_deactivate(self, keys=None, filters=None):
+        return self.bulk_flag(INACTIVE, keys, filters)
+
+    def bulk_restore(self, keys=None, filters=None):
+        return self.bulk_flag(LIVE, keys, filters)
@@ -1,4 +1,6 @@
 from flask_atomic.dao.buffer.data import DataBuffer
+from flask_atomic.orm.softdelete import ACTIVE_FIELD
+from flask_atomic.orm.softdelete import show_soft_deletes
 
 
 class DYNADataBuffer(DataBuffer):
@@ -14,10 +16,10 @@ class DYNADataBuffer(DataBuffer):
         return self
 
     def prepare_filters(self):
+        # Live rows are scoped in SQL for soft deletable models, vflag opts out
         if not self.filters:
-            filters = {}
-            filters.update(active='Y')
-            self.filters = filters
-        if self.vflag and self.filters.get('active', None):
-            del self.filters['active']
+            self.filters = {}
+        if self.vflag:
+            self.filters.pop(ACTIVE_FIELD, None)
+            self.query = show_soft_deletes(self.query)
         self.query = self.query.filter_by(**self.filters)
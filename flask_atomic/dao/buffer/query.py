@@ -4,11 +4,17 @@ from sqlalchemy.orm import load_only
 from sqlalchemy import func
 
 from flask_atomic.dao.buffer.dyna import DYNADataBuffer
+from flask_atomic.http.exceptions import HTTPBadRequest
+from flask_atomic.metrics import observe_rows
+from flask_atomic.orm.guardrails import budget_for
+from flask_atomic.orm.slowlog import tracking
+from flask_atomic.orm.softdelete import ACTIVE_FIELD
+from flask_atomic.orm.softdelete import show_soft_deletes
 
 
 class QueryBuffer:
 
-    def __init__(self, query, model, rel=False, vflag=False, dao=None, queryargs=None):
+    def __init__(self, query, model, rel=False, vflag=False, dao=None, queryargs=None, budget=None):
         self.query = query
         self.model = model
         self._ordered = False
@@ -18,6 +24,7 @@ class QueryBuffer:
         self.exclusions = []
         self.vflag = vflag
         self.queryargs = queryargs
+        self.budget = budget_for(budget, model)
         self.prepare_filters()
 
     def includerels(self, args):
@@ -104,7 +111,8 @@ class QueryBuffer:
         self.query = self.query.order_by(order)
         return self
 
-    def schema(self, schema, fields):
+    @staticmethod
+    def schema(schema, fields):
         return list(
             map(
                 lambda x: dict(
@@ -122,7 +130,19 @@ class QueryBuffer:
             self.queryargs.exclusions, self.queryargs
         )
 
+    def spend(self, check, *args):
+        # An over budget request is for the client to fix, a 400 not a 500
+        if self.budget is None:
+            return None
+        try:
+            return getattr(self.budget, check)(*args)
+        except ValueError as error:
+            raise HTTPBadRequest(str(error))
+
     def autoquery(self):
+        # The cost model runs first, nothing has been sent to the database yet
+        self.spend('check', self.model, self.queryargs)
+
         self.fields = set(self.model.fields(exc=self.queryargs.exclusions))
         # Now detect whether we want relationships
         if self.queryargs.include:
@@ -136,10 +156,14 @@ class QueryBuffer:
         self.filter_by(self.queryargs.filters)
         self.limit(self.queryargs.limit)
         self.options(load_only(*self.fields))
+        self.spend('check_rows', self.query.session, self.query, self.model, self.queryargs)
         return self
 
     def execute(self, query: BaseQuery.statement) -> object:
-        return query()
+        with tracking(self.model):
+            result = query()
+        observe_rows(self.model, len(result) if isinstance(result, list) else int(result is not None))
+        return result
 
     def all(self, *args):
         resp = self.execute(self.query.all)
@@ -154,13 +178,14 @@ class QueryBuffer:
         return self.marshall(resp, self.model.schema())
 
     def prepare_filters(self):
+        # Live rows are scoped in SQL for soft deletable models, vflag opts out
         if not self.filters:
-            filters = {}
-            # filters.update(active='Y')
-            self.filters = filters
-        if self.vflag and self.filters.get('active', None):
-            del self.filters['active']
-        self.query = self.query.filter_by(**self.filters)
+            self.filters = {}
+        if self.vflag:
+            self.filters.pop(ACTIVE_FIELD, None)
+            self.query = show_soft_deletes(self.query)
+        if self.filters:
+            self.query = self.query.filter_by(**self.filters)
 
     def __iter__(self):
         return self.all()
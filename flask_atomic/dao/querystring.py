@@ -34,8 +34,9 @@ class QueryStringProcessor:
         if not self.querystring:
             return None
 
-        filterkeys = filter(lambda i: i[0] != 'relationships' and i[0] not in QUERYSTRING_CONTROL_KEYS,
-                            self.querystring.items())
+        # Underscore prefixed arguments are reserved for library controls (e.g. _explain)
+        reserved = set(QUERYSTRING_CONTROL_KEYS + ['relationships'])
+        filterkeys = filter(lambda i: i[0] not in reserved and not i[0].startswith('_'), self.querystring.items())
         for key, value in (filterkeys):
             if '>' in key:
                 self.min = self.min + (str(key).replace('>', ''), value)
@@ -11,6 +11,8 @@ from sqlalchemy_blender import serialize
 from sqlalchemy_blender import iserialize
 from handyhttp import HTTPException
 
+from flask_atomic.http.compression import Compression
+
 
 class ModelEncoder(JSONEncoder):
     def default(self, data):
@@ -40,3 +42,7 @@ class JSONResponse(Response):
 class FlaskJSON(Flask):
     response_class = JSONResponse
     json_encoder = ModelEncoder
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compression = Compression(self)
@@ -0,0 +1,235 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXTENSION_KEY = 'atomic_compression'
+GZIP = 'gzip'
+BROTLI = 'br'
+ZSTD = 'zstd'
+
+# Server side preference when the client weighs several encodings equally
+DEFAULT_ENCODINGS = (ZSTD, BROTLI, GZIP)
+DEFAULT_LEVELS = {GZIP: 6, BROTLI: 5, ZSTD: 3}
+DEFAULT_MIN_SIZE = 500
+DEFAULT_CACHE_SIZE = 256
+COMPRESSIBLE = ('application/json', 'application/javascript', 'application/xml', 'text/')
+
+
+def available():
+    encodings = [GZIP]
+    if brotli is not None:
+        encodings.append(BROTLI)
+    if zstandard is not None:
+        encodings.append(ZSTD)
+    return encodings
+
+
+def encode(data, encoding, level=None):
+    """
+    Compress a body with the given content coding.
+
+    :param data: raw bytes
+    :param encoding: one of gzip, br or zstd
+    :param level: codec specific compression level
+    :return: compressed bytes
+    :rtype: bytes
+    """
+
+    if level is None:
+        level = DEFAULT_LEVELS.get(encoding)
+    if encoding == GZIP:
+        # mtime=0 keeps the output deterministic, identical bodies compress identically
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == BROTLI and brotli is not None:
+        return brotli.compress(data, quality=level)
+    if encoding == ZSTD and zstandard is not None:
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f'Unsupported content encoding {encoding}')
+
+
+def negotiate(accept, encodings):
+    """
+    Pick the content coding for a request from its Accept-Encoding header.
+    Higher q values win. Ties go to the order of `encodings`. Anything with
+    q=0 is refused, and `*` matches every encoding not listed explicitly.
+
+    :param accept: Accept-Encoding header value
+    :param encodings: encodings the server can produce, in preference order
+    :return: chosen encoding or None for the identity coding
+    :rtype: str
+    """
+
+    weights = dict()
+    for part in (accept or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+
+    best, score = None, 0.0
+    for encoding in encodings:
+        quality = weights.get(encoding, weights.get('*', 0.0))
+        if quality > score:
+            best, score = encoding, quality
+    return best
+
+
+class VariantCache:
+    """
+    Bounded LRU of compressed variants. Entries are keyed by a content key and
+    the encoding, so a hot body is compressed at most once per encoding for as
+    long as it stays in the cache.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, encoding):
+        with self.lock:
+            data = self.entries.get((key, encoding), None)
+            if data is not None:
+                self.entries.move_to_end((key, encoding))
+            return data
+
+    def put(self, key, encoding, data):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[(key, encoding)] = data
+            self.entries.move_to_end((key, encoding))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class Compression:
+    """
+    Content negotiated response compression. Responses with a compressible
+    mimetype and a body of at least `min_size` bytes are compressed with the
+    best coding the client accepts out of zstd, brotli and gzip. Brotli and
+    zstd are only offered when their packages are installed.
+
+    Settings are read from the app config on every request, so they may be
+    changed after the extension is installed:
+
+        ATOMIC_COMPRESSION            enable or disable compression (True)
+        ATOMIC_COMPRESSION_MIN_SIZE   smallest body worth compressing (500)
+        ATOMIC_COMPRESSION_LEVELS     dict of encoding to level
+        ATOMIC_COMPRESSION_ENCODINGS  encodings in server preference order
+
+    Basic usage::
+
+        Compression(app, min_size=1024, levels={'gzip': 5})
+
+    """
+
+    def __init__(self, app=None, min_size=DEFAULT_MIN_SIZE, levels=None, encodings=None,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        self.min_size = min_size
+        self.levels = dict(DEFAULT_LEVELS, **(levels or {}))
+        self.encodings = encodings or DEFAULT_ENCODINGS
+        self.variants = VariantCache(cache_size)
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions[EXTENSION_KEY] = self
+        app.after_request(self.after_request)
+
+    def settings(self):
+        config = current_app.config
+        levels = dict(self.levels, **config.get('ATOMIC_COMPRESSION_LEVELS', {}))
+        encodings = [
+            item for item in config.get('ATOMIC_COMPRESSION_ENCODINGS', self.encodings)
+            if item in available()
+        ]
+        return config.get('ATOMIC_COMPRESSION_MIN_SIZE', self.min_size), levels, encodings
+
+    def compress(self, data, encoding, level=None, variants=None):
+        """
+        Compress a body, serving repeated bodies from the variant cache.
+
+        :param data: raw bytes
+        :param encoding: content coding
+        :param level: compression level
+        :param variants: compressed variants stored with a response cache
+                         entry. When given they are used instead of the LRU.
+        :return: compressed bytes
+        :rtype: bytes
+        """
+
+        if variants is not None:
+            if encoding not in variants:
+                variants[encoding] = encode(data, encoding, level)
+            return variants[encoding]
+
+        key = hashlib.blake2b(data, digest_size=16).digest()
+        compressed = self.variants.get(key, encoding)
+        if compressed is None:
+            compressed = encode(data, encoding, level)
+            self.variants.put(key, encoding, compressed)
+        return compressed
+
+    def compressible(self, response):
+        if response.direct_passthrough or response.is_streamed:
+            return False
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if 'Content-Encoding' in response.headers:
+            return False
+        return (response.mimetype or '').startswith(COMPRESSIBLE)
+
+    def after_request(self, response):
+        if not current_app.config.get('ATOMIC_COMPRESSION', True) or not self.compressible(response):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        min_size, levels, encodings = self.settings()
+        if response.calculate_content_length() < min_size:
+            return response
+
+        encoding = negotiate(request.headers.get('Accept-Encoding', ''), encodings)
+        if encoding is None:
+            return response
+
+        # Responses served from a response cache carry the variants of their
+        # entry, so the compressed bytes live and expire alongside the raw ones
+        variants = getattr(response, 'variants', None)
+        response.set_data(self.compress(response.get_data(), encoding, levels.get(encoding), variants))
+        response.headers['Content-Encoding'] = encoding
+
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
@@ -5,6 +5,11 @@ class HTTPException(Exception):
     message: str
     code: int
 
+    def __init__(self, message=None):
+        super().__init__(message or self.message)
+        if message:
+            self.message = message
+
     def pack(self):
         return jsonify(error=self.message), self.code
 
@@ -69,6 +69,7 @@ def json_response(content=None, *args, **kwargs):
 
 JsonOKResponse = functools.partial(json_response, status=200)
 JsonCreatedResponse = functools.partial(json_response, status=201)
+JsonAcceptedResponse = functools.partial(json_response, status=202)
 JsonDeletedResp = functools.partial(json_response, status=202, message=R202)
 JsonBadRequestResp = functools.partial(json_response, status=400)
 JsonNotFoundResp = functools.partial(json_response, status=404, error=E404)
@@ -77,3 +78,5 @@ JsonNotAllowedResponse = functools.partial(json_response, status=405)
 JsonOverloadResponse = functools.partial(json_response, status=429)
 JsonConflictResponse = functools.partial(json_response, status=409)
 JsonUnprocessableResponse = functools.partial(json_response, status=422)
+JsonUnavailableResponse = functools.partial(json_response, status=503)
+JsonGatewayTimeoutResponse = functools.partial(json_response, status=504)
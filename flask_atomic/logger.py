@@ -1,5 +1,8 @@
 import logging
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
 from logging.handlers import RotatingFileHandler
+from queue import Queue
 
 DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
@@ -11,6 +14,19 @@ def get_rotating_file_handler(logfile='/tmp/app.log', level=logging.INFO, log_fo
     return log_file_handler
 
 
+def get_queue_handler(*handlers):
+    """
+    Wrap the given handlers behind a queue so that emitting a record never
+    blocks the calling thread on file or network IO. The returned listener
+    owns the real handlers and must be stopped to flush them.
+    """
+
+    queue = Queue(-1)
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return QueueHandler(queue), listener
+
+
 def getinfologger(application_name, logtype=None):
     logger = getlogger(application_name)
     info_logger_file_handler = RotatingFileHandler(f"/tmp/${application_name}.application.log")
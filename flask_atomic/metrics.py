@@ -0,0 +1,363 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Response
+from flask import current_app
+from flask import g
+from flask import has_app_context
+from flask import has_request_context
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+EXTENSION_KEY = 'atomic_metrics'
+STATS = '_atomic_request_stats'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+_listening = False
+_listening_lock = threading.Lock()
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def sample(name, labels, value):
+    if labels:
+        name = name + '{' + ','.join(f'{key}="{escape(item)}"' for key, item in labels) + '}'
+    if value == float('inf'):
+        value = '+Inf'
+    return f'{name} {value}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = dict()
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            values = sorted(self.values.items())
+        for key, value in values:
+            lines.extend(self.samples(list(zip(self.labels, key)), value))
+        return lines
+
+    def samples(self, labels, value):
+        return [sample(self.name, labels, value)]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key, None)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self, labels, value):
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, hits in zip(self.buckets, counts):
+            cumulative += hits
+            lines.append(sample(f'{self.name}_bucket', labels + [('le', bound)], cumulative))
+        lines.append(sample(f'{self.name}_bucket', labels + [('le', float('inf'))], count))
+        lines.append(sample(f'{self.name}_sum', labels, total))
+        lines.append(sample(f'{self.name}_count', labels, count))
+        return lines
+
+
+class Registry:
+    """
+    Ordered set of metrics rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name, description, labels=()):
+        return self.register(Gauge(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """
+    What one measured request did, filled in by the statement listener and
+    the serialisation hooks and observed once the request is done.
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.serialization = 0.0
+        self.serialized = False
+
+
+def recorder():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get(EXTENSION_KEY, None)
+
+
+def tablename(model):
+    return getattr(model, '__tablename__', None) or ''
+
+
+def verb():
+    return request.method if has_request_context() else ''
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_app_context():
+        return
+    stats = g.get(STATS, None)
+    if stats is not None:
+        stats.statements += 1
+
+
+def listen():
+    """
+    Statements are counted from an engine level cursor event, attached once
+    to the Engine class. Outside of a measured request it does nothing.
+    """
+
+    global _listening
+    with _listening_lock:
+        if _listening:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        _listening = True
+
+
+def status_of(response):
+    if isinstance(response, tuple):
+        return response[1] if len(response) > 1 and isinstance(response[1], int) else 200
+    return getattr(response, 'status_code', 200)
+
+
+def rows_of(response):
+    body = response[0] if isinstance(response, tuple) else response
+    if not isinstance(body, dict) or 'data' not in body:
+        return None
+    data = body['data']
+    if isinstance(data, list):
+        return len(data)
+    return 1 if data else 0
+
+
+class Metrics:
+    """
+    Metrics of everything the Architect generates, served for scraping in the
+    Prometheus text format at `path` (`ATOMIC_METRICS_PATH`, default
+    `/metrics`):
+
+    - latency of every generated route by model, verb and status
+    - rows returned and SQL statements issued per request
+    - serialisation time by model
+    - connection pool checkout wait (with `TimedQueuePool`) and occupancy
+    - response cache and request coalescing hits and misses
+
+    Nothing is recorded unless the extension is installed on the app::
+
+        Metrics(app)
+
+    """
+
+    def __init__(self, app=None, path='/metrics', registry=None):
+        self.path = path
+        self.registry = registry or Registry()
+        self.requests = self.registry.histogram(
+            'atomic_request_duration_seconds', 'Latency of generated endpoints.', ('model', 'method', 'status')
+        )
+        self.rows = self.registry.histogram(
+            'atomic_rows_returned', 'Rows returned per request.', ('model', 'method'), ROW_BUCKETS
+        )
+        self.statements = self.registry.histogram(
+            'atomic_statements_per_request', 'SQL statements issued per request.', ('model', 'method'),
+            STATEMENT_BUCKETS
+        )
+        self.serialization = self.registry.histogram(
+            'atomic_serialization_duration_seconds', 'Time spent serialising rows.', ('model',)
+        )
+        self.pool_wait = self.registry.histogram(
+            'atomic_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.'
+        )
+        self.pool = self.registry.gauge(
+            'atomic_pool_connections', 'Connections of each pool by state.', ('bind', 'state')
+        )
+        self.cache = self.registry.counter(
+            'atomic_cache_requests_total', 'Response cache and request coalescing lookups.',
+            ('model', 'cache', 'result')
+        )
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions[EXTENSION_KEY] = self
+        self.path = app.config.get('ATOMIC_METRICS_PATH', self.path)
+        app.add_url_rule(self.path, 'atomic_metrics', self.view, methods=['GET'])
+        listen()
+
+    def view(self):
+        self.collect_pools(current_app)
+        return Response(self.registry.render(), content_type=CONTENT_TYPE)
+
+    def collect_pools(self, app):
+        """
+        Read the occupancy of every engine of the app at scrape time. Pools
+        without a fixed size (SQLite memory databases) are skipped.
+        """
+
+        state = app.extensions.get('sqlalchemy', None)
+        for bind, connector in list(getattr(state, 'connectors', dict()).items()):
+            pool = connector.get_engine().pool
+            if not isinstance(pool, QueuePool):
+                continue
+            name = bind or 'default'
+            self.pool.set(pool.size(), bind=name, state='size')
+            self.pool.set(pool.checkedout(), bind=name, state='checked_out')
+            self.pool.set(pool.checkedin(), bind=name, state='idle')
+            self.pool.set(max(0, pool.overflow()), bind=name, state='overflow')
+
+    def measure(self, model, func, *args, **kwargs):
+        name, method = tablename(model), verb()
+        previous = g.get(STATS, None)
+        stats = RequestStats()
+        setattr(g, STATS, stats)
+        status = 500
+        start = time.perf_counter()
+        try:
+            response = func(*args, **kwargs)
+            status = status_of(response)
+            rows = rows_of(response)
+            if rows is not None:
+                self.rows.observe(rows, model=name, method=method)
+            return response
+        except Exception as error:
+            status = getattr(error, 'code', 500)
+            raise
+        finally:
+            self.requests.observe(time.perf_counter() - start, model=name, method=method, status=status)
+            self.statements.observe(stats.statements, model=name, method=method)
+            if stats.serialized:
+                self.serialization.observe(stats.serialization, model=name)
+            setattr(g, STATS, previous)
+
+
+def measured(func, model=None):
+    """
+    Route decorator recording latency, status, rows returned and statements
+    issued of a generated endpoint. A no-op unless Metrics is installed.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = recorder()
+        if metrics is None:
+            return func(*args, **kwargs)
+        return metrics.measure(model, func, *args, **kwargs)
+    return wrapper
+
+
+def current_stats():
+    if not has_app_context():
+        return None
+    return g.get(STATS, None)
+
+
+@contextmanager
+def serializing():
+    """
+    Add the time spent in the block to the serialisation time of the current
+    measured request. Handlers serialising row by row are observed once, for
+    the whole request.
+    """
+
+    stats = current_stats()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialization += time.perf_counter() - start
+        stats.serialized = True
+
+
+def observe_rows(model, rows):
+    # Rows of measured requests are counted from their response instead
+    metrics = recorder()
+    if metrics is not None and current_stats() is None:
+        metrics.rows.observe(rows, model=tablename(model), method=verb())
+
+
+def observe_cache(model, cache, hit):
+    metrics = recorder()
+    if metrics is not None:
+        metrics.cache.inc(model=tablename(model), cache=cache, result='hit' if hit else 'miss')
+
+
+def observe_pool_wait(wait):
+    metrics = recorder()
+    if metrics is not None:
+        metrics.pool_wait.observe(wait)
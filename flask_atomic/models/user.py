@@ -1,9 +1,8 @@
 from flask import jsonify
 from flask import current_app
-from werkzeug.security import check_password_hash
-from werkzeug.security import generate_password_hash
 
 from sqlalchemy_blender.database import db
+from flask_atomic.auth.hashing import get_hasher
 from flask_atomic.builder.dao import ModelDAO
 from flask_atomic.orm.mixins.columns import CreationTimestampMixin
 from flask_atomic.orm.mixins.columns import PrimaryKeyMixin
@@ -25,14 +24,18 @@ class BaseUser(PrimaryKeyMixin, CreationTimestampMixin, db.Model):
     def check_user_password(self, password):
         """
         Takes a plain text password, then perform a decrypted password check.
+        If the stored hash was made with an outdated scheme or cost, it is
+        replaced with a fresh hash on success. The new hash is only set on the
+        instance, it is saved whenever the caller commits its session.
         :param password: Plain text password input
         :return: True or False whether password is valid
         :rtype: bool
         """
 
-        if check_password_hash(self.password, password):
-            return True
-        return False
+        valid, rehashed = get_hasher().verify_and_update(self.password, password)
+        if valid and rehashed:
+            self.password = rehashed
+        return valid
 
 
 class UserDAO(ModelDAO):
@@ -105,16 +108,18 @@ class UserDAO(ModelDAO):
 
         if current_app.config.get('SECRET_KEY') is None:
             raise RuntimeError('SECRET_KEY missing')
-        return generate_password_hash(password)
+        return get_hasher().hash(password)
 
     def check_user_password(self, password):
         """
         Takes a plain text password, then perform a decrypted password check.
+        A user instance has its outdated hash replaced as in
+        BaseUser.check_user_password.
         :param password: Plain text password input
         :return: True or False whether password is valid
         :rtype: bool
         """
 
-        if check_password_hash(self.model.password, password):
-            return True
-        return False
+        if isinstance(self.model, BaseUser):
+            return self.model.check_user_password(password)
+        return get_hasher().verify(self.model.password, password)
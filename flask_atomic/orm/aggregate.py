@@ -0,0 +1,87 @@
+from decimal import Decimal
+
+from sqlalchemy import func
+from sqlalchemy import select
+
+GROUP_ARGUMENT = 'group_by'
+COUNT = 'count'
+FUNCTIONS = {
+    'sum': func.sum,
+    'avg': func.avg,
+    'min': func.min,
+    'max': func.max,
+    COUNT: func.count,
+}
+AGGREGATE_ARGUMENTS = (GROUP_ARGUMENT,) + tuple(FUNCTIONS.keys())
+ALL = '*'
+
+
+def parse(args, columns):
+    """
+    Read the grouping and aggregate arguments of a request and validate every
+    named field against the model columns.
+
+    :param args: request arguments
+    :param columns: column names the request may name, without hidden columns
+    :return: group by columns, and a list of (function, field) pairs
+    :rtype: tuple
+    :raises ValueError: on unknown fields or a request without aggregates
+    """
+
+    def names(value):
+        return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+    groups = names(args.get(GROUP_ARGUMENT, None))
+    unknown = [field for field in groups if field not in columns]
+    aggregates = []
+    for name in FUNCTIONS:
+        for field in names(args.get(name, None)):
+            if field not in columns and not (field == ALL and name == COUNT):
+                unknown.append(field)
+            aggregates.append((name, field))
+
+    if unknown:
+        raise ValueError(f'Unknown aggregate fields: {", ".join(unknown)}')
+    if not aggregates:
+        raise ValueError('Aggregate requests need at least one of sum, avg, min, max or count')
+    return groups, aggregates
+
+
+def label(name, field):
+    if field == ALL:
+        return name
+    return f'{name}_{field}'
+
+
+def aggregate(session, query, groups, aggregates):
+    """
+    Compile a GROUP BY over the rows of an already filtered query. The query
+    is wrapped as a subquery, so every filter, soft delete flag and
+    relationship join it carries applies unchanged. Its ordering and limit do
+    not, they belong to the row listing, not to the aggregate.
+
+    :param session: SQLAlchemy session
+    :param query: filtered ORM query
+    :param groups: column names to group by
+    :param aggregates: list of (function, field) pairs
+    :return: one dict per group
+    :rtype: list
+    """
+
+    rows = query.limit(None).order_by(None).subquery()
+    selected = [rows.c[name] for name in groups]
+    for name, field in aggregates:
+        argument = func.count() if field == ALL else FUNCTIONS[name](rows.c[field])
+        selected.append(argument.label(label(name, field)))
+
+    statement = select(selected).select_from(rows)
+    if groups:
+        statement = statement.group_by(*selected[:len(groups)]).order_by(*selected[:len(groups)])
+
+    labels = groups + [label(name, field) for name, field in aggregates]
+    result = []
+    for row in session.execute(statement):
+        result.append({
+            key: float(value) if isinstance(value, Decimal) else value for key, value in zip(labels, row)
+        })
+    return result
@@ -0,0 +1,157 @@
+import threading
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import Column
+from sqlalchemy import MetaData
+from sqlalchemy import Table
+from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import select
+
+from flask_atomic.orm.lookup import chunksize
+from flask_atomic.orm.lookup import coerce
+from flask_atomic.orm.lookup import forget
+from flask_atomic.orm.lookup import keyname
+from flask_atomic.orm.lookup import plain_session
+from flask_atomic.orm.softdelete import ACTIVE_FIELD
+from flask_atomic.orm.softdelete import DELETED
+from flask_atomic.orm.softdelete import DELETED_AT_FIELD
+from flask_atomic.orm.tenancy import job_criteria
+from flask_atomic.orm.transaction import run_transaction
+
+ARCHIVE_SUFFIX = '_archive'
+ARCHIVE_CUTOFF_COLUMN = DELETED_AT_FIELD
+
+_tables_lock = threading.Lock()
+# Archive tables live on their own metadata, one per model metadata, so
+# create_all and drop_all never create or drop them along with the hot tables
+_metadata = WeakKeyDictionary()
+
+
+def archive_name(table):
+    name = f'{table.name}{ARCHIVE_SUFFIX}'
+    if table.schema:
+        return f'{table.schema}.{name}'
+    return name
+
+
+def archive_table(model):
+    """
+    Cold mirror of a model table, `<table>_archive`, with the same columns
+    and primary key. It is declared on a separate metadata and only created by
+    `archive()`. Foreign keys, indexes and defaults are left out: archived
+    rows are only ever copied in and read.
+
+    :param model: SQLAlchemy model
+    :return: archive table
+    :rtype: Table
+    """
+
+    table = model.__table__
+    with _tables_lock:
+        metadata = _metadata.setdefault(table.metadata, MetaData())
+        existing = metadata.tables.get(archive_name(table), None)
+        if existing is not None:
+            return existing
+        columns = [
+            Column(item.name, item.type, primary_key=item.primary_key, autoincrement=False)
+            for item in table.columns
+        ]
+        return Table(f'{table.name}{ARCHIVE_SUFFIX}', metadata, *columns, schema=table.schema)
+
+
+def archive(model, before=None, column=ARCHIVE_CUTOFF_COLUMN, session=None, chunk=None):
+    """
+    Move soft deleted rows out of the hot table into `<table>_archive`. Each
+    chunk runs in its own transaction: the keys of the next rows flagged 'D'
+    are selected (and locked, where the database supports it), copied with
+    INSERT ... SELECT and deleted from the hot table. The archive table is
+    created on first use.
+
+    :param model: SQLAlchemy model with an active column
+    :param before: only archive rows whose `column` is older than this cutoff
+    :param column: timestamp column compared with the cutoff, by default the
+        `deleted` stamp of `DeletionMixin` set by every soft delete path
+    :param session: SQLAlchemy session, defaults to the app session
+    :param chunk: rows per transaction
+    :return: number of rows archived
+    :rtype: int
+    """
+
+    table = model.__table__
+    if ACTIVE_FIELD not in table.columns:
+        raise ValueError(f'{table.name} has no {ACTIVE_FIELD} flag')
+    if before is not None and column not in table.columns:
+        raise ValueError(f'{table.name} has no {column} column to compare the cutoff with')
+
+    session = plain_session(session)
+    target = archive_table(model)
+    target.create(bind=session.get_bind(mapper=model.__mapper__), checkfirst=True)
+
+    names = [item.name for item in table.columns]
+    primary = table.columns[keyname(model)]
+    size = chunksize(session, chunk)
+
+    criteria = [table.columns[ACTIVE_FIELD] == DELETED] + job_criteria(model)
+    if before is not None:
+        criteria.append(table.columns[column] < before)
+    chunked = and_(primary.in_(bindparam('values', expanding=True)), *criteria)
+
+    pending = select([primary]).where(and_(*criteria)).order_by(primary).limit(size).with_for_update()
+    copy = target.insert().from_select(names, select([table.columns[name] for name in names]).where(chunked))
+    purge = table.delete().where(chunked)
+
+    def move(s):
+        keys = [row[0] for row in s.execute(pending)]
+        if keys:
+            s.execute(copy, {'values': keys})
+            s.execute(purge, {'values': keys})
+        return len(keys)
+
+    total = 0
+    while True:
+        moved = run_transaction(move, session, repeat=True)
+        total += moved
+        if moved < size:
+            break
+
+    forget(model)
+    return total
+
+
+def archived(model, value, key=None, session=None):
+    """
+    Read-through to the archive table. Looks a row up by key and returns it
+    as a transient model instance, never added to the session. Returns None
+    when the row, or the archive table itself, does not exist.
+
+    :param model: SQLAlchemy model
+    :param value: value to match
+    :param key: lookup column name, defaults to the primary key
+    :param session: SQLAlchemy session, defaults to the app session
+    :return: model instance or None
+    """
+
+    session = plain_session(session)
+    target = archive_table(model)
+    bind = session.get_bind(mapper=model.__mapper__)
+    if not bind.has_table(target.name, schema=target.schema):
+        return None
+
+    key = keyname(model, key)
+    if key == keyname(model):
+        try:
+            value = coerce(model, value)
+        except (TypeError, ValueError):
+            return None
+
+    criteria = [target.columns[key] == value] + job_criteria(model, target)
+    row = session.execute(select([target]).where(and_(*criteria))).first()
+    if row is None:
+        return None
+
+    mapper = model.__mapper__
+    instance = mapper.class_manager.new_instance()
+    for item in model.__table__.columns:
+        setattr(instance, mapper.get_property_by_column(item).key, row[item.name])
+    return instance
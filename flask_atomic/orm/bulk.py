@@ -0,0 +1,116 @@
+from sqlalchemy import and_
+from sqlalchemy import bindparam
+from sqlalchemy import or_
+from sqlalchemy import select
+
+from flask_atomic.orm.lookup import chunksize
+from flask_atomic.orm.lookup import forget
+from flask_atomic.orm.lookup import keyname
+from flask_atomic.orm.lookup import plain_session
+from flask_atomic.orm.softdelete import ACTIVE_FIELD
+from flask_atomic.orm.softdelete import DELETED
+from flask_atomic.orm.softdelete import LIVE
+from flask_atomic.orm.softdelete import flag_values
+from flask_atomic.orm.tenancy import job_criteria
+from flask_atomic.orm.transaction import run_transaction
+
+INACTIVE = 'N'
+BULK_ACTIONS = {
+    'delete': DELETED,
+    'deactivate': INACTIVE,
+    'restore': LIVE,
+}
+
+
+def criteria(model, filters=None, minimum=None, maximum=None):
+    """
+    Turn query string style filters into SQL criteria on the model table.
+
+    :param model: SQLAlchemy model
+    :param filters: dict of column name to value, compared for equality
+    :param minimum: iterable of (column name, value) lower bounds
+    :param maximum: iterable of (column name, value) upper bounds
+    :return: list of criteria
+    :rtype: list
+    :raises ValueError: when a name is not a column of the model
+    """
+
+    table = model.__table__
+    pairs = [(name, value, '==') for name, value in (filters or {}).items()]
+    pairs += [(name, value, '>=') for name, value in minimum or []]
+    pairs += [(name, value, '<=') for name, value in maximum or []]
+
+    result = []
+    for name, value, operator in pairs:
+        if name not in table.columns:
+            raise ValueError(f'{name} is not a column of {table.name}')
+        column = table.columns[name]
+        if operator == '>=':
+            result.append(column >= value)
+        elif operator == '<=':
+            result.append(column <= value)
+        else:
+            result.append(column == value)
+    return result
+
+
+def bulk_flag(model, flag, keys=None, where=None, key=None, session=None, chunk=None):
+    """
+    Set the active flag of many rows without loading them, one chunk per
+    `UPDATE table SET active = :flag WHERE ...` statement and transaction.
+
+    With `keys` the rows are matched by key in IN (...) chunks, and only
+    those also matching `where` when both are given. With `where` alone the
+    matching primary keys are selected chunk by chunk, which keeps every
+    transaction and its locks short on very large updates. Rows that already
+    carry the flag are left untouched, so the count is of rows changed.
+
+    :param model: SQLAlchemy model with an active column
+    :param flag: new flag value
+    :param keys: list of key values
+    :param where: list of criteria, see `criteria`
+    :param key: key column name for `keys`, defaults to the primary key
+    :param session: SQLAlchemy session, defaults to the app session
+    :param chunk: rows per statement
+    :return: number of rows changed
+    :rtype: int
+    """
+
+    table = model.__table__
+    if ACTIVE_FIELD not in table.columns:
+        raise ValueError(f'{table.name} has no {ACTIVE_FIELD} flag')
+    if keys is None and not where:
+        raise ValueError('Bulk updates need keys or a filter')
+
+    session = plain_session(session)
+    active = table.columns[ACTIVE_FIELD]
+    primary = table.columns[keyname(model)]
+    size = chunksize(session, chunk)
+    changed = and_(or_(active.is_(None), active != flag), *job_criteria(model), *(where or []))
+
+    def update(column, values):
+        statement = table.update().where(and_(column.in_(bindparam('values', expanding=True)), changed))
+        statement = statement.values(flag_values(model, flag))
+
+        def work(session):
+            return session.execute(statement, {'values': values}).rowcount
+        return run_transaction(work, session, repeat=True)
+
+    total = 0
+    if keys is not None:
+        column = table.columns[keyname(model, key)]
+        unique = list(dict.fromkeys(keys))
+        for idx in range(0, len(unique), size):
+            total += update(column, unique[idx:idx + size])
+    else:
+        query = select([primary]).where(changed).order_by(primary).limit(size)
+        while True:
+            values = [row[0] for row in session.execute(query)]
+            if not values:
+                break
+            total += update(primary, values)
+            if len(values) < size:
+                break
+
+    forget(model)
+    return total
@@ -0,0 +1,205 @@
+import base64
+import binascii
+import json
+
+CURSOR_ARGUMENT = '_cursor'
+# Planner estimates for the row budget, dialects without one fall back to the limit
+ESTIMATE_PREFIXES = {
+    'postgresql': 'EXPLAIN (FORMAT JSON) ',
+    'mysql': 'EXPLAIN ',
+}
+
+
+class QueryBudget:
+    """
+    Cost limits of the list queries of a model, checked before the query runs.
+
+    `limit` caps the page size, asking for more silently returns `limit`
+    rows. `fanout` caps how many relationships a request may include
+    (`?relationships=true` counts every relationship of the model), `depth`
+    how deep a dotted relationship path may go and `filters` how many column
+    filters a request may combine. `rows` caps the estimated number of rows
+    the request reads and serialises: the planner estimate (or the page size)
+    times one plus the relationship fan-out, as every included relationship is
+    one more load per row.
+
+    With `bytes` set, generated list endpoints cut a page once its serialised
+    rows reach that size, and the response carries a `cursor` to fetch the
+    rest with `?_cursor=`.
+
+    Models override the budget given to the Architect with a `__budget__`
+    attribute.
+    """
+
+    def __init__(self, limit=1000, fanout=4, depth=2, filters=16, rows=None, bytes=None):
+        self.limit = limit
+        self.fanout = fanout
+        self.depth = depth
+        self.filters = filters
+        self.rows = rows
+        self.bytes = bytes
+
+    def check(self, model, queryargs):
+        """
+        Clamp the page size and reject requests above the relationship and
+        filter limits. The query arguments are changed in place.
+
+        :raises ValueError: when the request is over budget
+        """
+
+        if self.limit is not None:
+            if queryargs.limit is None or queryargs.limit > self.limit:
+                queryargs.limit = self.limit
+            if getattr(queryargs, 'pagesize', None) and queryargs.pagesize > self.limit:
+                queryargs.pagesize = self.limit
+
+        paths = relations(model, queryargs.rels)
+        if self.fanout is not None and len(paths) > self.fanout:
+            raise ValueError(f'At most {self.fanout} relationships may be included, {len(paths)} requested')
+        deepest = max([str(path).count('.') + 1 for path in paths] or [0])
+        if self.depth is not None and deepest > self.depth:
+            raise ValueError(f'Relationships may be included at most {self.depth} levels deep')
+
+        count = filter_count(queryargs)
+        if self.filters is not None and count > self.filters:
+            raise ValueError(f'At most {self.filters} filters may be combined, {count} given')
+        return queryargs
+
+    def check_rows(self, session, query, model, queryargs):
+        """
+        Reject a list query whose estimated cost is over the row budget.
+
+        :raises ValueError: when the request is over budget
+        """
+
+        if self.rows is None:
+            return None
+        rows = queryargs.limit
+        estimated = estimate(session, query, model)
+        if estimated is not None:
+            rows = min(rows, estimated) if rows is not None else estimated
+        cost = (rows or 0) * (1 + len(relations(model, queryargs.rels)))
+        if cost > self.rows:
+            raise ValueError(f'This request would read an estimated {cost} rows, the limit is {self.rows}')
+        return cost
+
+
+def budget_for(budget, model):
+    """
+    Budget of one model: its `__budget__`, else `budget`, either one
+    QueryBudget for every model or a dict keyed by model or table name.
+    """
+
+    override = getattr(model, '__budget__', None)
+    if override is not None:
+        return override
+    if isinstance(budget, dict):
+        return budget.get(model, budget.get(model.__tablename__, None))
+    return budget
+
+
+def relations(model, rels):
+    """
+    :return: relationship paths a request includes
+    :rtype: list
+    """
+
+    if not rels:
+        return []
+    if rels is True:
+        return list(model.__mapper__.relationships.keys())
+    if isinstance(rels, str):
+        return rels.split(',')
+    return list(rels)
+
+
+def filter_count(queryargs):
+    bounds = list(queryargs.min) + list(queryargs.max)
+    # Range bounds are (field, value) pairs, or flattened into one tuple
+    pairs = [item for item in bounds if isinstance(item, (tuple, list))]
+    return len(queryargs.filters) + (len(pairs) if pairs else len(bounds) // 2)
+
+
+def estimate(session, query, model):
+    """
+    Planner estimate of the rows a query returns, read from the dialect
+    specific EXPLAIN on the raw DBAPI connection.
+
+    :return: estimated rows, or None when the dialect has no estimate
+    :rtype: int
+    """
+
+    connection = session.connection(mapper=model.__mapper__)
+    prefix = ESTIMATE_PREFIXES.get(connection.dialect.name, None)
+    if prefix is None:
+        return None
+
+    compiled = query.statement.compile(dialect=connection.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(prefix + str(compiled), params)
+        rows = cursor.fetchall()
+        if connection.dialect.name == 'postgresql':
+            plan = rows[0][0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        index = [column[0] for column in cursor.description].index('rows')
+        total = 1
+        for row in rows:
+            total *= max(1, int(row[index] or 1))
+        return total
+    except Exception:
+        return None
+    finally:
+        cursor.close()
+
+
+def truncate(rows, budget, serialize=None):
+    """
+    Serialise the leading rows whose JSON encoding fits in `budget` bytes.
+    Rows past the budget are never serialised, so their relationships are
+    not walked. The first row is always kept so that a cursor makes progress.
+
+    :param rows: instances, or rows already serialised
+    :param serialize: callable turning one row into a dict
+    :return: kept rows, and whether any were cut
+    :rtype: tuple
+    """
+
+    kept, size = [], 2
+    for row in rows:
+        if serialize is not None:
+            row = serialize(row)
+        size += len(json.dumps(row, default=str)) + 1
+        if size > budget and kept:
+            return kept, True
+        kept.append(row)
+    return kept, False
+
+
+def encode_cursor(offset, limit):
+    token = json.dumps({'offset': offset, 'limit': limit}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    :return: offset and remaining limit of a continuation cursor
+    :rtype: tuple
+    :raises ValueError: for a cursor that was not issued here
+    """
+
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        offset, limit = int(data['offset']), int(data['limit'])
+    except (binascii.Error, ValueError, KeyError, TypeError, UnicodeError):
+        raise ValueError('This cursor is not valid')
+    if offset < 0 or limit < 1:
+        raise ValueError('This cursor is not valid')
+    return offset, limit
@@ -0,0 +1,217 @@
+import threading
+from collections import Counter
+
+from sqlalchemy import UniqueConstraint
+from sqlalchemy.engine.default import DefaultDialect
+
+from flask_atomic.orm.softdelete import LIVE_PREDICATE
+from flask_atomic.orm.softdelete import soft_deletable
+
+FILTER = 'filter'
+SORT = 'sort'
+KEY = 'key'
+USAGE_KINDS = (FILTER, SORT, KEY)
+
+
+def normalise_key(key):
+    """
+    Lookup keys arrive as column names, InstrumentedAttributes or, in the case
+    of CoreBlueprint, the `identify_primary_key` classmethod itself. Reduce all
+    of these down to a plain column name.
+
+    :param key: the configured lookup key
+    :return: column name
+    :rtype: str
+    """
+
+    if callable(key) and not hasattr(key, 'key'):
+        key = key()
+    return getattr(key, 'key', key)
+
+
+def indexed_columns(table):
+    """
+    Collect the leading column of every index, primary key and unique constraint
+    on a table. Only the leading column is considered. A composite index will
+    not help a lookup that filters on its trailing columns alone.
+
+    :param table: SQLAlchemy Table instance
+    :return: set of column names that can be served from an index
+    :rtype: set
+    """
+
+    leading = set()
+    for index in table.indexes:
+        columns = list(index.columns)
+        if columns:
+            leading.add(columns[0].name)
+
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint) and len(constraint.columns):
+            leading.add(list(constraint.columns)[0].name)
+
+    primary = list(table.primary_key.columns)
+    if primary:
+        leading.add(primary[0].name)
+
+    for column in table.columns:
+        if column.index or column.unique:
+            leading.add(column.name)
+    return leading
+
+
+def create_index_statement(table, column, dialect=None, where=None):
+    """
+    Render a CREATE INDEX statement without attaching a new Index to the table
+    metadata. Attaching one would make the advisor think the index exists.
+
+    :param table: SQLAlchemy Table instance
+    :param column: column name to index
+    :param dialect: dialect used for identifier quoting
+    :param where: optional predicate for a partial index
+    :return: DDL statement
+    :rtype: str
+    """
+
+    preparer = (dialect or DefaultDialect()).identifier_preparer
+    name = f'ix_{table.name}_{column}'
+    statement = 'CREATE INDEX {} ON {} ({})'.format(
+        preparer.quote(name),
+        preparer.format_table(table),
+        preparer.quote(column)
+    )
+    if where:
+        statement = f'{statement} WHERE {where}'
+    return statement
+
+
+class IndexAdvisor:
+    """
+    Tracks which columns clients filter, sort and look up by, and compares that
+    traffic against the indexes declared on each model table.
+
+    Configured lookup keys are checked once when the owning blueprint is linked
+    to the application. Query string usage is counted at runtime, so the report
+    ranks the missing indexes by how often they would have been used.
+
+    Basic usage::
+
+        advisor = IndexAdvisor()
+        Architect(MyModel, advisor=advisor).link(app)
+        ...
+        advisor.report()
+        advisor.ddl(db.engine.dialect)
+
+    """
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self.tables = dict()
+        self.live = set()
+        self.usage = dict()
+        self.lock = threading.Lock()
+
+    def track(self, model):
+        table = model.__table__
+        self.tables.setdefault(table.name, table)
+        if soft_deletable(model):
+            self.live.add(table.name)
+        return table
+
+    def check(self, model, keys):
+        """
+        Check lookup keys against the model table indexes. Called at link time.
+
+        :param model: SQLAlchemy model
+        :param keys: iterable of configured lookup keys
+        :return: lookup keys without a supporting index
+        :rtype: list
+        """
+
+        table = self.track(model)
+        indexed = indexed_columns(table)
+        missing = []
+        for key in keys:
+            name = normalise_key(key)
+            if name in table.columns and name not in indexed:
+                missing.append(name)
+
+        if self.logger:
+            for name in missing:
+                self.logger.warning(f'Lookup key {table.name}.{name} has no supporting index')
+        return missing
+
+    def record(self, model, filters=None, sort=None, key=None):
+        """
+        Count one request worth of column usage for a model. Names that do not
+        map to a column on the model table (relationship paths, typos) are
+        ignored.
+
+        :param model: SQLAlchemy model
+        :param filters: iterable of filtered column names
+        :param sort: sort column name
+        :param key: lookup key used for a single resource fetch
+        """
+
+        table = self.track(model)
+        observed = [(name, FILTER) for name in filters or []]
+        if sort:
+            observed.append((sort, SORT))
+        if key is not None:
+            observed.append((normalise_key(key), KEY))
+
+        observed = [item for item in observed if item[0] in table.columns]
+        if not observed:
+            return
+
+        with self.lock:
+            self.usage.setdefault(table.name, Counter()).update(observed)
+
+    def report(self, include_indexed=False):
+        """
+        Produce the usage report, ranked by total traffic per column.
+
+        :param include_indexed: also list columns that are already indexed
+        :return: list of usage rows
+        :rtype: list
+        """
+
+        with self.lock:
+            usage = {name: Counter(counts) for name, counts in self.usage.items()}
+
+        rows = []
+        for tablename, counts in usage.items():
+            table = self.tables[tablename]
+            indexed = indexed_columns(table)
+            for column in set(name for name, _ in counts):
+                if column in indexed and not include_indexed:
+                    continue
+                row = dict(table=tablename, column=column, indexed=column in indexed)
+                for kind in USAGE_KINDS:
+                    row[kind] = counts.get((column, kind), 0)
+                row['total'] = sum(row[kind] for kind in USAGE_KINDS)
+                rows.append(row)
+        return sorted(rows, key=lambda row: (-row['total'], row['table'], row['column']))
+
+    def ddl(self, dialect=None):
+        """
+        CREATE INDEX statements for every missing index in the report, in the
+        same traffic order. Tables of soft deletable models get partial indexes
+        over their live rows, matching the scoping applied to their queries.
+
+        :param dialect: dialect used for identifier quoting
+        :return: list of DDL statements
+        :rtype: list
+        """
+
+        return [
+            create_index_statement(
+                self.tables[row['table']], row['column'], dialect,
+                where=LIVE_PREDICATE if row['table'] in self.live else None
+            )
+            for row in self.report()
+        ]
+
+    def reset(self):
+        with self.lock:
+            self.usage = dict()
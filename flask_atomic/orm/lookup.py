@@ -0,0 +1,299 @@
+import threading
+
+from flask import current_app
+from flask import g
+from flask import has_app_context
+from sqlalchemy import bindparam
+from sqlalchemy import inspect
+from sqlalchemy.ext import baked
+from sqlalchemy.orm import scoped_session
+
+from flask_atomic.orm.softdelete import LIVE
+from flask_atomic.orm.softdelete import show_soft_deletes
+from flask_atomic.orm.sharding import current_shard
+from flask_atomic.orm.softdelete import soft_deletable
+from flask_atomic.orm.tenancy import current_tenant
+from flask_atomic.orm.tenancy import tenant_field
+
+# Soft deletion flags hidden from generated endpoints, mirroring QueryBuffer.active
+HIDDEN_FLAGS = ('D', 'X')
+IDENTITY_CACHE = '_atomic_identity_cache'
+
+# Maximum bind parameters (or IN list entries, for Oracle) per statement
+PARAMETER_LIMITS = {
+    'sqlite': 999,
+    'mssql': 2100,
+    'oracle': 1000,
+    'postgresql': 32767,
+    'mysql': 65535,
+}
+PARAMETER_HEADROOM = 10
+DEFAULT_CHUNK = 500
+
+bakery = baked.bakery(size=500)
+
+_lookups = dict()
+_lookups_lock = threading.Lock()
+
+
+def getsession():
+    return current_app.extensions['sqlalchemy'].db.session
+
+
+def plain_session(session=None):
+    # Core statements run on the session itself, not its scoped_session proxy
+    if session is None:
+        session = getsession()
+    if isinstance(session, scoped_session):
+        session = session()
+    return session
+
+
+def keyname(model, key=None):
+    if key is None:
+        return model.__mapper__.primary_key[0].name
+    return getattr(key, 'key', key)
+
+
+def scope(query, model, scoped):
+    # Unscoped lookups must see every row, so they opt out of the SQL level
+    # soft delete scoping as well
+    if not scoped:
+        query.add_criteria(lambda q: show_soft_deletes(q))
+    elif getattr(model, 'active', None) is not None:
+        query.add_criteria(lambda q: q.filter(model.active.notin_(HIDDEN_FLAGS)))
+
+
+def visible(instance):
+    active = getattr(instance, 'active', None)
+    if soft_deletable(type(instance)):
+        return active == LIVE
+    return active not in HIDDEN_FLAGS
+
+
+def lookup_query(model, key=None, scoped=False):
+    """
+    Fetch the baked single row lookup for a (model, key) pair, building it on
+    first use. The baked query caches the compiled SQL against the lambda
+    code objects and the extra arguments passed alongside them, so the model,
+    key and scoping are all part of the cache key. Every later call only binds
+    `value` and executes.
+
+    :param model: SQLAlchemy model
+    :param key: lookup column name, defaults to the primary key
+    :param scoped: hide soft deleted rows for models with an active flag
+    :return: baked query expecting a `value` parameter
+    :rtype: BakedQuery
+    """
+
+    key = keyname(model, key)
+    cachekey = (model, key, scoped)
+    query = _lookups.get(cachekey, None)
+    if query is not None:
+        return query
+
+    column = getattr(model, key)
+    query = bakery(lambda session: session.query(model), model)
+    query.add_criteria(lambda q: q.filter(column == bindparam('value')), key)
+    scope(query, model, scoped)
+
+    with _lookups_lock:
+        _lookups.setdefault(cachekey, query)
+    return _lookups[cachekey]
+
+
+def lookup(model, key, value, session=None, scoped=False):
+    """
+    Fetch one row by key through the baked lookup path.
+
+    :param model: SQLAlchemy model
+    :param key: lookup column name, defaults to the primary key when None
+    :param value: value to match
+    :param session: SQLAlchemy session, defaults to the app session
+    :param scoped: hide soft deleted rows for models with an active flag
+    :return: model instance or None
+    """
+
+    if session is None:
+        session = getsession()
+    if isinstance(session, scoped_session):
+        session = session()
+    return lookup_query(model, key, scoped)(session).params(value=value).first()
+
+
+def coerce(model, value):
+    """
+    Coerce a URL value to the primary key type so identity map lookups match
+    the keys of already loaded instances.
+    """
+
+    column = model.__mapper__.primary_key[0]
+    try:
+        pytype = column.type.python_type
+    except NotImplementedError:
+        return value
+    if isinstance(value, pytype):
+        return value
+    return pytype(value)
+
+
+def identity_mapped(model, value, session):
+    """
+    Instance already loaded in the session under this primary key, read from
+    the identity map without a statement. Expired instances count as a miss,
+    they need a statement to be loaded again anyway.
+    """
+
+    if isinstance(session, scoped_session):
+        session = session()
+    identity = model.__mapper__.identity_key_from_primary_key([value])
+    instance = session.identity_map.get(identity, None)
+    if instance is None or inspect(instance).expired:
+        return None
+    return instance
+
+
+def cache_key(model, key, value, scoped):
+    # The same key names a different row for every tenant and shard
+    return model, key, str(value), scoped, current_tenant(), current_shard()
+
+
+def primary_lookup(model, value, session, scoped):
+    try:
+        value = coerce(model, value)
+    except (TypeError, ValueError):
+        return None
+    instance = None
+    if tenant_field(model) is None and current_shard() is None:
+        instance = identity_mapped(model, value, session)
+    if instance is None:
+        return lookup(model, None, value, session, scoped)
+    if scoped and not visible(instance):
+        return None
+    return instance
+
+
+def identity_lookup(model, key, value, session=None, scoped=False):
+    """
+    Request scoped lookup. Within one application context (one request) the
+    same (model, key, value) is only loaded once. Primary key lookups are
+    served straight from the session identity map when the row was already
+    loaded by any other query in the request, and go through the baked lookup
+    otherwise.
+
+    Misses are not cached, a row created later in the same request must still
+    be found. Tenant models and lookups inside a shard skip the identity map,
+    which knows about neither, and always go through the baked lookup.
+
+    :param model: SQLAlchemy model
+    :param key: lookup column name, defaults to the primary key when None
+    :param value: value to match
+    :param session: SQLAlchemy session, defaults to the app session
+    :param scoped: hide soft deleted rows for models with an active flag
+    :return: model instance or None
+    """
+
+    if not has_app_context():
+        return lookup(model, key, value, session, scoped)
+
+    key = keyname(model, key)
+    primary = keyname(model)
+    cache = g.setdefault(IDENTITY_CACHE, dict())
+    cachekey = cache_key(model, key, value, scoped)
+    if cachekey in cache:
+        return cache[cachekey]
+
+    if session is None:
+        session = getsession()
+
+    if key == primary:
+        instance = primary_lookup(model, value, session, scoped)
+    else:
+        instance = lookup(model, key, value, session, scoped)
+
+    if instance is not None:
+        cache[cachekey] = instance
+        cache[cache_key(model, primary, getattr(instance, primary), scoped)] = instance
+    return instance
+
+
+def forget(model=None):
+    """
+    Drop request cached instances, either all of them or those of one model.
+    Called after deletes so a removed row is not served from the cache.
+    """
+
+    if not has_app_context() or IDENTITY_CACHE not in g:
+        return
+    if model is None:
+        g.pop(IDENTITY_CACHE)
+        return
+    cache = g.get(IDENTITY_CACHE)
+    for cachekey in [item for item in cache if item[0] is model]:
+        del cache[cachekey]
+
+
+def chunksize(session, requested=None):
+    """
+    Size of each IN (...) chunk. Bounded by the dialect bind parameter limit,
+    less a little headroom for the other parameters in the statement.
+    """
+
+    name = session.get_bind().dialect.name
+    limit = PARAMETER_LIMITS.get(name, DEFAULT_CHUNK) - PARAMETER_HEADROOM
+    return max(1, min(requested or DEFAULT_CHUNK, limit))
+
+
+def batch_query(model, key=None, scoped=False):
+    key = keyname(model, key)
+    cachekey = (model, key, scoped, 'batch')
+    query = _lookups.get(cachekey, None)
+    if query is not None:
+        return query
+
+    column = getattr(model, key)
+    query = bakery(lambda session: session.query(model), model)
+    query.add_criteria(lambda q: q.filter(column.in_(bindparam('values', expanding=True))), key)
+    scope(query, model, scoped)
+
+    with _lookups_lock:
+        _lookups.setdefault(cachekey, query)
+    return _lookups[cachekey]
+
+
+def lookup_many(model, key, values, session=None, scoped=False, chunk=None):
+    """
+    Fetch many rows by key with one WHERE key IN (...) statement per chunk.
+    The result is aligned with `values`: same order, same length, None for
+    every value that did not match a row.
+
+    :param model: SQLAlchemy model
+    :param key: lookup column name, defaults to the primary key when None
+    :param values: list of values to match
+    :param session: SQLAlchemy session, defaults to the app session
+    :param scoped: hide soft deleted rows for models with an active flag
+    :param chunk: maximum number of values per statement
+    :return: list of model instances or None
+    :rtype: list
+    """
+
+    if session is None:
+        session = getsession()
+    if isinstance(session, scoped_session):
+        session = session()
+
+    key = keyname(model, key)
+    unique = list(dict.fromkeys(str(value) for value in values))
+    size = chunksize(session, chunk)
+    query = batch_query(model, key, scoped)
+
+    found = dict()
+    for idx in range(0, len(unique), size):
+        for instance in query(session).params(values=unique[idx:idx + size]).all():
+            found[str(getattr(instance, key))] = instance
+
+    if has_app_context():
+        cache = g.setdefault(IDENTITY_CACHE, dict())
+        for value, instance in found.items():
+            cache[cache_key(model, key, value, scoped)] = instance
+    return [found.get(str(value), None) for value in values]
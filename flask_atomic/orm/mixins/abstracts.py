@@ -1,7 +1,11 @@
 from sqlalchemy import Column
 from sqlalchemy import String
 
+from flask_atomic.orm.bulk import INACTIVE
 from flask_atomic.orm.operators import commitsession
+from flask_atomic.orm.softdelete import DELETED
+from flask_atomic.orm.softdelete import LIVE
+from flask_atomic.orm.softdelete import set_flag
 
 
 class DYNAFlagMixin(object):
@@ -18,9 +22,16 @@ class DYNAFlagMixin(object):
 
     Database deletions should be handled by application owners or data owners.
     Allowing customers to modify the existence of data is not good.
+
+    Queries over models using this mixin only return live rows, see
+    `flask_atomic.orm.softdelete` and its `show_soft_deletes` escape hatch.
+    Deleted rows can be moved to a cold table with `flask_atomic.orm.archive`,
+    set `__archive__ = True` to read through to it on flagged lookups. Add
+    `DeletionMixin` to have the deletion time stamped for archive cutoffs.
     """
 
-    active = Column(String(1), default='Y')
+    __soft_delete__ = True
+    active = Column(String(1), default=LIVE)
 
     def can_commit(self, commit=True):
         if commit:
@@ -28,15 +39,15 @@ class DYNAFlagMixin(object):
         return self
 
     def safe_delete(self, commit=True):
-        self.active = 'D'
+        set_flag(self, DELETED)
         return self.can_commit(commit)
 
     def deactivate(self, commit=True):
-        self.active = 'N'
+        set_flag(self, INACTIVE)
         return self.can_commit(commit)
 
     def restore(self, commit=True):
-        self.active = 'Y'
+        set_flag(self, LIVE)
         return self.can_commit(commit)
 
 
@@ -54,9 +65,12 @@ class FlagMixin(object):
 
     Database deletions should be handled by application owners or data owners.
     Allowing customers to modify the existence of data is not good.
+
+    Scoped to live rows, archived and stamped like `DYNAFlagMixin`.
     """
 
-    active = Column(String(1), default='Y')
+    __soft_delete__ = True
+    active = Column(String(1), default=LIVE)
 
     def can_commit(self, commit=True):
         if commit:
@@ -64,13 +78,13 @@ class FlagMixin(object):
         return self
 
     def safe_delete(self, commit=True):
-        self.active = 'D'
+        set_flag(self, DELETED)
         return self.can_commit(commit)
 
     def deactivate(self, commit=True):
-        self.active = 'N'
+        set_flag(self, INACTIVE)
         return self.can_commit(commit)
 
     def restore(self, commit=True):
-        self.active = 'Y'
+        set_flag(self, LIVE)
         return self.can_commit(commit)
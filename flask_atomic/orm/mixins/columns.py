@@ -14,3 +14,12 @@ class CreationTimestampMixin:
 
 class UpdateMixin:
     updated = Column(DateTime, default=func.now())
+
+
+class DeletionMixin:
+    """
+    Soft deletion timestamp, stamped by every soft delete path and compared
+    with the cutoff when archiving.
+    """
+
+    deleted = Column(DateTime, nullable=True)
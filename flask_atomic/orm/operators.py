@@ -1,9 +1,8 @@
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.exc import OperationalError
 from sqlalchemy.exc import DataError
 
 from flask_atomic.logger import getlogger
 from flask_atomic.orm.database import db
+from flask_atomic.orm.transaction import run_transaction
 
 DATA_ERROR = 'Value provided for {} is too large.'
 EXCMAP = {
@@ -17,18 +16,9 @@ def __process_error(err, info):
 
 
 def commitsession():
+    # Transient errors are retried by the runner, everything else has already
+    # been rolled back by the time it reaches here.
     try:
-        db.session.commit()
-        return
-    except OperationalError as operror:
-        db.session.rollback()
-        db.session.close()
-    except IntegrityError as integerror:
-        db.session.rollback()
-        raise integerror
+        run_transaction(session=db.session)
     except DataError as error:
-        db.session.rollback()
-        return __process_error(error, EXCMAP[error.code](error))
-    except Exception as error:
-        db.session.rollback()
-        raise Exception
+        return __process_error(error, EXCMAP.get(error.code, str)(error))
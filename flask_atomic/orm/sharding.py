@@ -0,0 +1,78 @@
+import bisect
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import g
+from flask import has_app_context
+
+SHARD = '_atomic_shard'
+
+
+class ShardMap:
+    """
+    Maps the lookup key of a model to the bind holding its row. Binds are keys
+    of `SQLALCHEMY_BINDS`, each one a database with the full schema.
+
+    By default keys are hashed (crc32 of their string form) over the binds.
+    With `ranges` the binds are picked by key range instead, `ranges` holding
+    the exclusive upper bound of every bind but the last::
+
+        ShardMap(['shard0', 'shard1', 'shard2'], ranges=[100000, 200000])
+
+    A `function` taking the key and returning a bind overrides both.
+    """
+
+    def __init__(self, binds, ranges=None, function=None, workers=None):
+        if not binds:
+            raise ValueError('A shard map needs at least one bind')
+        if ranges is not None and len(ranges) != len(binds) - 1:
+            raise ValueError('Range sharding needs one upper bound per bind but the last')
+        self.binds = list(binds)
+        self.ranges = list(ranges) if ranges is not None else None
+        self.function = function
+        self.workers = workers or len(self.binds)
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def shard(self, value):
+        if self.function is not None:
+            return self.function(value)
+        if self.ranges is not None:
+            return self.binds[bisect.bisect_right(self.ranges, value)]
+        return self.binds[zlib.crc32(str(value).encode('utf-8')) % len(self.binds)]
+
+    def map(self, work):
+        """
+        Run `work(bind)` on every shard concurrently.
+
+        :return: results in bind order
+        :rtype: list
+        """
+
+        if self.executor is None:
+            with self.lock:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        return list(self.executor.map(work, self.binds))
+
+
+def current_shard():
+    if not has_app_context():
+        return None
+    return g.get(SHARD, None)
+
+
+@contextmanager
+def shard_context(bind):
+    """
+    Route every statement of the block to one shard.
+    """
+
+    previous = current_shard()
+    setattr(g, SHARD, bind)
+    try:
+        yield bind
+    finally:
+        setattr(g, SHARD, previous)
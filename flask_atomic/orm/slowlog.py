@@ -0,0 +1,274 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app
+from flask import has_app_context
+from flask import has_request_context
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from flask_atomic.logger import get_queue_handler
+
+EXTENSION_KEY = 'atomic_slowlog'
+EXPLAIN_ARGUMENT = '_explain'
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')
+# Marks the queue handler a SlowQueryLog installs on its logger
+INSTALLED = '_atomic_slowlog'
+# Execution context attribute holding the start time of the statement
+STARTED = '_atomic_slowlog_started'
+
+_state = threading.local()
+_listening = False
+_listening_lock = threading.Lock()
+
+
+class Trace:
+    """
+    Per thread record of the route and model currently executing statements.
+    When capture is enabled every statement is kept, not only the slow ones,
+    so that the plan can be returned inline with the response.
+    """
+
+    def __init__(self, log, model=None, origin=None, capture=False):
+        self.log = log
+        self.model = model
+        self.origin = origin
+        self.capture = capture
+        self.records = []
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # The start time lives on the execution context, so a statement that
+    # raises leaves nothing behind on the pooled connection
+    if context is None or getattr(_state, 'trace', None) is None:
+        return
+    setattr(context, STARTED, time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = getattr(_state, 'trace', None)
+    started = getattr(context, STARTED, None)
+    if trace is None or started is None:
+        return
+    duration = time.perf_counter() - started
+    trace.log.observe(trace, conn, statement, parameters, executemany, duration)
+
+
+def listen():
+    """
+    Statement timing is done with engine level cursor events. The listeners are
+    attached once to the Engine class and stay dormant unless a trace is active
+    on the current thread, so untracked queries pay a single attribute lookup.
+    """
+
+    global _listening
+    with _listening_lock:
+        if _listening:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listening = True
+
+
+def explain(conn, statement, parameters):
+    """
+    Run the dialect specific EXPLAIN for a statement on the raw DBAPI
+    connection. Using the raw cursor keeps the plan lookup out of the engine
+    events, which would otherwise time (and explain) the EXPLAIN itself.
+
+    :return: list of plan rows as strings, or None if the dialect is unknown
+    :rtype: list
+    """
+
+    return plan(conn.dialect.name, conn.connection, statement, parameters)
+
+
+def explain_later(engine, statement, parameters):
+    """
+    Same as `explain`, on a connection of its own checked out of the engine
+    pool, for callers that no longer hold the connection of the statement.
+    """
+
+    connection = engine.raw_connection()
+    try:
+        return plan(engine.dialect.name, connection, statement, parameters)
+    finally:
+        connection.close()
+
+
+def plan(dialect, connection, statement, parameters):
+    prefix = EXPLAIN_PREFIXES.get(dialect)
+    if not prefix or not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [' '.join(str(col) for col in row) for row in cursor.fetchall()]
+    except Exception as error:
+        return [f'EXPLAIN failed: {error}']
+    finally:
+        cursor.close()
+
+
+class PlanHandler(logging.Handler):
+    """
+    Completes slow query records with their EXPLAIN plan before handing them
+    to the sink. Runs on the queue listener thread, so the request that ran
+    the slow statement never waits on the plan.
+    """
+
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+
+    def emit(self, record):
+        query = getattr(record, 'slowquery', None)
+        engine = getattr(record, 'engine', None)
+        if query is not None:
+            if query['plan'] is None and engine is not None:
+                query['plan'] = explain_later(engine, query['statement'], query['parameters'])
+            record.msg = f'{record.msg} plan={query["plan"]}'
+        self.handler.handle(record)
+
+
+class SlowQueryLog:
+    """
+    Opt-in slow query log for statements issued by the generated endpoints,
+    QueryBuffer.execute and ModelDAO.commit.
+
+    Any statement slower than `threshold` seconds is written with its
+    parameters, duration, originating route and model, and the EXPLAIN plan.
+    Records are pushed through a queue handler so the request thread never
+    waits on the log sink, and the plan is looked up on the queue listener
+    thread with a connection of its own.
+
+    In debug mode, adding `?_explain=1` to a generated GET endpoint returns
+    every statement and plan for that request inline under `_explain`.
+
+    Basic usage::
+
+        SlowQueryLog(app, threshold=0.25)
+
+    """
+
+    def __init__(self, app=None, threshold=0.5, handler=None, logger=None, plans=True):
+        self.threshold = threshold
+        self.plans = plans
+        self.logger = logger or logging.getLogger('flask_atomic.slowlog')
+        self.handler = handler
+        self.queue_handler = None
+        self.listener = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.listener is None:
+            handler = PlanHandler(self.handler or logging.StreamHandler())
+            self.queue_handler, self.listener = get_queue_handler(handler)
+            setattr(self.queue_handler, INSTALLED, True)
+            # The logger is shared, a second log replaces the first one's
+            # handler instead of doubling every record
+            for existing in [item for item in self.logger.handlers if getattr(item, INSTALLED, False)]:
+                self.logger.removeHandler(existing)
+            self.logger.addHandler(self.queue_handler)
+            self.logger.setLevel(logging.INFO)
+        app.extensions[EXTENSION_KEY] = self
+        self.threshold = app.config.get('ATOMIC_SLOW_QUERY_THRESHOLD', self.threshold)
+        listen()
+
+    def close(self):
+        if self.listener is not None:
+            self.logger.removeHandler(self.queue_handler)
+            self.listener.stop()
+            self.listener = None
+
+    def observe(self, trace, conn, statement, parameters, executemany, duration):
+        slow = duration >= self.threshold
+        if not slow and not trace.capture:
+            return
+
+        # Inline plans are a debug aid and looked up right away, the logged
+        # ones later by the queue listener
+        plan = None
+        if self.plans and not executemany and trace.capture:
+            plan = explain(conn, statement, parameters)
+
+        record = dict(
+            statement=statement,
+            parameters=parameters if not executemany else list(parameters),
+            duration=round(duration * 1000, 3),
+            origin=trace.origin,
+            model=getattr(trace.model, '__tablename__', None),
+            plan=plan
+        )
+        engine = conn.engine if self.plans and not executemany else None
+
+        if trace.capture:
+            trace.records.append(record)
+        if slow:
+            self.logger.warning(
+                'Slow query %.3fms [%s %s] %s %s',
+                record['duration'], record['origin'], record['model'],
+                statement, record['parameters'],
+                extra=dict(slowquery=record, engine=engine)
+            )
+
+
+def explain_requested():
+    if not has_request_context() or not current_app.debug:
+        return False
+    return request.args.get(EXPLAIN_ARGUMENT, None) in ['1', 'true']
+
+
+@contextmanager
+def tracking(model=None, origin=None):
+    """
+    Attribute statements executed inside the block to a model and origin. This
+    is a no-op when no SlowQueryLog is installed on the current app. Nested
+    blocks keep the outermost origin, i.e. a commit inside a route handler is
+    reported against the route.
+    """
+
+    log = None
+    if has_app_context():
+        log = current_app.extensions.get(EXTENSION_KEY, None)
+
+    if log is None or getattr(_state, 'trace', None) is not None:
+        yield getattr(_state, 'trace', None)
+        return
+
+    if origin is None and has_request_context():
+        origin = request.endpoint
+
+    _state.trace = Trace(log, model, origin, capture=explain_requested())
+    try:
+        yield _state.trace
+    finally:
+        _state.trace = None
+
+
+def explained(func, model=None):
+    """
+    Route decorator that tracks the handler and, if `?_explain=1` was asked
+    for in debug mode, adds the captured statements and plans to the response.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with tracking(model) as trace:
+            response = func(*args, **kwargs)
+        if trace is not None and trace.capture and isinstance(response, tuple) and isinstance(response[0], dict):
+            response[0][EXPLAIN_ARGUMENT] = trace.records
+        return response
+    return wrapper
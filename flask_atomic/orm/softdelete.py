@@ -0,0 +1,90 @@
+from sqlalchemy import Index
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import text
+from sqlalchemy.orm import Query
+
+ACTIVE_FIELD = 'active'
+LIVE = 'Y'
+DELETED = 'D'
+DELETED_AT_FIELD = 'deleted'
+LIVE_PREDICATE = f"{ACTIVE_FIELD} = '{LIVE}'"
+SHOW_SOFT_DELETES = 'show_soft_deletes'
+
+
+def soft_deletable(entity):
+    """
+    Models are scoped when they use one of the DYNA flag mixins, which mark
+    themselves with `__soft_delete__`.
+    """
+
+    return isinstance(entity, type) and getattr(entity, '__soft_delete__', False)
+
+
+def flag_values(model, flag):
+    """
+    Column values written along with a new active flag. Models with a
+    `deleted` timestamp column (see `DeletionMixin`) get it stamped when the
+    row is flagged deleted and cleared when it is flagged anything else.
+
+    :return: dict of column name to value
+    :rtype: dict
+    """
+
+    values = {ACTIVE_FIELD: flag}
+    if DELETED_AT_FIELD in model.__table__.columns:
+        values[DELETED_AT_FIELD] = func.now() if flag == DELETED else None
+    return values
+
+
+def set_flag(instance, flag):
+    mapper = type(instance).__mapper__
+    for name, value in flag_values(type(instance), flag).items():
+        setattr(instance, mapper.get_property_by_column(mapper.local_table.columns[name]).key, value)
+    return instance
+
+
+def show_soft_deletes(query):
+    """
+    Escape hatch from soft delete scoping. The returned query loads every row
+    whatever its active flag.
+    """
+
+    return query.execution_options(**{SHOW_SOFT_DELETES: True})
+
+
+def scope(query):
+    """
+    Restrict every ORM query over a soft deletable model to live rows, in SQL.
+    Runs just before the query is compiled, so it applies to list queries,
+    lookups, counts and lazy loaded relationships alike.
+
+    Refreshes of an already loaded instance are left alone, otherwise
+    touching an instance right after soft deleting it would fail.
+    """
+
+    if query._execution_options.get(SHOW_SOFT_DELETES, False) or query._refresh_state is not None:
+        return query
+
+    for description in query.column_descriptions:
+        entity = description.get('entity', None)
+        if soft_deletable(entity):
+            query = query.enable_assertions(False).filter(getattr(entity, ACTIVE_FIELD) == LIVE)
+    return query
+
+
+event.listen(Query, 'before_compile', scope, retval=True, bake_ok=True)
+
+
+def live_index(name, *columns, **kwargs):
+    """
+    Declare a partial index covering live rows only. Pairs with the soft
+    delete scoping, whose `active = 'Y'` predicate lets the planner use it::
+
+        __table_args__ = (live_index('ix_orders_customer_live', 'customer_id'),)
+
+    Dialects without partial indexes create a regular index.
+    """
+
+    where = text(LIVE_PREDICATE)
+    return Index(name, *columns, postgresql_where=where, sqlite_where=where, **kwargs)
@@ -0,0 +1,130 @@
+from contextlib import contextmanager
+
+from flask import g
+from flask import has_app_context
+from sqlalchemy import bindparam
+from sqlalchemy import event
+from sqlalchemy.orm import Query
+from sqlalchemy.orm import Session
+
+TENANT = '_atomic_tenant'
+ALL_TENANTS = 'all_tenants'
+
+
+def tenant_field(entity):
+    """
+    Column name a model is partitioned by. Models opt in by naming it::
+
+        class Order(db.Model):
+            __tenant__ = 'tenant_id'
+    """
+
+    if not isinstance(entity, type):
+        return None
+    return getattr(entity, '__tenant__', None)
+
+
+def current_tenant():
+    if not has_app_context():
+        return None
+    return g.get(TENANT, None)
+
+
+def set_tenant(tenant):
+    setattr(g, TENANT, tenant)
+
+
+@contextmanager
+def tenant_context(tenant):
+    """
+    Run a block as one tenant, for jobs and scripts outside of a request::
+
+        with tenant_context('acme'):
+            Order.query.all()
+    """
+
+    previous = current_tenant()
+    set_tenant(tenant)
+    try:
+        yield tenant
+    finally:
+        set_tenant(previous)
+
+
+def all_tenants(query):
+    """
+    Escape hatch from tenant scoping, for administrative reads across every
+    tenant.
+    """
+
+    return query.execution_options(**{ALL_TENANTS: True})
+
+
+def tenant_criteria(model, table=None):
+    """
+    SQL criteria restricting a model table to the current tenant. The tenant
+    is a bind parameter read when the statement executes, so cached and baked
+    statements stay correct across requests. Outside of a tenant nothing
+    matches: scoping fails closed.
+
+    :param model: SQLAlchemy model
+    :param table: table to filter, defaults to the model table
+    :return: list of criteria, empty for models without a tenant column
+    :rtype: list
+    """
+
+    name = tenant_field(model)
+    if name is None:
+        return []
+    column = (table if table is not None else model.__table__).columns[name]
+    return [column == bindparam(TENANT, callable_=current_tenant, type_=column.type, unique=True)]
+
+
+def job_criteria(model, table=None):
+    """
+    Tenant criteria for Core statements built per call, such as bulk updates
+    and archival. Inside a tenant only its rows are touched, outside of one
+    the job runs across every tenant.
+    """
+
+    if current_tenant() is None:
+        return []
+    return tenant_criteria(model, table)
+
+
+def scope(query):
+    """
+    Restrict every ORM query over a tenant model to the rows of the current
+    tenant, in SQL. Like the soft delete scoping this runs just before the
+    query compiles, so list queries, lookups, counts, aggregates and lazy
+    loads are all covered.
+    """
+
+    if query._execution_options.get(ALL_TENANTS, False) or query._refresh_state is not None:
+        return query
+
+    for description in query.column_descriptions:
+        entity = description.get('entity', None)
+        criteria = tenant_criteria(entity)
+        if criteria:
+            query = query.enable_assertions(False).filter(*criteria)
+    return query
+
+
+def stamp(session, context, instances):
+    """
+    Write every new or changed tenant row as the current tenant, whatever the
+    payload said, so one tenant can never write into another.
+    """
+
+    tenant = current_tenant()
+    if tenant is None:
+        return
+    for instance in list(session.new) + list(session.dirty):
+        name = tenant_field(type(instance))
+        if name is not None and getattr(instance, name, None) != tenant:
+            setattr(instance, name, tenant)
+
+
+event.listen(Query, 'before_compile', scope, retval=True, bake_ok=True)
+event.listen(Session, 'before_flush', stamp)
@@ -0,0 +1,184 @@
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g
+from flask import has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from sqlalchemy.exc import DBAPIError
+
+from flask_atomic.orm.transaction import errorcode
+from flask_atomic.orm.transaction import sqlstate
+
+DEADLINE = '_atomic_deadline'
+# Postgres query_canceled and MySQL max_execution_time exceeded.
+TIMEOUT_SQLSTATES = {'57014'}
+TIMEOUT_MYSQL_CODES = {3024}
+# SQLite reports a progress handler abort as an interrupt.
+TIMEOUT_MESSAGES = ('interrupted',)
+# SQLite virtual machine instructions between two deadline checks
+PROGRESS_STEPS = 1000
+SELECT = re.compile(r'^\s*SELECT\b', re.IGNORECASE)
+# Postgres statement timeout set in the open transaction, in milliseconds
+STATEMENT_TIMEOUT = '_atomic_statement_timeout'
+# The timeout already set is kept while it exceeds the remaining deadline by
+# at most this fraction, so a transaction sends SET LOCAL once, not per statement
+TIMEOUT_SLACK = 0.25
+
+_listening = False
+_listening_lock = threading.Lock()
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised instead of sending a statement once the deadline of the request
+    has already passed.
+    """
+
+
+class Deadline:
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def current_deadline():
+    if not has_app_context():
+        return None
+    return g.get(DEADLINE, None)
+
+
+@contextmanager
+def deadline_context(deadline):
+    """
+    Bound every statement of the block by a deadline. A nested deadline can
+    only shorten the one already in place, never extend it.
+
+    :param deadline: Deadline, or None to leave the current one unchanged
+    """
+
+    previous = current_deadline()
+    current = deadline
+    if current is None or (previous is not None and previous.expires < current.expires):
+        current = previous
+    setattr(g, DEADLINE, current)
+    try:
+        yield current
+    finally:
+        setattr(g, DEADLINE, previous)
+
+
+def is_timeout(error):
+    """
+    :return: True for a statement cancelled by its timeout, or refused because
+        the deadline had already passed
+    :rtype: bool
+    """
+
+    if isinstance(error, DeadlineExceeded):
+        return True
+    if not isinstance(error, DBAPIError):
+        return False
+    if sqlstate(error) in TIMEOUT_SQLSTATES or errorcode(error) in TIMEOUT_MYSQL_CODES:
+        return True
+    message = str(error.orig).lower()
+    return any(fragment in message for fragment in TIMEOUT_MESSAGES)
+
+
+def _progress(holder):
+    def handler():
+        deadline = holder[0]
+        return 1 if deadline is not None and deadline.expired() else 0
+    return handler
+
+
+def _arm(fairy, deadline):
+    # The handler stays installed on the DBAPI connection and reads the
+    # deadline from its info, so a pooled connection never keeps a stale one.
+    holder = fairy.info.get(DEADLINE, None)
+    if holder is None:
+        if deadline is None:
+            return
+        holder = fairy.info[DEADLINE] = [None]
+        fairy.connection.set_progress_handler(_progress(holder), PROGRESS_STEPS)
+    holder[0] = deadline
+
+
+def _statement_timeout(conn, cursor, milliseconds):
+    # SET LOCAL lasts until the end of the transaction, nothing leaks into the
+    # pool. It is sent again only when the deadline moved enough to matter.
+    current = conn.info.get(STATEMENT_TIMEOUT, None)
+    if milliseconds is None:
+        if current is not None:
+            cursor.execute('SET LOCAL statement_timeout = DEFAULT')
+            conn.info.pop(STATEMENT_TIMEOUT, None)
+        return
+    if current is not None and milliseconds <= current <= milliseconds * (1 + TIMEOUT_SLACK):
+        return
+    cursor.execute(f'SET LOCAL statement_timeout = {milliseconds}')
+    conn.info[STATEMENT_TIMEOUT] = milliseconds
+
+
+def _transaction_ended(conn, *args):
+    conn.info.pop(STATEMENT_TIMEOUT, None)
+
+
+def _connection_reset(dbapi_connection, record):
+    record.info.pop(STATEMENT_TIMEOUT, None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    deadline = current_deadline()
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        _arm(conn.connection, deadline)
+    if deadline is None:
+        if dialect == 'postgresql':
+            _statement_timeout(conn, cursor, None)
+        return statement, parameters
+
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded(f'Deadline of {deadline.seconds}s exceeded before the statement was sent')
+
+    milliseconds = max(1, math.ceil(remaining * 1000))
+    if dialect == 'postgresql':
+        _statement_timeout(conn, cursor, milliseconds)
+    elif dialect == 'mysql' and SELECT.match(statement):
+        statement = SELECT.sub(f'SELECT /*+ MAX_EXECUTION_TIME({milliseconds}) */', statement, count=1)
+    return statement, parameters
+
+
+def listen():
+    """
+    Statement timeouts are applied from an engine level cursor event, attached
+    once to the Engine class. Without a deadline on the current request the
+    statement goes through untouched.
+
+    Postgres gets a `SET LOCAL statement_timeout` once per transaction, sent
+    again only when the remaining deadline has shrunk well below it,
+    MySQL SELECTs a `MAX_EXECUTION_TIME` optimizer hint (MySQL only bounds
+    reads), and SQLite a progress handler aborting the statement once the
+    deadline passes.
+    """
+
+    global _listening
+    with _listening_lock:
+        if _listening:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute, retval=True)
+        for name in ['commit', 'rollback', 'rollback_savepoint']:
+            event.listen(Engine, name, _transaction_ended)
+        event.listen(Pool, 'reset', _connection_reset)
+        _listening = True
@@ -0,0 +1,245 @@
+import random
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+JOURNAL = 'atomic_journal'
+
+# SQLSTATE classes for serialization failures, deadlocks and lost connections.
+TRANSIENT_SQLSTATES = {
+    '40001', '40P01',
+    '08000', '08001', '08003', '08004', '08006',
+    '57P01', '57P02', '57P03',
+}
+# MySQL lock wait timeout, deadlock and connection loss error codes.
+TRANSIENT_MYSQL_CODES = {1205, 1213, 2003, 2006, 2013}
+DISCONNECT_MYSQL_CODES = {2003, 2006, 2013}
+TRANSIENT_MESSAGES = ('database is locked', 'deadlock', 'could not serialize')
+DISCONNECT_MESSAGES = (
+    'server closed the connection', 'connection reset', 'connection refused',
+    'lost connection', 'gone away', 'terminating connection', 'broken pipe',
+)
+
+
+def sqlstate(error):
+    orig = getattr(error, 'orig', None)
+    return getattr(orig, 'pgcode', None) or getattr(orig, 'sqlstate', None)
+
+
+def errorcode(error):
+    args = getattr(getattr(error, 'orig', None), 'args', None) or (None,)
+    return args[0]
+
+
+def is_disconnect(error):
+    if not isinstance(error, DBAPIError):
+        return False
+    if error.connection_invalidated:
+        return True
+    if str(sqlstate(error) or '').startswith('08') or errorcode(error) in DISCONNECT_MYSQL_CODES:
+        return True
+    message = str(error.orig).lower()
+    return any(fragment in message for fragment in DISCONNECT_MESSAGES)
+
+
+def is_transient(error):
+    """
+    Decide whether a failed transaction is worth retrying. Disconnects,
+    deadlocks, lock timeouts and serialization failures are. Constraint
+    violations, bad data and programming errors are not and must surface.
+
+    :param error: exception raised by the commit
+    :return: True if the same transaction may succeed on a retry
+    :rtype: bool
+    """
+
+    if not isinstance(error, DBAPIError):
+        return False
+    if is_disconnect(error):
+        return True
+    if sqlstate(error) in TRANSIENT_SQLSTATES or errorcode(error) in TRANSIENT_MYSQL_CODES:
+        return True
+    message = str(error.orig).lower()
+    return any(fragment in message for fragment in TRANSIENT_MESSAGES)
+
+
+def _contains(instances, instance):
+    return any(item is instance for item in instances)
+
+
+class Snapshot:
+    """
+    A rollback expunges pending instances and expires every persistent one,
+    which throws away any attribute changes made in the transaction. The
+    snapshot records the whole unit of work so that it can be replayed onto
+    the session before retrying: what is still pending at commit time, plus
+    the journal of everything autoflushed since the transaction began.
+    """
+
+    def __init__(self, session=None):
+        self.new = []
+        self.deleted = []
+        self.dirty = dict()
+        if session is None:
+            return
+        journal = session.info.get(JOURNAL, None)
+        if journal is not None:
+            self.new, self.deleted, self.dirty = list(journal.new), list(journal.deleted), dict(journal.dirty)
+        self.record(session)
+
+    def record(self, session):
+        for instance in session.new:
+            if not _contains(self.new, instance):
+                self.new.append(instance)
+        for instance in session.dirty:
+            state = inspect(instance)
+            changes = {attr.key: attr.value for attr in state.attrs if attr.history.has_changes()}
+            if changes:
+                self.dirty.setdefault(id(instance), (instance, dict()))[1].update(changes)
+        for instance in session.deleted:
+            if _contains(self.new, instance):
+                # Inserted and deleted in the same transaction, nothing to replay
+                self.new = [item for item in self.new if item is not instance]
+            elif not _contains(self.deleted, instance):
+                self.deleted.append(instance)
+
+    def replay(self, session):
+        session.add_all(self.new)
+        for instance, changes in self.dirty.values():
+            for key, value in changes.items():
+                setattr(instance, key, value)
+            session.add(instance)
+        for instance in self.deleted:
+            session.delete(instance)
+
+
+def journal(session, context, instances):
+    """
+    Keep what every flush writes until the transaction ends, so a retried
+    commit can replay autoflushed changes too.
+    """
+
+    entry = session.info.get(JOURNAL, None)
+    if entry is None:
+        entry = session.info[JOURNAL] = Snapshot()
+    entry.record(session)
+
+
+def forget(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(JOURNAL, None)
+
+
+class TransactionRunner:
+    """
+    Commits a session, retrying transient database errors with jittered
+    exponential backoff. After a disconnect the pool is disposed and the new
+    connection is pinged before the unit of work is replayed, in the same
+    spirit as `pool_pre_ping`. Everything that is not transient is rolled back
+    and re-raised untouched.
+
+    Basic usage::
+
+        runner = TransactionRunner(retries=5)
+        runner.run(lambda session: session.add(instance), db.session)
+
+    """
+
+    def __init__(self, retries=3, backoff=0.05, ceiling=2.0, sleep=time.sleep):
+        self.retries = retries
+        self.backoff = backoff
+        self.ceiling = ceiling
+        self.sleep = sleep
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            retries=config.get('ATOMIC_COMMIT_RETRIES', 3),
+            backoff=config.get('ATOMIC_COMMIT_BACKOFF', 0.05),
+            ceiling=config.get('ATOMIC_COMMIT_BACKOFF_CEILING', 2.0),
+        )
+
+    def delay(self, attempt):
+        # Full jitter: spread retries from many workers across the window
+        return random.uniform(0, min(self.ceiling, self.backoff * 2 ** attempt))
+
+    def recover(self, session, error):
+        session.rollback()
+        if is_disconnect(error) and not error.connection_invalidated:
+            session.get_bind().dispose()
+
+    def retry(self, session, error, attempt):
+        """
+        Roll back after a failed commit and wait before the next attempt.
+
+        :return: the number of the next attempt
+        :raises DBAPIError: when the error is not transient or retries are spent
+        """
+
+        self.recover(session, error)
+        if not is_transient(error) or attempt >= self.retries:
+            raise error
+        attempt += 1
+        self.sleep(self.delay(attempt))
+        return attempt
+
+    def resume(self, work, session, snapshot):
+        session.execute(text('SELECT 1'))
+        if snapshot is None:
+            return work(session)
+        snapshot.replay(session)
+        return None
+
+    def run(self, work=None, session=None, repeat=False):
+        """
+        Apply `work` to the session and commit it.
+
+        :param work: callable taking the session, applied once before commit
+        :param session: SQLAlchemy session, defaults to the app session
+        :param repeat: apply `work` again on every retry instead of replaying
+            the unit of work, for work made of Core statements the session
+            does not track
+        :return: the return value of `work`
+        """
+
+        if session is None:
+            session = current_app.extensions['sqlalchemy'].db.session
+
+        try:
+            result = work(session) if work else None
+            snapshot = None if repeat else Snapshot(session)
+        except Exception:
+            session.rollback()
+            raise
+
+        attempt = 0
+        while True:
+            try:
+                if attempt:
+                    replayed = self.resume(work, session, snapshot)
+                    result = replayed if repeat else result
+                session.commit()
+                return result
+            except DBAPIError as error:
+                attempt = self.retry(session, error, attempt)
+            except Exception:
+                session.rollback()
+                raise
+
+
+event.listen(Session, 'before_flush', journal)
+event.listen(Session, 'after_transaction_end', forget)
+
+
+def run_transaction(work=None, session=None, runner=None, repeat=False):
+    if runner is None:
+        try:
+            runner = TransactionRunner.from_config(current_app.config)
+        except RuntimeError:
+            runner = TransactionRunner()
+    return runner.run(work, session, repeat=repeat)
@@ -1,10 +1,33 @@
 import flask_sqlalchemy
+from sqlalchemy import orm
+
+from flask_atomic.orm.sharding import current_shard
+from flask_atomic.orm.tenancy import current_tenant
 
 '''Created by Isaac Martin 2017. Licensed insofar as it can be according to the standard terms of the MIT license: 
 https://en.wikipedia.org/wiki/MIT_License. The author accepts no liability for consequences resulting from the use of 
 this software. '''
 
 
+class RoutingSession(flask_sqlalchemy.SignallingSession):
+    """
+    Session routing statements to the shard selected for the request, or to
+    the bind or schema of the current tenant when one is configured for it.
+    Tables with an explicit `__bind_key__` stay where they are.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        bind = super().get_bind(mapper, clause)
+        shard, tenant = current_shard(), current_tenant()
+        if shard is None and tenant is None:
+            return bind
+
+        db = flask_sqlalchemy.get_state(self.app).db
+        if shard is not None:
+            return db.get_shard_engine(shard, bind, self.app)
+        return db.get_tenant_engine(tenant, bind, self.app)
+
+
 class SQLAlchemy(flask_sqlalchemy.SQLAlchemy):
     def __init__(
             self,
@@ -19,6 +42,8 @@ class SQLAlchemy(flask_sqlalchemy.SQLAlchemy):
 
         self.use_native_unicode = use_native_unicode
         self.Query = query_class
+        self._schema_engines = {}
+        self._binds = {}
         self.session = self.create_scoped_session(session_options)
         self.Model = self.make_declarative_base(model_class, metadata)
         self._engine_lock = flask_sqlalchemy.Lock()
@@ -30,6 +55,47 @@ class SQLAlchemy(flask_sqlalchemy.SQLAlchemy):
         if app is not None:
             self.init_app(app)
 
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def get_shard_engine(self, shard, engine, app=None):
+        """
+        Engine of one shard, a key of `SQLALCHEMY_BINDS`. Only statements
+        that would otherwise run on the default engine move to the shard.
+        """
+
+        app = self.get_app(app)
+        if engine is not self.get_engine(app):
+            return engine
+        return self.get_engine(app, bind=shard)
+
+    def get_tenant_engine(self, tenant, engine, app=None):
+        """
+        Engine serving one tenant. `ATOMIC_TENANT_BINDS` maps tenants to keys
+        of `SQLALCHEMY_BINDS`, for tenants living on a dedicated database.
+        `ATOMIC_TENANT_SCHEMAS` maps tenants to a schema, which replaces the
+        default schema of every table through `schema_translate_map`.
+        """
+
+        app = self.get_app(app)
+        key = (app.config.get('ATOMIC_TENANT_BINDS') or {}).get(tenant, None)
+        schema = (app.config.get('ATOMIC_TENANT_SCHEMAS') or {}).get(tenant, None)
+        if key is None and schema is None:
+            return engine
+        if engine is not self.get_engine(app):
+            return engine
+
+        if key is not None:
+            engine = self.get_engine(app, bind=key)
+        if schema is None:
+            return engine
+
+        with self._engine_lock:
+            cachekey = (engine, schema)
+            if cachekey not in self._schema_engines:
+                self._schema_engines[cachekey] = engine.execution_options(schema_translate_map={None: schema})
+            return self._schema_engines[cachekey]
+
     def get_tables_for_bind(self, bind=None):
         """
         Returns a list of all tables relevant for a bind.
@@ -47,16 +113,31 @@ class SQLAlchemy(flask_sqlalchemy.SQLAlchemy):
         """
         Returns a dictionary with a table->engine mapping.
         This is suitable for use of sessionmaker(binds=db.get_binds(app)).
+
+        Every session asks for the mapping, so it is built in a single pass
+        over the tables and kept until the engines or the tables change.
         """
 
         app = self.get_app(app)
         binds = [None] + list(app.config.get('SQLALCHEMY_BINDS') or ())
+        engines = [(bind, self.get_engine(app, bind)) for bind in binds]
+        cachekey = (tuple(engines), sum(len(Base.metadata.tables) for Base in self.bases))
+
+        with self._engine_lock:
+            retval = self._binds.get(cachekey, None)
+        if retval is not None:
+            return dict(retval)
+
+        lookup = dict(engines)
         retval = {}
-        for bind in binds:
-            engine = self.get_engine(app, bind)
-            tables = self.get_tables_for_bind(bind)
-            retval.update(dict((table, engine) for table in tables))
-        return retval
+        for table in [table for Base in self.bases for table in flask_sqlalchemy.itervalues(Base.metadata.tables)]:
+            bind = table.info.get('bind_key')
+            if bind in lookup:
+                retval[table] = lookup[bind]
+
+        with self._engine_lock:
+            self._binds[cachekey] = retval
+        return dict(retval)
 
     @property
     def bases(self):
@@ -0,0 +1,67 @@
+import threading
+import unittest
+
+from flask import Flask
+
+from flask_atomic.auth.hashing import PBKDF2
+from flask_atomic.auth.hashing import HasherSaturated
+from flask_atomic.auth.hashing import PasswordHasher
+from flask_atomic.auth.hashing import get_hasher
+from flask_atomic.auth.hashing import identify
+
+
+class TestPasswordHasher(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.hasher = PasswordHasher(cost=dict(iterations=1000), workers=2)
+        self.addCleanup(self.hasher.shutdown)
+
+    def test_hash_and_verify(self):
+        hashed = self.hasher.hash('password123')
+        self.assertEqual(identify(hashed), PBKDF2)
+        self.assertTrue(self.hasher.verify(hashed, 'password123'))
+        self.assertFalse(self.hasher.verify(hashed, 'wrong'))
+        self.assertFalse(self.hasher.verify(None, 'password123'))
+
+    def test_rehash_on_cost_change(self):
+        hashed = self.hasher.hash('password123')
+        self.assertEqual(self.hasher.verify_and_update(hashed, 'password123'), (True, None))
+
+        stronger = PasswordHasher(cost=dict(iterations=2000), workers=1)
+        self.addCleanup(stronger.shutdown)
+        valid, rehashed = stronger.verify_and_update(hashed, 'password123')
+        self.assertTrue(valid)
+        self.assertFalse(stronger.needs_rehash(rehashed))
+        self.assertTrue(stronger.verify(rehashed, 'password123'))
+        self.assertEqual(stronger.verify_and_update(hashed, 'wrong'), (False, None))
+
+    def test_sheds_when_backlog_full(self):
+        hasher = PasswordHasher(cost=dict(iterations=1000), workers=1, backlog=1)
+        self.addCleanup(hasher.shutdown)
+        release = threading.Event()
+        busy = hasher.submit(release.wait)
+        with self.assertRaises(HasherSaturated):
+            hasher.hash('password123')
+
+        app = Flask(__name__)
+        app.add_url_rule('/login', 'login', lambda: str(hasher.verify('pbkdf2:sha256:1000$a$b', 'x')))
+        resp = app.test_client().get('/login')
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.headers['Retry-After'], '1')
+
+        release.set()
+        hasher.shutdown()
+        self.assertTrue(busy.done())
+        self.assertEqual(app.test_client().get('/login').status_code, 200)
+
+    def test_unavailable_scheme(self):
+        with self.assertRaises(ValueError):
+            PasswordHasher(scheme='md5')
+
+    def test_hasher_from_config(self):
+        app = Flask(__name__)
+        app.config['ATOMIC_PASSWORD_COST'] = dict(iterations=5000)
+        hasher = get_hasher(app)
+        self.addCleanup(hasher.shutdown)
+        self.assertIs(get_hasher(app), hasher)
+        self.assertEqual(hasher.cost['iterations'], 5000)
@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask
+from jwt.algorithms import RSAAlgorithm
+
+from flask_atomic.auth import jwt as atomic_jwt
+from flask_atomic.auth.jwt import TokenCache
+from flask_atomic.auth.jwt import decode_auth_token
+from flask_atomic.auth.jwt import encode_auth_token
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SECRET_KEY'] = 'secret'
+        atomic_jwt._tokens.clear()
+
+    def test_verified_tokens_skip_decode(self):
+        token = encode_auth_token(1, 'secret')
+        with self.app.app_context():
+            self.assertEqual(decode_auth_token(token), {'user': 1, 'access': True})
+            with mock.patch.object(atomic_jwt.jwt, 'decode', side_effect=AssertionError):
+                self.assertEqual(decode_auth_token(token), {'user': 1, 'access': True})
+
+    def test_invalid_tokens_not_cached(self):
+        token = encode_auth_token(1, 'other')
+        with self.app.app_context():
+            self.assertEqual(decode_auth_token(token), 'Invalid token. Please log in again')
+            self.assertEqual(len(atomic_jwt._tokens), 0)
+
+    def test_entries_expire(self):
+        now = [1000.0]
+        cache = TokenCache(maxsize=2, ttl=60, clock=lambda: now[0])
+        cache.put('a', 'key', {'user': 1}, exp=1010)
+        cache.put('b', 'key', {'user': 2})
+        self.assertEqual(cache.get('a', 'key'), {'user': 1})
+        self.assertIsNone(cache.get('a', 'other'))
+        now[0] = 1020.0
+        self.assertIsNone(cache.get('a', 'key'))
+        self.assertEqual(cache.get('b', 'key'), {'user': 2})
+        cache.put('c', 'key', {'user': 3})
+        cache.put('d', 'key', {'user': 4})
+        self.assertIsNone(cache.get('b', 'key'))
+
+    def test_jwks_keys(self):
+        private = rsa.generate_private_key(65537, 2048, default_backend())
+        jwk = json.loads(RSAAlgorithm.to_jwk(private.public_key()))
+        jwk.update(kid='main', alg='RS256')
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as fh:
+            json.dump({'keys': [jwk]}, fh)
+        self.addCleanup(os.unlink, fh.name)
+
+        self.app.config['JWT_JWKS_FILE'] = fh.name
+        token = jwt.encode({'sub': 7}, private, algorithm='RS256', headers={'kid': 'main'})
+        unknown = jwt.encode({'sub': 7}, private, algorithm='RS256', headers={'kid': 'other'})
+        with self.app.app_context():
+            self.assertEqual(decode_auth_token(token), {'user': 7, 'access': True})
+            self.assertEqual(decode_auth_token(unknown), 'Invalid token. Please log in again')
@@ -1,8 +1,63 @@
 import unittest
+from unittest import mock
+
+from flask import Flask
+from sqlalchemy import event
+
+from flask_atomic.dao.base import BaseDAO
+from flask_atomic.dao.base import marshalling
+from flask_atomic.orm.base import DeclarativeBase
+from flask_atomic.orm.database import db
+
+
+class Gadget(DeclarativeBase):
+    __tablename__ = 'dao_gadget'
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(32))
 
 
 class TestDAOBase(unittest.TestCase):
 
-    def setUp(self) -> None: pass
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.context = self.app.test_request_context('/')
+        self.context.push()
+        db.create_all()
+        db.session.add(Gadget(id=1, label='first'))
+        db.session.commit()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_get_one_marshalled_from_model_cache(self):
+        statements = []
+        engine = db.get_engine()
+
+        def listener(*args):
+            statements.append(args[2])
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            self.assertEqual(BaseDAO(Gadget, querystring={}).get_one(1).json(), {'id': 1, 'label': 'first'})
+            self.assertEqual(BaseDAO(Gadget, querystring={}).get_one('1').json(), {'id': 1, 'label': 'first'})
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+        self.assertEqual(len(statements), 1)
+        self.assertIs(marshalling(Gadget), marshalling(Gadget))
+
+    def test_get_one_applies_filters(self):
+        dao = BaseDAO(Gadget, querystring={})
+        dao.filters = {'label': 'second'}
+        self.assertIsNone(dao.get_one(1).view())
+        dao.filters = {'label': 'first'}
+        self.assertEqual(dao.get_one(1).json(), {'id': 1, 'label': 'first'})
 
-    def tearDown(self) -> None: pass
+    def test_get_one_tracked(self):
+        with mock.patch('flask_atomic.dao.buffer.query.observe_rows') as observe:
+            BaseDAO(Gadget, querystring={}).get_one(1)
+            BaseDAO(Gadget, querystring={}).get_one(2)
+        self.assertEqual(observe.call_args_list, [mock.call(Gadget, 1), mock.call(Gadget, 0)])
@@ -0,0 +1,57 @@
+import gzip
+import unittest
+
+from flask import jsonify
+
+from flask_atomic.ext import FlaskJSON
+from flask_atomic.http.compression import Compression
+from flask_atomic.http.compression import GZIP
+from flask_atomic.http.compression import negotiate
+
+
+class TestNegotiate(unittest.TestCase):
+
+    def test_negotiate(self):
+        self.assertEqual(negotiate('gzip, deflate', ['zstd', 'br', 'gzip']), 'gzip')
+        self.assertEqual(negotiate('gzip;q=0.5, br', ['zstd', 'br', 'gzip']), 'br')
+        self.assertEqual(negotiate('br, gzip', ['zstd', 'br', 'gzip']), 'br')
+        self.assertEqual(negotiate('*', ['gzip']), 'gzip')
+        self.assertIsNone(negotiate('gzip;q=0', ['gzip']))
+        self.assertIsNone(negotiate('', ['gzip']))
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = FlaskJSON(__name__)
+        self.app.config['ATOMIC_COMPRESSION_MIN_SIZE'] = 100
+
+        @self.app.route('/large')
+        def large():
+            return jsonify(data=[dict(id=idx, label='label') for idx in range(100)])
+
+        @self.app.route('/small')
+        def small():
+            return jsonify(data=[])
+
+        self.client = self.app.test_client()
+
+    def test_compresses_large_responses(self):
+        plain = self.client.get('/large')
+        resp = self.client.get('/large', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.headers['Content-Encoding'], GZIP)
+        self.assertIn('Accept-Encoding', resp.headers['Vary'])
+        self.assertEqual(gzip.decompress(resp.data), plain.data)
+        self.assertLess(len(resp.data), len(plain.data))
+
+    def test_skips_small_and_unaccepted(self):
+        self.assertNotIn('Content-Encoding', self.client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers)
+        self.assertNotIn('Content-Encoding', self.client.get('/large').headers)
+        self.app.config['ATOMIC_COMPRESSION'] = False
+        self.assertNotIn('Content-Encoding', self.client.get('/large', headers={'Accept-Encoding': 'gzip'}).headers)
+
+    def test_hot_bodies_compressed_once(self):
+        compression: Compression = self.app.compression
+        for _ in range(3):
+            self.client.get('/large', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(len(compression.variants), 1)
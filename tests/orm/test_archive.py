@@ -0,0 +1,98 @@
+import datetime
+import unittest
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from flask_atomic.orm.archive import archive
+from flask_atomic.orm.archive import archive_table
+from flask_atomic.orm.archive import archived
+from flask_atomic.orm.bulk import bulk_flag
+from flask_atomic.orm.mixins.abstracts import DYNAFlagMixin
+from flask_atomic.orm.mixins.columns import DeletionMixin
+from flask_atomic.orm.softdelete import show_soft_deletes
+
+db = SQLAlchemy()
+NOW = datetime.datetime(2020, 6, 1)
+
+
+class Invoice(DYNAFlagMixin, DeletionMixin, db.Model):
+    __tablename__ = 'invoice'
+    __archive__ = True
+    id = db.Column(db.Integer, primary_key=True)
+    reference = db.Column(db.String(16))
+
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        for idx in range(1, 8):
+            active = 'Y' if idx == 1 else 'D'
+            deleted = NOW - datetime.timedelta(days=idx * 10) if idx > 1 else None
+            db.session.add(Invoice(id=idx, reference=f'INV-{idx}', active=active, deleted=deleted))
+        db.session.commit()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_moves_deleted_rows_before_cutoff(self):
+        cutoff = NOW - datetime.timedelta(days=25)
+        self.assertEqual(archive(Invoice, cutoff, chunk=2), 5)
+        self.assertEqual(sorted(item.id for item in show_soft_deletes(Invoice.query).all()), [1, 2])
+
+        table = archive_table(Invoice)
+        rows = db.session.execute(table.select().order_by(table.c.id)).fetchall()
+        self.assertEqual([row.id for row in rows], [3, 4, 5, 6, 7])
+        self.assertEqual(rows[0].reference, 'INV-3')
+        self.assertEqual(archive(Invoice, cutoff), 0)
+
+    def test_without_cutoff(self):
+        self.assertEqual(archive(Invoice), 6)
+        self.assertEqual(show_soft_deletes(Invoice.query).count(), 1)
+
+    def test_cutoff_needs_column(self):
+        with self.assertRaises(ValueError):
+            archive(Invoice, NOW, column='archived_at')
+
+    def test_soft_deletes_stamped(self):
+        invoice = Invoice(id=8, reference='INV-8')
+        db.session.add(invoice)
+        db.session.commit()
+        invoice.safe_delete(commit=False)
+        db.session.commit()
+        self.assertGreater(invoice.deleted, NOW)
+        invoice.restore(commit=False)
+        db.session.commit()
+        self.assertIsNone(invoice.deleted)
+
+        self.assertEqual(bulk_flag(Invoice, 'D', keys=[1, 8]), 2)
+        deleted = {item.id: item.deleted for item in show_soft_deletes(Invoice.query)}
+        self.assertGreater(deleted[1], NOW)
+        self.assertGreater(deleted[8], NOW)
+        self.assertEqual(archive(Invoice, NOW), 6)
+        self.assertEqual(show_soft_deletes(Invoice.query).count(), 2)
+
+    def test_read_through(self):
+        self.assertIsNone(archived(Invoice, 4))
+        archive(Invoice)
+        instance = archived(Invoice, '4')
+        self.assertEqual(instance.reference, 'INV-4')
+        self.assertNotIn(instance, db.session)
+        self.assertIsNone(archived(Invoice, 1))
+
+    def test_archive_table_kept_out_of_model_metadata(self):
+        table = archive_table(Invoice)
+        self.assertNotIn(table.name, db.metadata.tables)
+        archive(Invoice)
+        db.drop_all()
+        self.assertTrue(db.engine.has_table(table.name))
+        self.assertEqual(db.session.execute(table.count()).scalar(), 6)
+        db.create_all()
@@ -0,0 +1,128 @@
+import unittest
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+
+from flask_atomic import Architect
+from flask_atomic.builder.dao import ModelDAO
+from flask_atomic.orm.bulk import bulk_flag
+from flask_atomic.orm.bulk import criteria
+from flask_atomic.orm.mixins.abstracts import DYNAFlagMixin
+from flask_atomic.orm.softdelete import show_soft_deletes
+
+db = SQLAlchemy()
+
+
+class Ticket(DYNAFlagMixin, db.Model):
+    __tablename__ = 'ticket'
+    id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(16))
+    priority = db.Column(db.Integer)
+
+
+class Plain(db.Model):
+    __tablename__ = 'plain'
+    id = db.Column(db.Integer, primary_key=True)
+
+
+class TestBulkFlag(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        for idx in range(1, 11):
+            db.session.add(Ticket(id=idx, queue='ops' if idx % 2 else 'dev', priority=idx, active='Y'))
+        db.session.commit()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def statements(self):
+        seen = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: seen.append(args[2]))
+        return seen
+
+    def flags(self):
+        return {item.id: item.active for item in show_soft_deletes(Ticket.query).all()}
+
+    def test_by_keys_in_chunks(self):
+        seen = self.statements()
+        self.assertEqual(bulk_flag(Ticket, 'D', keys=[1, 2, 3, 3, 42], chunk=2), 3)
+        self.assertEqual(len([item for item in seen if item.startswith('UPDATE')]), 2)
+        self.assertFalse([item for item in seen if item.startswith('SELECT')])
+        self.assertEqual(Ticket.query.count(), 7)
+
+        # Rows already carrying the flag are not counted again
+        self.assertEqual(bulk_flag(Ticket, 'D', keys=[1, 2, 3]), 0)
+
+    def test_by_filter(self):
+        where = criteria(Ticket, {'queue': 'ops'}, maximum=[('priority', 7)])
+        self.assertEqual(bulk_flag(Ticket, 'N', where=where, chunk=3), 4)
+        self.assertEqual([key for key, flag in self.flags().items() if flag == 'N'], [1, 3, 5, 7])
+
+    def test_by_keys_and_filter(self):
+        where = criteria(Ticket, {'queue': 'ops'})
+        self.assertEqual(bulk_flag(Ticket, 'D', keys=[1, 2, 3, 4], where=where), 2)
+        self.assertEqual([key for key, flag in self.flags().items() if flag == 'D'], [1, 3])
+
+    def test_rejects_bad_requests(self):
+        with self.assertRaises(ValueError):
+            criteria(Ticket, {'missing': 1})
+        with self.assertRaises(ValueError):
+            bulk_flag(Ticket, 'D')
+        with self.assertRaises(ValueError):
+            bulk_flag(Plain, 'D', keys=[1])
+
+    def test_dao_restore(self):
+        dao = ModelDAO(Ticket)
+        self.assertEqual(dao.bulk_softdelete(filters={'queue': 'dev'}), 5)
+        self.assertEqual(dao.bulk_restore(keys=[2, 4]), 2)
+        self.assertEqual(Ticket.query.count(), 7)
+
+
+class TestBulkEndpoint(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        Architect(Ticket, prefix='/api').link(self.app)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            for idx in range(1, 6):
+                db.session.add(Ticket(id=idx, queue='ops', priority=idx, active='Y'))
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_bulk_actions(self):
+        response = self.client.post('/api/_bulk/delete', json={'ids': [1, 2]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['data'], {'count': 2})
+
+        response = self.client.post('/api/_bulk/delete', json={'ids': [3, 4], 'min': {'priority': 4}})
+        self.assertEqual(response.json['data'], {'count': 1})
+
+        response = self.client.post('/api/_bulk/deactivate', json={'min': {'priority': 5}})
+        self.assertEqual(response.json['data'], {'count': 1})
+
+        response = self.client.post('/api/_bulk/restore', json={'filters': {'queue': 'ops'}})
+        self.assertEqual(response.json['data'], {'count': 4})
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.post('/api/_bulk/purge', json={'ids': [1]}).status_code, 400)
+        self.assertEqual(self.client.post('/api/_bulk/delete', json={}).status_code, 400)
+        self.assertEqual(self.client.post('/api/_bulk/delete', json={'ids': 1}).status_code, 400)
+        response = self.client.post('/api/_bulk/delete', json={'filters': {'missing': 1}})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,96 @@
+import unittest
+
+from flask import Flask
+
+from flask_atomic import Architect
+from flask_atomic.builder.dao import ModelDAO
+from flask_atomic.orm.lookup import identity_lookup
+from flask_atomic.orm.sharding import ShardMap
+from flask_atomic.orm.sharding import shard_context
+from flask_atomic.sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+SHARDS = ['shard0', 'shard1']
+
+
+class Event(db.Model):
+    __tablename__ = 'sharded_event'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    label = db.Column(db.String(32))
+
+
+def by_parity(value):
+    return SHARDS[int(value) % 2]
+
+
+class TestShardMap(unittest.TestCase):
+
+    def test_hash(self):
+        shards = ShardMap(SHARDS)
+        self.assertEqual(shards.shard(42), shards.shard('42'))
+        self.assertEqual({shards.shard(idx) for idx in range(50)}, set(SHARDS))
+
+    def test_ranges(self):
+        shards = ShardMap(['low', 'mid', 'high'], ranges=[100, 200])
+        self.assertEqual([shards.shard(value) for value in (0, 99, 100, 250)], ['low', 'low', 'mid', 'high'])
+        with self.assertRaises(ValueError):
+            ShardMap(['low', 'high'], ranges=[1, 2])
+
+
+class TestShardedResource(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_BINDS'] = {name: 'sqlite://' for name in SHARDS}
+        db.init_app(self.app)
+        Architect(
+            Event, prefix='/api', dao=ModelDAO(Event), shards=ShardMap(SHARDS, function=by_parity)
+        ).link(self.app)
+        self.client = self.app.test_client()
+
+        self.context = self.app.app_context()
+        self.context.push()
+        for name in SHARDS:
+            db.Model.metadata.create_all(bind=db.get_engine(self.app, name))
+        for idx in range(1, 7):
+            self.assertEqual(self.client.post('/api/', json={'id': idx, 'label': f'event-{idx}'}).status_code, 201)
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        for name in SHARDS:
+            db.Model.metadata.drop_all(bind=db.get_engine(self.app, name))
+        self.context.pop()
+
+    def test_rows_placed_by_key(self):
+        with shard_context('shard1'):
+            self.assertEqual([item.id for item in Event.query.order_by(Event.id)], [1, 3, 5])
+        with shard_context('shard0'):
+            self.assertEqual([item.id for item in Event.query.order_by(Event.id)], [2, 4, 6])
+
+    def test_identity_lookup_per_shard(self):
+        with shard_context('shard1'):
+            self.assertEqual(identity_lookup(Event, None, 3).label, 'event-3')
+        with shard_context('shard0'):
+            self.assertIsNone(identity_lookup(Event, None, 3))
+            self.assertIsNone(identity_lookup(Event, 'label', 'event-3'))
+
+    def test_keyed_routes(self):
+        self.assertEqual(self.client.get('/api/3').json['data']['label'], 'event-3')
+        self.assertEqual(self.client.head('/api/4').status_code, 200)
+        self.assertEqual(self.client.delete('/api/5').status_code, 204)
+        self.assertEqual(self.client.get('/api/5').status_code, 404)
+
+    def test_list_fans_out_in_order(self):
+        response = self.client.get('/api?order_by=id&desc=true&limit=4')
+        self.assertEqual([item['id'] for item in response.json['data']], [6, 5, 4, 3])
+        response = self.client.get('/api?order_by=id&page=2&pagesize=2')
+        self.assertEqual([item['id'] for item in response.json['data']], [3, 4])
+
+    def test_batch_across_shards(self):
+        response = self.client.get('/api/_batch?ids=4,1,9')
+        self.assertEqual([item and item['id'] for item in response.json['data']], [4, 1, None])
+
+    def test_post_needs_key(self):
+        self.assertEqual(self.client.post('/api/', json={'label': 'keyless'}).status_code, 400)
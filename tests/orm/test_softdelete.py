@@ -0,0 +1,81 @@
+import unittest
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.schema import CreateIndex
+
+from flask_atomic import Architect
+from flask_atomic.orm.indexes import IndexAdvisor
+from flask_atomic.orm.lookup import identity_lookup
+from flask_atomic.orm.mixins.abstracts import DYNAFlagMixin
+from flask_atomic.orm.softdelete import live_index
+from flask_atomic.orm.softdelete import show_soft_deletes
+
+db = SQLAlchemy()
+
+
+class Document(DYNAFlagMixin, db.Model):
+    __tablename__ = 'document'
+    __table_args__ = (live_index('ix_document_title_live', 'title'),)
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(64))
+    folder_id = db.Column(db.Integer, db.ForeignKey('folder.id'))
+
+
+class Folder(db.Model):
+    __tablename__ = 'folder'
+    id = db.Column(db.Integer, primary_key=True)
+    documents = db.relationship(Document, lazy='select')
+
+
+class TestSoftDeleteScoping(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add(Folder(id=1))
+        for title, active in [('live', 'Y'), ('deleted', 'D'), ('suspended', 'N')]:
+            db.session.add(Document(title=title, active=active, folder_id=1))
+        db.session.commit()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def test_queries_scoped_to_live_rows(self):
+        self.assertEqual([item.title for item in Document.query.all()], ['live'])
+        self.assertEqual(Document.query.count(), 1)
+        self.assertEqual(Document.query.limit(5).count(), 1)
+        self.assertEqual(len(Folder.query.get(1).documents), 1)
+        self.assertIsNone(Document.query.get(2))
+
+    def test_show_soft_deletes(self):
+        self.assertEqual(show_soft_deletes(Document.query).count(), 3)
+        self.assertIsNotNone(identity_lookup(Document, None, 2))
+        self.assertIsNone(identity_lookup(Document, None, 2, scoped=True))
+
+    def test_soft_deleted_instance_still_usable(self):
+        document = Document.query.first()
+        document.safe_delete()
+        self.assertEqual(document.active, 'D')
+        self.assertEqual(Document.query.count(), 0)
+        document.restore()
+        self.assertEqual(Document.query.count(), 1)
+
+    def test_sql_render_relationships_scoped(self):
+        Architect(Folder, prefix='/folders', render='sql').link(self.app)
+        response = self.app.test_client().get('/folders?relationships=documents')
+        self.assertEqual([item['title'] for item in response.json['data'][0]['documents']], ['live'])
+
+    def test_partial_index(self):
+        statement = str(CreateIndex(list(Document.__table__.indexes)[0]).compile(dialect=db.engine.dialect))
+        self.assertIn("WHERE active = 'Y'", statement)
+
+        advisor = IndexAdvisor()
+        advisor.record(Document, filters=['folder_id'])
+        self.assertEqual(advisor.ddl(), ["CREATE INDEX ix_document_folder_id ON document (folder_id) WHERE active = 'Y'"])
@@ -0,0 +1,116 @@
+import unittest
+
+from flask import Flask
+
+from flask_atomic import Architect
+from flask_atomic.orm.lookup import identity_lookup
+from flask_atomic.orm.tenancy import all_tenants
+from flask_atomic.orm.tenancy import tenant_context
+from flask_atomic.sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+
+class Order(db.Model):
+    __tablename__ = 'tenant_order'
+    __tenant__ = 'tenant_id'
+    id = db.Column(db.Integer, primary_key=True)
+    tenant_id = db.Column(db.String(16), index=True)
+    label = db.Column(db.String(32))
+    lines = db.relationship('OrderLine')
+
+
+class OrderLine(db.Model):
+    __tablename__ = 'tenant_order_line'
+    __tenant__ = 'tenant_id'
+    id = db.Column(db.Integer, primary_key=True)
+    tenant_id = db.Column(db.String(16), index=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('tenant_order.id'))
+
+
+class TenancyTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_BINDS'] = {'dedicated': 'sqlite://'}
+        self.app.config['ATOMIC_TENANT_BINDS'] = {'large': 'dedicated'}
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        db.Model.metadata.create_all(bind=db.get_engine(self.app, 'dedicated'))
+        for idx, tenant in enumerate(['a', 'a', 'b'], start=1):
+            db.session.add(Order(id=idx, tenant_id=tenant, label=f'{tenant}-{idx}'))
+        db.session.commit()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.Model.metadata.drop_all(bind=db.get_engine(self.app, 'dedicated'))
+        db.drop_all()
+        self.context.pop()
+
+
+class TestTenantScoping(TenancyTest):
+
+    def test_queries_scoped_in_sql(self):
+        with tenant_context('a'):
+            self.assertEqual(sorted(item.label for item in Order.query.all()), ['a-1', 'a-2'])
+            self.assertEqual(Order.query.count(), 2)
+        with tenant_context('b'):
+            db.session.expunge_all()
+            self.assertIsNone(identity_lookup(Order, None, 1))
+            self.assertIsNotNone(identity_lookup(Order, None, 3))
+
+    def test_identity_lookup_across_tenants(self):
+        with tenant_context('a'):
+            self.assertEqual(identity_lookup(Order, None, 1).label, 'a-1')
+            self.assertEqual(identity_lookup(Order, 'label', 'a-2').id, 2)
+        with tenant_context('b'):
+            self.assertIsNone(identity_lookup(Order, None, 1))
+            self.assertIsNone(identity_lookup(Order, 'label', 'a-2'))
+
+    def test_fails_closed_without_tenant(self):
+        self.assertEqual(Order.query.count(), 0)
+        self.assertEqual(all_tenants(Order.query).count(), 3)
+
+    def test_writes_stamped_with_tenant(self):
+        with tenant_context('b'):
+            db.session.add(Order(id=4, tenant_id='a', label='sneaky'))
+            db.session.commit()
+        self.assertEqual(all_tenants(Order.query).filter_by(id=4).one().tenant_id, 'b')
+
+    def test_dedicated_bind(self):
+        with tenant_context('large'):
+            db.session.add(Order(id=10, label='large-10'))
+            db.session.commit()
+            self.assertEqual([item.label for item in Order.query.all()], ['large-10'])
+        self.assertEqual(all_tenants(Order.query).count(), 3)
+
+
+class TestTenantEndpoints(TenancyTest):
+
+    def test_header_tenant(self):
+        Architect(Order, prefix='/api', tenant='X-Tenant').link(self.app)
+        client = self.app.test_client()
+        self.assertEqual(client.get('/api').status_code, 400)
+        response = client.get('/api', headers={'X-Tenant': 'b'})
+        self.assertEqual([item['label'] for item in response.json['data']], ['b-3'])
+        self.assertEqual(client.get('/api/1', headers={'X-Tenant': 'b'}).status_code, 404)
+
+    def test_sql_render_relationships_scoped(self):
+        for tenant in ['a', 'b']:
+            with tenant_context(tenant):
+                db.session.add(OrderLine(order_id=3))
+                db.session.commit()
+        Architect(Order, prefix='/api', tenant='X-Tenant', render='sql').link(self.app)
+        response = self.app.test_client().get('/api?relationships=lines', headers={'X-Tenant': 'b'})
+        self.assertEqual(response.json['data'][0]['lines'], [{'id': 2, 'order_id': 3, 'tenant_id': 'b'}])
+
+    def test_url_tenant(self):
+        Architect(Order, prefix='/api', tenant='<tenant>').link(self.app)
+        client = self.app.test_client()
+        response = client.get('/api/a')
+        self.assertEqual(len(response.json['data']), 2)
+        self.assertEqual(client.get('/api/a/2').json['data']['label'], 'a-2')
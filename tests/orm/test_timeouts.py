@@ -0,0 +1,118 @@
+import unittest
+from types import SimpleNamespace
+
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from flask_atomic import Architect
+from flask_atomic.builder.timeouts import timeout_for
+from flask_atomic.orm.timeouts import Deadline
+from flask_atomic.orm.timeouts import _statement_timeout
+from flask_atomic.orm.timeouts import _transaction_ended
+from flask_atomic.orm.timeouts import current_deadline
+from flask_atomic.orm.timeouts import deadline_context
+from flask_atomic.orm.timeouts import is_timeout
+from flask_atomic.orm.timeouts import listen
+from flask_atomic.sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+SLOW = text(
+    'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000000) '
+    'SELECT count(*) FROM c'
+)
+
+
+class Report(db.Model):
+    __tablename__ = 'timeout_report'
+    id = db.Column(db.Integer, primary_key=True)
+    label = db.Column(db.String(32))
+
+
+class TimeoutTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        db.session.add(Report(id=1, label='daily'))
+        db.session.commit()
+        listen()
+
+    def tearDown(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+
+class TestDeadlines(TimeoutTest):
+
+    def test_timeout_resolution(self):
+        timeouts = {'GET': 2, '*': 5, Report: {'GET': 30}}
+        self.assertEqual(timeout_for(timeouts, Report, 'GET'), 30)
+        self.assertIsNone(timeout_for(timeouts, Report, 'POST'))
+        self.assertEqual(timeout_for({'GET': 2, '*': 5}, Report, 'POST'), 5)
+        self.assertEqual(timeout_for({'timeout_report': 1}, Report, 'DELETE'), 1)
+        self.assertEqual(timeout_for(3, Report, 'GET'), 3)
+
+    def test_nested_deadline_only_shortens(self):
+        with deadline_context(Deadline(1)) as outer:
+            with deadline_context(Deadline(60)):
+                self.assertIs(current_deadline(), outer)
+        self.assertIsNone(current_deadline())
+
+    def test_slow_statement_interrupted(self):
+        with deadline_context(Deadline(0.05)):
+            with self.assertRaises(OperationalError) as caught:
+                db.session.execute(SLOW)
+        self.assertTrue(is_timeout(caught.exception))
+        db.session.rollback()
+        # The connection goes back to the pool without the deadline
+        self.assertEqual(db.session.execute(text('SELECT count(*) FROM timeout_report')).scalar(), 1)
+
+    def test_statement_timeout_once_per_transaction(self):
+        sent = []
+        conn = SimpleNamespace(info=dict())
+        cursor = SimpleNamespace(execute=sent.append)
+        for milliseconds in [1000, 950, 810, 790, 700]:
+            _statement_timeout(conn, cursor, milliseconds)
+        _statement_timeout(conn, cursor, None)
+        _statement_timeout(conn, cursor, None)
+        self.assertEqual(sent, [
+            'SET LOCAL statement_timeout = 1000', 'SET LOCAL statement_timeout = 790',
+            'SET LOCAL statement_timeout = DEFAULT',
+        ])
+
+        _statement_timeout(conn, cursor, 500)
+        _transaction_ended(conn)
+        _statement_timeout(conn, cursor, 450)
+        self.assertEqual(sent[-2:], ['SET LOCAL statement_timeout = 500', 'SET LOCAL statement_timeout = 450'])
+
+
+class TestTimeoutEndpoints(TimeoutTest):
+
+    def test_within_budget(self):
+        Architect(Report, prefix='/api', timeouts={'GET': 5}).link(self.app)
+        response = self.app.test_client().get('/api/1', headers={'X-Request-Timeout': '2000ms'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_client_deadline_already_spent(self):
+        Architect(Report, prefix='/api', timeouts=5).link(self.app)
+        response = self.app.test_client().get('/api', headers={'X-Request-Timeout': '0'})
+        self.assertEqual(response.status_code, 503)
+
+    def test_cancelled_statement(self):
+        architect = Architect(Report, prefix='/api', timeouts=0.05)
+
+        def slow():
+            with deadline_context(Deadline(0.05)):
+                return str(db.session.execute(SLOW).scalar())
+        architect.add_url_rule('/slow', 'slow', slow)
+        architect.link(self.app)
+        response = self.app.test_client().get('/api/slow')
+        self.assertEqual(response.status_code, 504)
@@ -0,0 +1,104 @@
+import sqlite3
+import unittest
+
+from sqlalchemy import Column
+from sqlalchemy import Integer
+from sqlalchemy import String
+from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from flask_atomic.orm.transaction import TransactionRunner
+from flask_atomic.orm.transaction import is_transient
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = 'runner_item'
+    id = Column(Integer, primary_key=True)
+    label = Column(String(32))
+
+
+def operational(message):
+    return OperationalError('COMMIT', {}, sqlite3.OperationalError(message))
+
+
+class TestTransactionRunner(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.session.add(Item(id=1, label='old'))
+        self.session.commit()
+        self.failures = []
+        self.commits = []
+        event.listen(self.engine, 'commit', self.fail_commit)
+        self.runner = TransactionRunner(retries=2, sleep=lambda delay: None)
+
+    def tearDown(self) -> None:
+        event.remove(self.engine, 'commit', self.fail_commit)
+        self.session.close()
+
+    def fail_commit(self, connection):
+        self.commits.append(1)
+        if self.failures:
+            raise self.failures.pop(0)
+
+    def rows(self):
+        return self.engine.execute(text('SELECT id, label FROM runner_item ORDER BY id')).fetchall()
+
+    def test_classification(self):
+        self.assertTrue(is_transient(operational('database is locked')))
+        self.assertTrue(is_transient(operational('server closed the connection unexpectedly')))
+        self.assertFalse(is_transient(operational('no such table: example')))
+        self.assertFalse(is_transient(IntegrityError('INSERT', {}, sqlite3.IntegrityError('UNIQUE'))))
+
+    def test_autoflushed_work_replayed(self):
+        self.session.query(Item).get(1).label = 'new'
+        self.session.add(Item(id=2, label='added'))
+        self.assertEqual(self.session.query(Item).count(), 2)
+        self.failures.append(operational('database is locked'))
+        self.runner.run(session=self.session)
+        self.assertEqual(len(self.commits), 2)
+        self.assertEqual(self.rows(), [(1, 'new'), (2, 'added')])
+
+    def test_autoflushed_delete_replayed(self):
+        self.session.delete(self.session.query(Item).get(1))
+        self.session.add(Item(id=3, label='transient'))
+        self.session.flush()
+        self.session.delete(self.session.query(Item).get(3))
+        self.failures.append(operational('database is locked'))
+        self.runner.run(session=self.session)
+        self.assertEqual(self.rows(), [])
+
+    def test_retries_exhausted_surfaces_error(self):
+        self.session.add(Item(id=2, label='added'))
+        self.failures.extend([operational('deadlock detected')] * 3)
+        with self.assertRaises(OperationalError):
+            self.runner.run(session=self.session)
+        self.assertEqual(len(self.commits), 3)
+        self.assertEqual(self.rows(), [(1, 'old')])
+
+    def test_permanent_error_not_retried(self):
+        self.session.add(Item(id=1, label='duplicate'))
+        with self.assertRaises(IntegrityError):
+            self.runner.run(session=self.session)
+        self.assertEqual(self.rows(), [(1, 'old')])
+
+    def test_statement_work_repeated(self):
+        calls = []
+
+        def work(session):
+            calls.append(1)
+            session.execute(text("UPDATE runner_item SET label = 'core'"))
+            return len(calls)
+
+        self.failures.append(operational('database is locked'))
+        self.assertEqual(self.runner.run(work, self.session, repeat=True), 2)
+        self.assertEqual(self.rows(), [(1, 'core')])
@@ -1,15 +1,43 @@
+import csv
+import io
+import logging
+import tempfile
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest import mock
 
 from flask import Flask
 from flask import request
 from flask import current_app
 from functools import wraps
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
 from handyhttp import HTTPSuccess
 from handyhttp.exceptions import HTTPNotFound
 from handyhttp.exceptions import HTTPForbidden
 
 from flask_atomic import Architect
+from flask_atomic.builder.dao import ModelDAO
+from flask_atomic.builder.exports import ExportManager
+from flask_atomic.builder.flight import SingleFlight
+from flask_atomic.builder.limits import LoadShedder
+from flask_atomic.builder.limits import PoolWaitMonitor
+from flask_atomic.builder.limits import RateLimiter
+from flask_atomic.builder.revalidate import CachePolicy
+from flask_atomic.builder.writebehind import BatchPolicy
+from flask_atomic.builder.writebehind import validate
+from flask_atomic.metrics import Metrics
+from flask_atomic.orm.guardrails import QueryBudget
+from flask_atomic.orm.indexes import IndexAdvisor
+from flask_atomic.orm.lookup import _lookups
+from flask_atomic.orm.lookup import identity_lookup
+from flask_atomic.orm.lookup import lookup_query
+from flask_atomic.orm import slowlog
+from flask_atomic.orm.slowlog import SlowQueryLog
 # from flask_atomic.helpers import db
 
 db = SQLAlchemy()
@@ -32,6 +60,12 @@ class AnotherModel(db.Model):
     label = db.Column(db.String(256), nullable=True)
 
 
+class Reading(db.Model):
+    __tablename__ = 'reading'
+    id = db.Column(db.Integer, primary_key=True)
+    created = db.Column(db.DateTime, nullable=True)
+
+
 class BaseAppTest(unittest.TestCase):
     def setUp(self) -> None:
         self.flask = Flask(__name__)
@@ -121,6 +155,35 @@ class TestArchitect(BaseAppTest):
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.json.get('data'), {'id': 1, 'label': 'test', 'related_id': 1})
 
+    def test_get_one_reuses_baked_lookup(self):
+        with self.flask.app_context():
+            db.session.add(ExampleModel(label='test'))
+            db.session.commit()
+        _lookups.pop((ExampleModel, 'id', True), None)
+        self.client.get(f'/test/1')
+        baked = _lookups[(ExampleModel, 'id', True)]
+        resp = self.client.get(f'/test/1')
+        self.assertEqual(resp.json.get('data'), {'id': 1, 'label': 'test', 'related_id': None})
+        self.assertIs(lookup_query(ExampleModel, 'id', scoped=True), baked)
+
+    def test_identity_lookup_loads_once_per_request(self):
+        with self.flask.app_context():
+            db.session.add(ExampleModel(label='test'))
+            db.session.commit()
+
+        statements = []
+        with self.flask.test_request_context():
+            engine = db.get_engine()
+
+            def listener(*args):
+                statements.append(args[2])
+            event.listen(engine, 'before_cursor_execute', listener)
+            first = identity_lookup(ExampleModel, 'label', 'test')
+            self.assertIs(identity_lookup(ExampleModel, 'label', 'test'), first)
+            self.assertIs(identity_lookup(ExampleModel, None, '1'), first)
+            event.remove(engine, 'before_cursor_execute', listener)
+        self.assertEqual(len(statements), 1)
+
     def test_get_one_field_lookup(self):
         with self.flask.app_context():
             entity = ExampleModel(label='test')
@@ -159,3 +222,566 @@ class TestArchitect(BaseAppTest):
         resp = self.client.get(f'/test-decorator', headers={'API_TOKEN': 'test'})
         # Passing the decorator then allows the function to pass through to request as normal
         self.assertEqual(resp.status_code, 200)
+
+
+class TestIndexAdvisor(BaseAppTest):
+
+    def test_lookup_key_checked_on_link(self):
+        advisor = IndexAdvisor()
+        self.blueprint = Architect(ExampleModel, prefix='/test-advisor', key='label', advisor=advisor)
+        self.setup()
+        self.assertEqual(advisor.check(ExampleModel, ['label']), ['label'])
+        self.assertEqual(advisor.check(ExampleModel, ['id']), [])
+
+    def test_report_ranks_unindexed_usage(self):
+        advisor = IndexAdvisor()
+        self.blueprint = Architect(ExampleModel, prefix='/test-advisor', advisor=advisor)
+        self.setup()
+
+        self.client.get('/test-advisor?label=test')
+        self.client.get('/test-advisor?label=other&order_by=related_id')
+        self.client.get('/test-advisor?order_by=id')
+
+        report = advisor.report()
+        self.assertEqual([row['column'] for row in report], ['label', 'related_id'])
+        self.assertEqual(report[0]['filter'], 2)
+        self.assertEqual(report[1]['sort'], 1)
+        self.assertEqual(advisor.ddl()[0], 'CREATE INDEX ix_example_label ON example (label)')
+
+
+class TestSlowQueryLog(BaseAppTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.records = []
+        handler = logging.Handler()
+        handler.emit = self.records.append
+        self.log = SlowQueryLog(self.flask, threshold=0, handler=handler)
+
+    def tearDown(self) -> None:
+        self.log.close()
+
+    def test_slow_statements_logged_with_plan(self):
+        resp = self.client.get('/test')
+        self.assertEqual(resp.status_code, 200)
+        self.log.close()
+        record = self.records[0].slowquery
+        self.assertIn('SELECT', record['statement'])
+        self.assertEqual(record['model'], FIXED_TABLENAME)
+        self.assertTrue(record['plan'])
+
+    def test_plans_looked_up_off_the_request_thread(self):
+        threads = []
+        explain_later = slowlog.explain_later
+
+        def traced(*args):
+            threads.append(threading.current_thread())
+            return explain_later(*args)
+
+        with mock.patch('flask_atomic.orm.slowlog.explain_later', traced):
+            self.client.get('/test')
+            self.log.close()
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertIn('plan=', self.records[0].getMessage())
+
+    def test_failed_statements_leave_no_timing(self):
+        with self.flask.app_context():
+            connection = db.engine.connect()
+            with slowlog.tracking(ExampleModel):
+                with self.assertRaises(OperationalError):
+                    connection.execute('SELECT * FROM missing')
+                connection.execute('SELECT 1')
+            self.assertFalse([key for key in connection.info if 'slowlog' in str(key)])
+            connection.close()
+        self.log.close()
+        self.assertEqual([record.slowquery['statement'] for record in self.records], ['SELECT 1'])
+
+    def test_one_handler_on_the_shared_logger(self):
+        second = SlowQueryLog(self.flask, threshold=0, handler=logging.Handler())
+        installed = [item for item in second.logger.handlers if getattr(item, slowlog.INSTALLED, False)]
+        self.assertEqual(installed, [second.queue_handler])
+        second.close()
+
+    def test_inline_explain_only_in_debug(self):
+        resp = self.client.get('/test?_explain=1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('_explain', resp.json)
+
+        self.flask.debug = True
+        resp = self.client.get('/test?_explain=1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('SCAN', ' '.join(resp.json['_explain'][0]['plan']))
+
+
+class TestBatchLookup(BaseAppTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        with self.flask.app_context():
+            for label in ['first', 'second', 'third']:
+                db.session.add(ExampleModel(label=label))
+            db.session.commit()
+
+    def test_batch_keeps_order_and_marks_missing(self):
+        resp = self.client.get('/test/_batch?ids=3,9,1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([item and item['label'] for item in resp.json['data']], ['third', None, 'first'])
+        self.assertEqual(resp.json['missing'], ['9'])
+
+    def test_batch_post_chunks(self):
+        with mock.patch('flask_atomic.orm.lookup.DEFAULT_CHUNK', 2):
+            resp = self.client.post('/test/_batch', json={'ids': [1, 2, 3]})
+        self.assertEqual([item['id'] for item in resp.json['data']], [1, 2, 3])
+
+    def test_batch_requires_ids(self):
+        resp = self.client.get('/test/_batch')
+        self.assertEqual(resp.status_code, 400)
+
+
+class TestSQLRender(BaseAppTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        with self.flask.app_context():
+            db.session.add(ExampleModel(label='first', related_id=1))
+            db.session.add(ExampleModel(label='second'))
+            db.session.commit()
+
+    def test_sql_render_matches_orm_render(self):
+        for query in ['', '?label=first', '?order_by=label&desc=true', '?label=false']:
+            orm = self.client.get(f'/test{query}')
+            sql = self.client.get(f'/test{query}{"&" if query else "?"}_render=sql')
+            self.assertEqual(sql.status_code, 200)
+            self.assertEqual(sql.json, orm.json)
+
+    def test_sql_render_relationships(self):
+        self.blueprint = Architect(AnotherModel, prefix='/test-render', render='sql')
+        self.setup()
+        resp = self.client.get('/test-render?relationships=examples')
+        self.assertEqual(resp.json['data'], [
+            {'id': 1, 'label': 'test', 'examples': [{'id': 1, 'label': 'first', 'related_id': 1}]}
+        ])
+
+
+class TestRateLimits(BaseAppTest):
+
+    def test_rate_limit_per_verb(self):
+        self.blueprint = Architect(ExampleModel, prefix='/test-limited', limits={'GET': '2/minute'})
+        self.setup()
+        self.assertEqual(self.client.get('/test-limited').status_code, 200)
+        self.assertEqual(self.client.get('/test-limited').status_code, 200)
+        resp = self.client.get('/test-limited')
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp.headers['Retry-After'], '30')
+        self.assertEqual(self.client.head('/test-limited/1').status_code, 404)
+
+    def test_token_bucket_refills(self):
+        now = [0.0]
+        limiter = RateLimiter({'*': (1, 1)}, client=lambda: 'client', clock=lambda: now[0])
+        self.assertEqual(limiter.check(ExampleModel, 'GET'), (True, 0))
+        self.assertFalse(limiter.check(ExampleModel, 'GET')[0])
+        self.assertEqual(limiter.check(AnotherModel, 'GET'), (True, 0))
+        now[0] = 1.0
+        self.assertEqual(limiter.check(ExampleModel, 'GET'), (True, 0))
+
+    def test_load_shedding(self):
+        monitor = PoolWaitMonitor(alpha=1.0)
+        self.blueprint = Architect(
+            ExampleModel, prefix='/test-shed', shedding=LoadShedder(threshold=0.5, monitor=monitor)
+        )
+        self.setup()
+        self.assertEqual(self.client.get('/test-shed').status_code, 200)
+        monitor.observe(2.0)
+        resp = self.client.get('/test-shed')
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(int(resp.headers['Retry-After']), 2)
+        monitor.reset()
+        self.assertEqual(self.client.get('/test-shed').status_code, 200)
+
+
+class TestCoalescing(BaseAppTest):
+
+    def test_single_flight_shares_result(self):
+        flight = SingleFlight()
+        calls, barrier = [], threading.Barrier(4)
+
+        def work():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'result'
+
+        def caller(results):
+            barrier.wait()
+            results.append(flight.do('key', work))
+
+        results = []
+        threads = [threading.Thread(target=caller, args=(results,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertEqual(flight.calls, {})
+
+    def test_concurrent_gets_coalesced(self):
+        calls = []
+
+        def slow_response(response):
+            calls.append(request.args.get('label'))
+            time.sleep(0.2)
+            return response
+
+        self.blueprint = Architect(ExampleModel, prefix='/test-flight', coalesce=True, response=slow_response)
+        self.setup()
+
+        def fetch(query, results):
+            results.append(self.flask.test_client().get(f'/test-flight{query}').json)
+
+        results = []
+        threads = [threading.Thread(target=fetch, args=(query, results)) for query in ['', '', '', '?label=x']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(calls, key=str), [None, 'x'])
+        self.assertEqual(len(results), 4)
+
+
+class TestResponseCache(BaseAppTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.now = [0.0]
+        self.calls = []
+
+        def counted(response):
+            self.calls.append(1)
+            return response
+
+        self.blueprint = Architect(
+            ExampleModel, prefix='/test-cached', response=counted,
+            caching=CachePolicy(max_age=10, stale_while_revalidate=30)
+        )
+        self.setup()
+        self.blueprint.responses[FIXED_TABLENAME].clock = lambda: self.now[0]
+
+    def test_fresh_and_stale_responses(self):
+        resp = self.client.get('/test-cached')
+        self.assertEqual(resp.headers['Cache-Control'], 'public, max-age=10, stale-while-revalidate=30')
+        self.assertEqual(len(self.calls), 1)
+
+        with self.flask.app_context():
+            db.session.add(ExampleModel(label='late'))
+            db.session.commit()
+
+        self.now[0] = 5.0
+        self.assertEqual(self.client.get('/test-cached').json['data'], [])
+        self.assertEqual(len(self.calls), 1)
+
+        self.now[0] = 20.0
+        resp = self.client.get('/test-cached')
+        self.assertEqual(resp.json['data'], [])
+        self.assertEqual(resp.headers['Age'], '20')
+        self.blueprint.responses[FIXED_TABLENAME].executor.shutdown(wait=True)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(len(self.client.get('/test-cached').json['data']), 1)
+
+        self.now[0] = 100.0
+        self.client.get('/test-cached')
+        self.assertEqual(len(self.calls), 3)
+
+    def test_refresh_dropped_after_write(self):
+        cache = self.blueprint.responses[FIXED_TABLENAME]
+        self.client.get('/test-cached')
+        release = threading.Event()
+        cache.executor = ThreadPoolExecutor(max_workers=1)
+        cache.executor.submit(release.wait)
+
+        self.now[0] = 20.0
+        self.client.get('/test-cached')
+        cache.clear()
+        release.set()
+        cache.executor.shutdown(wait=True)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(len(cache.entries), 0)
+
+    def test_private_by_caller(self):
+        resp = self.client.get('/test-cached', headers={'Authorization': 'Bearer token'})
+        self.assertEqual(resp.headers['Cache-Control'], 'private, max-age=10, stale-while-revalidate=30')
+
+        def authenticated(func):
+            return func
+
+        self.blueprint = Architect(
+            ExampleModel, prefix='/test-cached-auth', decorators=[authenticated], caching=CachePolicy(max_age=10)
+        )
+        self.setup()
+        self.assertEqual(self.client.get('/test-cached-auth').headers['Cache-Control'], 'private, max-age=10')
+
+        self.blueprint = Architect(
+            ExampleModel, prefix='/test-cached-key', caching=CachePolicy(max_age=10), scope_headers=('X-Api-Key',)
+        )
+        self.setup()
+        resp = self.client.get('/test-cached-key', headers={'X-Api-Key': 'secret'})
+        self.assertEqual(resp.headers['Cache-Control'], 'private, max-age=10')
+        self.assertEqual(self.client.get('/test-cached-key').headers['Cache-Control'], 'public, max-age=10')
+
+    def test_writes_clear_cache(self):
+        self.blueprint = Architect(
+            ExampleModel, prefix='/test-cached-writes', dao=ModelDAO(ExampleModel),
+            caching={ExampleModel: CachePolicy(max_age=10)}
+        )
+        self.setup()
+        with self.flask.app_context():
+            db.session.add(ExampleModel(label='first'))
+            db.session.commit()
+
+        self.assertEqual(len(self.client.get('/test-cached-writes').json['data']), 1)
+        self.assertEqual(self.client.delete('/test-cached-writes/1').status_code, 204)
+        self.assertEqual(self.client.get('/test-cached-writes').json['data'], [])
+
+
+class TestAggregate(BaseAppTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        with self.flask.app_context():
+            db.session.add(AnotherModel(label='other'))
+            for label, related in [('a', 1), ('b', 1), ('c', 2), ('d', None)]:
+                db.session.add(ExampleModel(label=label, related_id=related))
+            db.session.commit()
+
+    def test_group_by(self):
+        resp = self.client.get('/test/_aggregate?group_by=related_id&count=*&sum=id&max=label')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json['data'], [
+            {'related_id': None, 'count': 1, 'sum_id': 4, 'max_label': 'd'},
+            {'related_id': 1, 'count': 2, 'sum_id': 3, 'max_label': 'b'},
+            {'related_id': 2, 'count': 1, 'sum_id': 3, 'max_label': 'c'},
+        ])
+
+    def test_filters_and_totals(self):
+        resp = self.client.get('/test/_aggregate?count=*&avg=id&related_id=1')
+        self.assertEqual(resp.json['data'], [{'count': 2, 'avg_id': 1.5}])
+
+    def test_invalid_fields(self):
+        self.assertEqual(self.client.get('/test/_aggregate?sum=nothing').status_code, 400)
+        self.assertEqual(self.client.get('/test/_aggregate?sum=*').status_code, 400)
+        self.assertEqual(self.client.get('/test/_aggregate?group_by=label').status_code, 400)
+
+    def test_hidden_fields(self):
+        with mock.patch.object(ExampleModel, '__hidden__', {'label'}, create=True):
+            self.assertEqual(self.client.get('/test/_aggregate?group_by=label&count=*').status_code, 400)
+            self.assertEqual(self.client.get('/test/_aggregate?max=label').status_code, 400)
+            self.assertEqual(self.client.get('/test/_aggregate?count=label').status_code, 400)
+            self.assertEqual(self.client.get('/test/_aggregate?count=*').json['data'], [{'count': 4}])
+
+
+class TestWriteBehind(BaseAppTest):
+
+    def test_batched_inserts(self):
+        self.blueprint = Architect(ExampleModel, prefix='/queued', write_behind=BatchPolicy(batch_size=3, interval=0.05))
+        self.setup()
+
+        inserts = []
+        with self.flask.app_context():
+            def record(conn, cursor, statement, parameters, context, executemany):
+                if statement.startswith('INSERT'):
+                    inserts.append(executemany)
+            event.listen(db.engine, 'before_cursor_execute', record)
+
+        for idx in range(5):
+            resp = self.client.post('/queued/', json={'label': f'event-{idx}'})
+            self.assertEqual(resp.status_code, 202)
+        self.blueprint.close()
+
+        with self.flask.app_context():
+            self.assertEqual(ExampleModel.query.count(), 5)
+        self.assertTrue(inserts and len(inserts) < 5)
+        self.assertIn(True, inserts)
+
+    def test_validation_and_backpressure(self):
+        policy = BatchPolicy(maxsize=1, timeout=0)
+        self.blueprint = Architect(ExampleModel, prefix='/queued', write_behind={'example': policy})
+        self.setup()
+
+        self.assertEqual(self.client.post('/queued/', json={'missing': 1}).status_code, 400)
+        self.assertEqual(self.client.post('/queued/', json=[{'label': 'a'}]).status_code, 400)
+
+        writer = self.blueprint.writers['example']
+        with mock.patch.object(writer, 'start'):
+            self.assertEqual(self.client.post('/queued/', json={'label': 'a'}).status_code, 202)
+            resp = self.client.post('/queued/', json={'label': 'b'})
+            self.assertEqual(resp.status_code, 429)
+            self.assertIn('Retry-After', resp.headers)
+
+    def test_bad_rows_do_not_stop_the_flusher(self):
+        self.blueprint = Architect(Reading, prefix='/queued', write_behind=BatchPolicy(interval=0.05))
+        self.setup()
+        writer = self.blueprint.writers['reading']
+        with self.flask.app_context():
+            writer.start()
+            # Skips validate, the string fails to bind to the DateTime column
+            writer.flush([(None, None, {'created': '2020-01-01'}), (None, None, {'id': 7})])
+            self.assertEqual([item.id for item in Reading.query.all()], [7])
+
+        writer.thread.join(0)
+        dead = writer.thread
+        with mock.patch.object(dead, 'is_alive', return_value=False), self.flask.app_context():
+            writer.start()
+        self.assertIsNot(writer.thread, dead)
+        self.assertTrue(writer.thread.is_alive())
+        writer.close()
+
+    def test_values_coerced_to_column_types(self):
+        table = db.Table(
+            'coerced', db.MetaData(), db.Column('id', db.Integer, primary_key=True),
+            db.Column('created', db.DateTime), db.Column('amount', db.Integer)
+        )
+        model = type('Coerced', (), {'__table__': table})
+        row = validate(model, {'created': '2020-01-01T10:00:00', 'amount': '3'})
+        self.assertEqual(row, {'created': datetime(2020, 1, 1, 10), 'amount': 3})
+        with self.assertRaises(ValueError):
+            validate(model, {'created': 'yesterday'})
+        with self.assertRaisesRegex(ValueError, r'^<colour, size> not accepted'):
+            validate(model, {'colour': 'red', 'size': 2})
+
+
+class TestExports(BaseAppTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.blueprint = Architect(ExampleModel, prefix='/export', exports=ExportManager(self.directory.name))
+        self.setup()
+        with self.flask.app_context():
+            for idx in range(1, 6):
+                db.session.add(ExampleModel(label=f'row-{idx}', related_id=1 if idx % 2 else None))
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def wait(self, location):
+        for _ in range(200):
+            status = self.client.get(location).json['data']
+            if status['status'] in ('done', 'failed'):
+                return status
+            time.sleep(0.01)
+        self.fail('Export did not finish')
+
+    def test_csv_export(self):
+        resp = self.client.post('/export/_exports?_format=csv&related_id=1&order_by=id')
+        self.assertEqual(resp.status_code, 202)
+        location = resp.headers['Location']
+        status = self.wait(location)
+        self.assertEqual((status['status'], status['rows'], status['total'], status['progress']), ('done', 3, 3, 1.0))
+
+        resp = self.client.get(f'{location}/download')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.mimetype, 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+        self.assertEqual([row['label'] for row in rows], ['row-1', 'row-3', 'row-5'])
+
+        partial = self.client.get(f'{location}/download', headers={'Range': 'bytes=0-4'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(len(partial.get_data()), 5)
+
+    def test_json_export_and_errors(self):
+        location = self.client.post('/export/_exports', json={'format': 'json'}).headers['Location']
+        self.assertEqual(self.wait(location)['rows'], 5)
+        self.assertEqual(len(self.client.get(f'{location}/download').json), 5)
+
+        self.assertEqual(self.client.post('/export/_exports?_format=xml').status_code, 400)
+        self.assertEqual(self.client.get('/export/_exports/unknown').status_code, 404)
+
+    def test_exports_opt_in_and_budgeted(self):
+        self.assertEqual(self.client.post('/test/_exports').status_code, 404)
+
+        self.blueprint = Architect(ExampleModel, prefix='/export-budget', exports=True, budget=QueryBudget(filters=0))
+        self.setup()
+        self.assertIsInstance(self.blueprint.exports, ExportManager)
+        resp = self.client.post('/export-budget/_exports?related_id=1')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('filters', resp.json['msg'])
+
+
+class TestQueryBudget(BaseAppTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        with self.flask.app_context():
+            for idx in range(1, 6):
+                db.session.add(ExampleModel(label=f'row-{idx}', related_id=1))
+            db.session.commit()
+
+    def test_limits_and_fanout(self):
+        self.blueprint = Architect(ExampleModel, prefix='/budget', budget=QueryBudget(limit=2, fanout=0, filters=1))
+        self.setup()
+        self.assertEqual(len(self.client.get('/budget?limit=1000000').json['data']), 2)
+        self.assertEqual(self.client.get('/budget?relationships=true').status_code, 400)
+        self.assertEqual(self.client.get('/budget?label=row-1&related_id=1').status_code, 400)
+
+    def test_row_estimate_and_model_override(self):
+        budget = {ExampleModel: QueryBudget(rows=3), 'second': QueryBudget(limit=1)}
+        self.blueprint = Architect(ExampleModel, prefix='/budget', budget=budget)
+        self.setup()
+        self.assertEqual(self.client.get('/budget?limit=3').status_code, 200)
+        self.assertEqual(self.client.get('/budget?limit=2&relationships=related').status_code, 400)
+        self.assertEqual(self.client.get('/budget?limit=5').status_code, 400)
+
+    def test_byte_budget_cursor(self):
+        self.blueprint = Architect(ExampleModel, prefix='/budget', budget=QueryBudget(bytes=100))
+        self.setup()
+        rows, url, pages = [], '/budget?order_by=id&limit=4', 0
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            rows.extend(item['label'] for item in resp.json['data'])
+            cursor, pages = resp.json.get('cursor', None), pages + 1
+            url = f'/budget?order_by=id&_cursor={cursor}' if cursor else None
+        self.assertEqual(rows, ['row-1', 'row-2', 'row-3', 'row-4'])
+        self.assertGreater(pages, 1)
+        self.assertEqual(self.client.get('/budget?_cursor=bogus').status_code, 400)
+
+
+class TestMetrics(BaseAppTest):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.metrics = Metrics(self.flask)
+        with self.flask.app_context():
+            for label in ['first', 'second', 'third']:
+                db.session.add(ExampleModel(label=label))
+            db.session.commit()
+
+    def scrape(self):
+        resp = self.client.get('/metrics')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.content_type.startswith('text/plain; version=0.0.4'))
+        return resp.get_data(as_text=True).splitlines()
+
+    def test_route_metrics(self):
+        self.client.get('/test')
+        self.client.get('/test?limit=1')
+        self.client.head('/test/999')
+        lines = self.scrape()
+        self.assertIn('atomic_request_duration_seconds_count{model="example",method="GET",status="200"} 2', lines)
+        self.assertIn('atomic_request_duration_seconds_count{model="example",method="HEAD",status="404"} 1', lines)
+        self.assertIn('atomic_rows_returned_bucket{model="example",method="GET",le="1"} 1', lines)
+        self.assertIn('atomic_rows_returned_sum{model="example",method="GET"} 4.0', lines)
+        self.assertIn('atomic_statements_per_request_bucket{model="example",method="GET",le="1"} 2', lines)
+        self.assertIn('atomic_serialization_duration_seconds_count{model="example"} 2', lines)
+
+    def test_cache_hits(self):
+        self.blueprint = Architect(
+            ExampleModel, prefix='/test-cached', caching=CachePolicy(max_age=10, stale_while_revalidate=30)
+        )
+        self.setup()
+        for _ in range(3):
+            self.assertEqual(self.client.get('/test-cached').status_code, 200)
+        lines = self.scrape()
+        self.assertIn('atomic_cache_requests_total{model="example",cache="response",result="hit"} 2', lines)
+        self.assertIn('atomic_cache_requests_total{model="example",cache="response",result="miss"} 1', lines)
@@ -0,0 +1,73 @@
+import unittest
+
+from flask import Flask
+from flask import request
+
+from flask_atomic.builder import MultiModelBuilder
+from tests.test_builder.test_architect import AnotherModel
+from tests.test_builder.test_architect import ExampleModel
+from tests.test_builder.test_architect import db
+
+
+class TestMultiModelBuilder(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.flask = Flask(__name__)
+        db.init_app(self.flask)
+        self.flask.register_blueprint(MultiModelBuilder([ExampleModel, AnotherModel], prefix='/api'))
+        self.client = self.flask.test_client()
+
+        with self.flask.app_context():
+            db.create_all()
+            db.session.add(AnotherModel(label='first'))
+            db.session.add(AnotherModel(label='second'))
+            db.session.commit()
+
+    def tearDown(self) -> None:
+        with self.flask.app_context():
+            db.drop_all()
+
+    def test_composite_request(self):
+        resp = self.client.post('/api/_multi', json={
+            'concurrent': True,
+            'requests': [
+                dict(model='second', verb='GET'),
+                dict(model='second', verb='GET', key=2),
+                dict(model='example', verb='GET'),
+                dict(model='missing', verb='GET'),
+            ]
+        })
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json['data']
+        self.assertEqual([item['status'] for item in results], [200, 200, 200, 404])
+        self.assertEqual(len(results[0]['body']['data']), 2)
+        self.assertEqual(results[1]['body']['data']['label'], 'second')
+        self.assertEqual(results[2]['body']['data'], [])
+
+    def test_sub_request_errors_isolated(self):
+        seen = []
+
+        @self.flask.before_request
+        def hook():
+            seen.append(request.path)
+            if request.args.get('fail', None):
+                raise RuntimeError('broken')
+
+        resp = self.client.post('/api/_multi', json=[
+            dict(model='second', verb='GET', key=1),
+            dict(model='second', verb='GET', query='fail=1'),
+            dict(model='second', verb='GET', key=9),
+        ])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([item['status'] for item in resp.json['data']], [200, 500, 404])
+        self.assertEqual(seen, ['/api/_multi', '/api/second/1', '/api/second', '/api/second/9'])
+
+    def test_composite_request_requires_list(self):
+        resp = self.client.post('/api/_multi', json={'requests': []})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_malformed_sub_requests(self):
+        for items in [[dict(model='second'), 5], [dict(model=1)], [dict(model='second', verb=['GET'])]]:
+            resp = self.client.post('/api/_multi', json={'requests': items})
+            self.assertEqual(resp.status_code, 400)
+            self.assertTrue(resp.is_json)